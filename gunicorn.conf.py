@@ -0,0 +1,24 @@
+"""
+Gunicorn settings, loaded automatically from the working directory.
+
+When PROMETHEUS_MULTIPROC_DIR is set, every worker writes its
+metrics to files in that directory so /metrics can report the
+totals of all of them. The directory is emptied when the server
+starts, and a worker's live gauges are removed when it exits.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Members, Classes, Bookings
+from .models import Members, Classes, Bookings, Waitlist, ClassSeries
 
 
 
@@ -9,4 +9,6 @@ class MyModelAdmin(admin.ModelAdmin):
         
 admin.site.register(Members)
 admin.site.register(Classes)
-admin.site.register(Bookings)
\ No newline at end of file
+admin.site.register(Bookings)
+admin.site.register(Waitlist)
+admin.site.register(ClassSeries)
\ No newline at end of file
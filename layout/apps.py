@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LayoutConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "layout"
+
+    def ready(self):
+        # Connect the role cache invalidation signal handlers
+        from . import roles  # noqa: F401
@@ -0,0 +1,66 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, Lower
+
+from layout.models import RoleVersion
+
+
+def users_with_email(email):
+    """
+    Return the users whose email matches `email`, ignoring case.
+
+    The query compares LOWER(email) with the lower-cased address
+    and skips blank emails (`email > ''`), which matches the partial unique
+    index on auth_user created by the layout migrations, so the
+    lookup is an index probe rather than a table scan.
+
+    Parameters:
+    - email (str): The email address to look up.
+
+    Returns:
+    - QuerySet: The matching users (at most one).
+    """
+    return (
+        User.objects.alias(email_lower=Lower("email"))
+        .filter(email_lower=email.lower(), email__gt="")
+    )
+
+
+class EmailBackend(ModelBackend):
+    """
+    Authentication backend that logs users in with their email
+    address and password.
+
+    Used through `django.contrib.auth.authenticate` by passing
+    `email` instead of `username`. Requests that pass a username,
+    such as the Django admin login, are left to the next backend.
+
+    The users of logged in sessions are loaded with their
+    `roles_version`, so `layout.roles` can tell whether the roles
+    cached in the session are current without another query.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        user = users_with_email(email).first()
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(
+                user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        version = RoleVersion.objects.filter(
+            user=OuterRef("pk")).values("version")
+        user = User.objects.annotate(
+            roles_version=Coalesce(Subquery(version), 0),
+        ).filter(pk=user_id).first()
+        if user is None or not self.user_can_authenticate(user):
+            return None
+        return user
@@ -0,0 +1,403 @@
+import multiprocessing
+import random
+from datetime import time, timedelta
+from itertools import accumulate, count as count_from
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from layout.booking_functions.booking import recount_slots
+from layout.models import Classes, Bookings, Members, CLASSES
+
+# Rows inserted per bulk_create
+SEED_BATCH_SIZE = 2000
+# Classes scheduled per day, so a day or week of the schedule stays
+# the same size however big the dataset is
+CLASSES_PER_DAY = 20
+# Simulated members per class in the dataset
+CLASSES_PER_MEMBER = 20
+# Password of every seeded user
+SEED_PASSWORD = "benchmark-password"
+# Prefix of the usernames of generated members
+GENERATED_PREFIX = "gen-"
+# Description of generated classes
+GENERATED_DESCRIPTION = "Generated class"
+# Capacities of generated group and private classes
+GROUP_CAPACITIES = (12, 16, 20, 24, 30)
+PRIVATE_CAPACITIES = (1, 2)
+# Classes whose bookings are generated and inserted together, by one
+# worker
+GENERATE_CHUNK_SIZE = 10000
+
+
+def _seed_user(username, role, password):
+    user, created = User.objects.get_or_create(
+        username=username,
+        defaults={"email": f"{username}@example.com", "password": password},
+    )
+    if created:
+        user.groups.add(Group.objects.get_or_create(name=role)[0])
+        Members.objects.create(user=user, phone_number=username)
+    return user
+
+
+def _slot(n):
+    """
+    Return the date, start and end time of the `n`th slot of the
+    schedule: CLASSES_PER_DAY classes a day, back to back in 45
+    minute slots from 6am, on days alternating after and before
+    today (0, +1, -1, +2, ...).
+    """
+    day = n // CLASSES_PER_DAY
+    offset = day // 2 + 1 if day % 2 else -(day // 2)
+    start = 6 * 60 + n % CLASSES_PER_DAY * 45
+    return (
+        timezone.localdate() + timedelta(days=offset),
+        time(start // 60, start % 60),
+        time((start + 45) // 60, (start + 45) % 60),
+    )
+
+
+def seed_dataset(size, seed=0):
+    """
+    Grow the database to `size` classes and `size` bookings.
+
+    Classes are spread CLASSES_PER_DAY a day, back to back from
+    6am, on both sides of today, and each is booked once by one of `size` /
+    CLASSES_PER_MEMBER members. The 'bench-member' user books one
+    class in a hundred, so their pages grow with the dataset too,
+    and 'bench-admin' is an admin. Calling it again with a larger
+    size only adds the missing rows, so one database can be
+    benchmarked at increasing sizes.
+
+    Parameters:
+    - size (int): Number of classes and of bookings to reach.
+    - seed (int): Seed of the random class types and capacities.
+
+    Returns:
+    - dict: The seeded 'admin' and 'member' users.
+    """
+    rng = random.Random(seed + size)
+    password = make_password(SEED_PASSWORD)
+    admin = _seed_user("bench-admin", "admin", password)
+    member = _seed_user("bench-member", "member", password)
+
+    member_group = Group.objects.get(name="member")
+    existing_members = User.objects.filter(
+        username__startswith="seed-").count()
+    new_members = User.objects.bulk_create([
+        User(username=f"seed-{n}", email=f"seed-{n}@example.com",
+             password=password)
+        for n in range(existing_members, max(size // CLASSES_PER_MEMBER, 1))
+    ], batch_size=SEED_BATCH_SIZE)
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=user.id, group_id=member_group.id)
+        for user in new_members
+    ], batch_size=SEED_BATCH_SIZE)
+    members = list(User.objects.filter(
+        username__startswith="seed-").values_list("id", flat=True))
+
+    existing = Classes.objects.count()
+    classes = []
+    for n in range(existing, size):
+        class_date, start, end = _slot(n)
+        capacity = rng.choice((8, 12, 16, 20, 30))
+        classes.append(Classes(
+            class_name=f"Class {n}",
+            class_description="Seeded class",
+            class_type=rng.choice((0, 0, 0, 1)),
+            class_date=class_date,
+            class_start_time=start,
+            class_end_time=end,
+            slots_available=capacity,
+        ))
+    classes = Classes.objects.bulk_create(
+        classes, batch_size=SEED_BATCH_SIZE)
+
+    bookings = []
+    for n, class_instance in enumerate(classes, existing):
+        bookings.append(Bookings(
+            user_id=members[n % len(members)], class_id=class_instance))
+        if n % 100 == 0:
+            bookings.append(Bookings(user=member, class_id=class_instance))
+    Bookings.objects.bulk_create(bookings, batch_size=SEED_BATCH_SIZE)
+    if classes:
+        recount_slots(Classes.objects.filter(id__gte=classes[0].id))
+    return {"admin": admin, "member": member}
+
+
+def zipf_weights(count, exponent, rng):
+    """
+    Return `count` weights following Zipf's law, in a random order:
+    the weight of the item of rank r is 1 / r ** `exponent`, so 0
+    makes every item equally likely and larger exponents make a few
+    items dominate.
+    """
+    weights = [1 / rank ** exponent for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return weights
+
+
+def allocate(total, weights, capacities):
+    """
+    Share `total` items between bins in proportion to their weights,
+    without putting more in a bin than its capacity.
+
+    What doesn't fit in a full bin is shared again between the bins
+    with room left, so the most popular classes fill up and the
+    overflow goes to the next most popular, as it would when members
+    book.
+
+    Parameters:
+    - total (int): Number of items to share.
+    - weights (list): Weight of each bin.
+    - capacities (list): Capacity of each bin.
+
+    Returns:
+    - list: Number of items in each bin.
+
+    Raises:
+    - ValueError: If the bins can't hold `total` items.
+    """
+    if total > sum(capacities):
+        raise ValueError(
+            f"{total} bookings don't fit in {sum(capacities)} slots")
+    counts = [0] * len(weights)
+    open_bins = [i for i, capacity in enumerate(capacities) if capacity]
+    while total:
+        scale = total / sum(weights[i] for i in open_bins)
+        still_open = []
+        shared = 0
+        for i in open_bins:
+            room = capacities[i] - counts[i]
+            take = min(room, int(weights[i] * scale))
+            counts[i] += take
+            shared += take
+            if take < room:
+                still_open.append(i)
+        total -= shared
+        if not shared:
+            # every share rounded down to nothing, so fewer items are
+            # left than open bins: one each to the most popular
+            still_open.sort(key=weights.__getitem__, reverse=True)
+            for i in still_open[:total]:
+                counts[i] += 1
+            total = 0
+        open_bins = still_open
+    return counts
+
+
+def _pick_members(rng, members, cum_weights, count):
+    """
+    Pick `count` different members, weighted by their activity.
+    Members are drawn until enough different ones are picked, and
+    uniformly if activity is so skewed that the same few keep being
+    drawn.
+    """
+    picked = set()
+    for _ in range(10):
+        picked.update(rng.choices(
+            members, cum_weights=cum_weights, k=count - len(picked)))
+        if len(picked) == count:
+            return picked
+    while len(picked) < count:
+        picked.add(rng.choice(members))
+    return picked
+
+
+def insert_rows(model, fields, rows, batch_size=SEED_BATCH_SIZE):
+    """
+    Insert rows into a model's table with batched executemany.
+
+    bulk_create spends most of its time building a model instance
+    and compiling SQL for every row, which dominates at millions of
+    rows; this is for rows whose primary keys aren't needed back.
+    Values must already be in their database form, and no signals
+    are sent or auto_now fields filled in.
+
+    Parameters:
+    - model (Model): The model whose table the rows go into.
+    - fields (list): Names of the fields, in the order of each row.
+    - rows (list): Tuples of field values.
+    - batch_size (int): Rows per executemany.
+    """
+    quote = connection.ops.quote_name
+    columns = ", ".join(
+        quote(model._meta.get_field(field).column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = (f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+           f"VALUES ({placeholders})")
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def _db_now(model, field):
+    return model._meta.get_field(field).get_db_prep_save(
+        timezone.now(), connection)
+
+
+def _generate_bookings(task):
+    """
+    Create the bookings of a chunk of classes. Run in the worker
+    processes, or in this one, with everything it needs in `task`,
+    so the same seed generates the same bookings however many
+    workers there are.
+
+    Returns:
+    - int: The number of bookings created.
+    """
+    seed, members, cum_weights, classes, batch_size = task
+    rng = random.Random(seed)
+    booking_date = _db_now(Bookings, "booking_date")
+    bookings = [
+        (user_id, class_id, booking_date)
+        for class_id, count in classes
+        for user_id in _pick_members(rng, members, cum_weights, count)
+    ]
+    # inserting in user order keeps the user indexes' pages hot
+    bookings.sort()
+    with transaction.atomic():
+        insert_rows(
+            Bookings, ["user", "class_id", "booking_date"], bookings,
+            batch_size)
+    return len(bookings)
+
+
+def generate_dataset(classes, members, bookings, popularity=1.0,
+                     activity=0.5, private_share=0.1, seed=0, workers=1,
+                     batch_size=SEED_BATCH_SIZE, progress=None):
+    """
+    Generate a large, realistic dataset for load and scale testing.
+
+    An admin, 'gen-admin', is created along with the members, to
+    request the admin pages as. Users share one password hash,
+    SEED_PASSWORD, so it is hashed only once. Users are inserted
+    with batched bulk_create, and classes and bookings, which are
+    far more numerous, with the batched executemany of
+    `insert_rows`. How many bookings each class gets is worked out
+    before the
+    classes are created, from their popularity and capacity, so
+    their slot counters are created consistent with their bookings.
+    Classes take the free slots of the schedule used by
+    seed_dataset, so they never clash with classes already in the
+    database.
+
+    The bookings are generated in chunks of GENERATE_CHUNK_SIZE
+    classes, which can be spread over worker processes. SQLite
+    allows a single writer, so it always uses one.
+
+    Parameters:
+    - classes (int): Number of classes to create.
+    - members (int): Number of members to create.
+    - bookings (int): Number of bookings to create.
+    - popularity (float): Zipf exponent of the popularity of the
+    classes; 0 spreads bookings evenly.
+    - activity (float): Zipf exponent of how often members book; 0
+    makes every member as active as the others.
+    - private_share (float): Share of the classes that are private,
+    with a capacity of PRIVATE_CAPACITIES rather than
+    GROUP_CAPACITIES.
+    - seed (int): Seed of the random generator.
+    - workers (int): Number of processes inserting bookings.
+    - batch_size (int): Rows inserted per query.
+    - progress (callable): Called with a message after each step.
+
+    Returns:
+    - dict: The number of 'members', 'classes' and 'bookings'
+    created.
+
+    Raises:
+    - ValueError: If the bookings don't fit in the classes.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda message: None)
+    class_types = [int(rng.random() < private_share) for _ in range(classes)]
+    capacities = [
+        min(rng.choice(PRIVATE_CAPACITIES if private else GROUP_CAPACITIES),
+            members)
+        for private in class_types
+    ]
+    counts = allocate(
+        bookings, zipf_weights(classes, popularity, rng), capacities)
+
+    password = make_password(SEED_PASSWORD)
+    group, _ = Group.objects.get_or_create(name="member")
+    with transaction.atomic():
+        _seed_user(f"{GENERATED_PREFIX}admin", "admin", password)
+        users = User.objects.bulk_create([
+            User(username=f"{GENERATED_PREFIX}{n}",
+                 email=f"{GENERATED_PREFIX}{n}@example.com",
+                 password=password)
+            for n in range(members)
+        ], batch_size=batch_size)
+        insert_rows(
+            User.groups.through, ["user", "group"],
+            [(user.id, group.id) for user in users], batch_size)
+        date_joined = _db_now(Members, "date_joined")
+        insert_rows(
+            Members, ["user", "date_joined", "phone_number"],
+            [(user.id, date_joined, user.username) for user in users],
+            batch_size)
+    progress(f"Created {members} members")
+
+    taken = set(Classes.objects.values_list(
+        "class_date", "class_start_time", "class_end_time"))
+    free_slots = (
+        slot for slot in map(_slot, count_from(0)) if slot not in taken)
+    last_id = Classes.objects.aggregate(last=Max("id"))["last"] or 0
+    fields = [
+        "class_name", "class_description", "class_type", "class_date",
+        "class_start_time", "class_end_time", "slots_available",
+        "slots_filled", "updated_at",
+    ]
+    prepare = [
+        Classes._meta.get_field(field).get_db_prep_save for field in fields]
+    updated_at = _db_now(Classes, "updated_at")
+    rows = []
+    for n, (class_type, capacity, count, slot) in enumerate(
+            zip(class_types, capacities, counts, free_slots)):
+        rows.append((
+            f"{CLASSES[class_type][1]} class {n}",
+            GENERATED_DESCRIPTION,
+            class_type,
+            prepare[3](slot[0], connection),
+            prepare[4](slot[1], connection),
+            prepare[5](slot[2], connection),
+            capacity - count,
+            count,
+            updated_at,
+        ))
+    with transaction.atomic():
+        insert_rows(Classes, fields, rows, batch_size)
+    progress(f"Created {classes} classes")
+
+    member_ids = [user.id for user in users]
+    cum_weights = list(accumulate(zipf_weights(members, activity, rng)))
+    # the classes' bookings are read back from their counters, so
+    # their ids aren't needed from the insert
+    booked = list(Classes.objects.filter(
+        id__gt=last_id, class_description=GENERATED_DESCRIPTION,
+        slots_filled__gt=0,
+    ).order_by("id").values_list("id", "slots_filled"))
+    tasks = [
+        (seed * 1_000_003 + n, member_ids, cum_weights,
+         booked[start:start + GENERATE_CHUNK_SIZE], batch_size)
+        for n, start in enumerate(
+            range(0, len(booked), GENERATE_CHUNK_SIZE))
+    ]
+    if connection.vendor == "sqlite":
+        workers = 1
+    if workers > 1 and len(tasks) > 1:
+        # the workers are forked, so they must open their own
+        # database connections rather than share this one's
+        connections.close_all()
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            created = sum(pool.imap_unordered(_generate_bookings, tasks))
+    else:
+        created = sum(map(_generate_bookings, tasks))
+    progress(f"Created {created} bookings")
+    return {"members": members, "classes": classes, "bookings": created}
@@ -0,0 +1,191 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connections
+
+from layout.slow_queries import fingerprint, normalize_sql
+
+# The most queries each named URL may run once the user's roles are
+# cached in their session, which must not grow with the data
+QUERY_BUDGETS = {
+    "homepage": 0,
+    "register": 0,
+    "create_member": 2,
+    "login": 0,
+    "password_reset_confirm": 4,
+    "logout": 0,
+    "available_classes": 2,
+    # session, user, user count, users with their member rows
+    "members": 4,
+    "update_member": 3,
+    "delete_member": 3,
+    # session, user, class stats, user count, members page,
+    # classes page
+    "admin_dashboard": 6,
+    "create_class": 2,
+    "create_series": 2,
+    "copy_week": 2,
+    "update_class": 3,
+    "delete_class": 3,
+    "classes": 4,
+    "book_class": 3,
+    "cancel_booking": 4,
+    "join_waitlist": 2,
+    "leave_waitlist": 3,
+    # session, user, upcoming and total booking counts, a page of
+    # bookings with their classes, waitlist, calendar feed
+    "user_bookings": 7,
+    "get_classes": 2,
+    # session, user, booking count
+    "profile": 3,
+    "import": 2,
+    "export": 3,
+    # feed state
+    "schedule_feed": 1,
+    # token, feed state
+    "member_feed": 2,
+    "metrics": 2,
+    "profiles": 2,
+    "profile_download": 2,
+}
+
+# The most queries each POST in POST_BENCHMARKS may run, which
+# must not grow with the data either
+POST_QUERY_BUDGETS = {
+    # session, user, claim the slot, insert the booking
+    "book_class": 4,
+    # session, user, booking, delete it, release the slot, waitlist
+    "cancel_booking": 6,
+    # session, user, class, booked already, insert the entry
+    "join_waitlist": 5,
+    # session, user, entry, delete it
+    "leave_waitlist": 4,
+    # a cancellation, then claim the slot, delete the entry and
+    # book its user
+    "promote_waitlist": 9,
+}
+
+# Savepoint statements, which depend on whether the code runs
+# inside a transaction (as it does in tests) rather than on what it
+# does, so they aren't counted
+_savepoint = re.compile(
+    r"^\s*(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b",
+    re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a block of code runs more queries than its budget.
+    """
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper recording the SQL of the queries it
+    sees, other than savepoints.
+
+    Attributes:
+    - statements (list): The SQL of each query, with placeholders.
+    """
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _savepoint.match(sql):
+            self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def duplicates(self):
+        """
+        Return the query shapes run more than once, the usual sign
+        of an N+1, most repeated first.
+
+        Returns:
+        - list: (fingerprint, times run, normalized SQL) tuples.
+        """
+        shapes = Counter(map(normalize_sql, self.statements))
+        return [
+            (fingerprint(sql), times, sql)
+            for sql, times in shapes.most_common()
+            if times > 1
+        ]
+
+    def report(self):
+        """
+        Return the duplicated query shapes as lines of text, for
+        failure messages.
+        """
+        return "\n".join(
+            f"  {key} x{times}: {sql}"
+            for key, times, sql in self.duplicates())
+
+
+@contextmanager
+def query_budget(budget, label="The block", using="default"):
+    """
+    Fail if the code in the block, or the decorated function, runs
+    more than `budget` queries.
+
+    Parameters:
+    - budget (int): The most queries allowed.
+    - label (str): What ran the queries, for the failure message.
+    - using (str): Alias of the database to count queries on.
+
+    Yields:
+    - QueryRecorder: The queries run so far.
+
+    Raises:
+    - QueryBudgetExceeded: With the duplicated query shapes, if
+    the budget was exceeded.
+    """
+    recorder = QueryRecorder()
+    with connections[using].execute_wrapper(recorder):
+        yield recorder
+    if recorder.count > budget:
+        message = (f"{label} ran {recorder.count} queries, over its "
+                   f"budget of {budget}")
+        if recorder.duplicates():
+            message += ". Repeated queries:\n" + recorder.report()
+        raise QueryBudgetExceeded(message)
+
+
+def check_query_budgets(smaller, larger, budgets=QUERY_BUDGETS):
+    """
+    Check the queries views ran against a small and a larger
+    dataset.
+
+    Parameters:
+    - smaller (dict): QueryRecorder of each URL name's request
+    against the smaller dataset.
+    - larger (dict): The same against the larger dataset.
+    - budgets (dict): The budget of each name, e.g.
+    POST_QUERY_BUDGETS for the POST benchmarks.
+
+    Returns:
+    - list: A message for each view whose query count grew with
+    the data or is over its budget, with the query shapes it
+    repeated.
+    """
+    failures = []
+    for name, recorder in larger.items():
+        problems = []
+        if recorder.count > smaller[name].count:
+            problems.append(
+                f"queries grow with the data, {smaller[name].count} to "
+                f"{recorder.count}")
+        budget = budgets.get(name)
+        if budget is None:
+            problems.append("no query budget")
+        elif recorder.count > budget:
+            problems.append(f"{recorder.count} queries, budget {budget}")
+        if problems:
+            message = f"{name}: {', '.join(problems)}"
+            if recorder.duplicates():
+                message += "\n" + recorder.report()
+            failures.append(message)
+    return failures
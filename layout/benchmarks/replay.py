@@ -0,0 +1,298 @@
+import json
+import queue
+import threading
+import time
+from datetime import timezone as dt_timezone
+from urllib.parse import urlencode
+
+import requests
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.urls import Resolver404, resolve
+from django.utils.dateparse import parse_datetime
+
+# Roles a logged request can be made as
+ROLES = ("anonymous", "member", "admin")
+# Endpoint of paths that don't match any URL
+UNMATCHED = "(unmatched)"
+# Seconds an HTTP request may take before it is counted as failed
+HTTP_TIMEOUT = 30
+
+
+def _parse_timestamp(value):
+    """
+    Return a log timestamp, given as epoch seconds or an ISO 8601
+    date and time, as epoch seconds. Times without a timezone are
+    taken as UTC.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise ValueError(f"invalid timestamp {value!r}")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment.timestamp()
+
+
+def load_log(lines):
+    """
+    Parse a recorded access log.
+
+    Each line is a JSON object with the request's 'method', 'path'
+    (with any query string), the 'role' of the user who made it and
+    its 'timestamp'. A 'user' identifying who made it, so their
+    requests are replayed in one session, and form 'data' for
+    POSTs are optional. Blank lines are skipped.
+
+    Parameters:
+    - lines (iterable): The lines of the log.
+
+    Returns:
+    - list: A dict for each request, in the order they were made,
+    with its 'offset' in seconds from the first request.
+
+    Raises:
+    - ValueError: Naming the line of the first invalid entry.
+    """
+    entries = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("not a JSON object")
+            method = str(record.get("method", "GET")).upper()
+            path = record["path"]
+            if not isinstance(path, str) or not path.startswith("/"):
+                raise ValueError(f"invalid path {path!r}")
+            role = record.get("role") or "anonymous"
+            if role not in ROLES:
+                raise ValueError(f"unknown role {role!r}")
+            data = record.get("data") or {}
+            if not isinstance(data, dict):
+                raise ValueError("data must be an object")
+            entries.append({
+                "method": method,
+                "path": path,
+                "role": role,
+                "user": record.get("user"),
+                "data": data,
+                "timestamp": _parse_timestamp(record["timestamp"]),
+            })
+        except KeyError as error:
+            raise ValueError(f"Line {number}: missing {error}")
+        except ValueError as error:
+            raise ValueError(f"Line {number}: {error}")
+    entries.sort(key=lambda entry: entry["timestamp"])
+    for entry in entries:
+        entry["offset"] = entry["timestamp"] - entries[0]["timestamp"]
+    return entries
+
+
+def endpoint(method, path):
+    """
+    Return the endpoint a request is reported under: its method and
+    the name of the URL it matches, so requests for different
+    objects are grouped together.
+    """
+    try:
+        match = resolve(path.split("?", 1)[0])
+    except Resolver404:
+        return f"{method} {UNMATCHED}"
+    return f"{method} {match.url_name or match.view_name}"
+
+
+def map_accounts(entries, accounts):
+    """
+    Assign each user in the log one of the accounts of their role.
+
+    Users are assigned accounts in the order they first appear, so
+    a replay is repeatable; when a role has fewer accounts than
+    users, accounts are shared. Requests without a 'user' share one
+    session per role.
+
+    Parameters:
+    - entries (list): The requests, from `load_log`.
+    - accounts (dict): The User accounts available for each role
+    other than 'anonymous'.
+
+    Returns:
+    - dict: The account (or None for anonymous users) of each
+    (role, user) session key.
+
+    Raises:
+    - ValueError: If the log has requests for a role without
+    accounts.
+    """
+    sessions = {}
+    assigned = {role: 0 for role in ROLES}
+    for entry in entries:
+        key = (entry["role"], entry["user"])
+        if key in sessions:
+            continue
+        if entry["role"] == "anonymous":
+            sessions[key] = None
+            continue
+        pool = accounts.get(entry["role"])
+        if not pool:
+            raise ValueError(
+                f"No {entry['role']} accounts to replay the log as")
+        sessions[key] = pool[assigned[entry["role"]] % len(pool)]
+        assigned[entry["role"]] += 1
+    return sessions
+
+
+class ClientSession:
+    """
+    A user replaying requests through Django's test client, in this
+    process.
+    """
+    def __init__(self, user):
+        self.client = Client(
+            HTTP_HOST="localhost", raise_request_exception=False)
+        if user is not None:
+            self.client.force_login(user)
+
+    def request(self, method, path, data):
+        response = self.client.generic(
+            method, path, data=urlencode(data, doseq=True),
+            content_type="application/x-www-form-urlencoded")
+        if response.streaming:
+            for chunk in response.streaming_content:
+                pass
+        return response.status_code
+
+
+class HttpSession:
+    """
+    A user replaying requests over HTTP, against a running server.
+    """
+    def __init__(self, user, url, password):
+        self.url = url
+        self.session = requests.Session()
+        self.session.get(f"{url}/login/", timeout=HTTP_TIMEOUT)
+        if user is None:
+            return
+        response = self.session.post(
+            f"{url}/login/",
+            data={
+                "email": user.email,
+                "password": password,
+                "csrfmiddlewaretoken": self.session.cookies.get(
+                    "csrftoken", ""),
+            },
+            headers={"Referer": f"{url}/login/"},
+            allow_redirects=False,
+            timeout=HTTP_TIMEOUT,
+        )
+        if response.status_code != 302:
+            raise ValueError(f"Could not log in as {user.email}")
+
+    def request(self, method, path, data):
+        response = self.session.request(
+            method,
+            self.url + path,
+            data=data or None,
+            headers={
+                "X-CSRFToken": self.session.cookies.get("csrftoken", ""),
+                "Referer": self.url + path,
+            },
+            allow_redirects=False,
+            timeout=HTTP_TIMEOUT,
+        )
+        return response.status_code
+
+
+def replay(entries, sessions, speed=1.0, concurrency=20):
+    """
+    Replay logged requests on the schedule they were recorded on.
+
+    Each request is started `offset / speed` seconds after the
+    replay starts, by the first free of `concurrency` threads, so
+    bursts in the log are replayed as bursts. A session's requests
+    are made one at a time, as from a browser. When every thread is
+    busy, requests start late; how late is reported as their lag.
+    A request that raises is recorded as failed, so every entry has
+    a result.
+
+    Parameters:
+    - entries (list): The requests, from `load_log`.
+    - sessions (dict): The ClientSession or HttpSession of each
+    (role, user) key.
+    - speed (float): How many times faster than recorded to replay;
+    0 replays every request as fast as possible.
+    - concurrency (int): Number of threads making requests.
+
+    Returns:
+    - tuple: (a dict for each request with its 'endpoint', 'status'
+    (None if it failed outright), 'seconds' and 'lag' in seconds,
+    the wall time of the replay).
+    """
+    pending = queue.SimpleQueue()
+    locks = {key: threading.Lock() for key in sessions}
+    results = []
+
+    def work():
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                entry, due = item
+                key = (entry["role"], entry["user"])
+                with locks[key]:
+                    lag = max(0.0, time.perf_counter() - due)
+                    begin = time.perf_counter()
+                    try:
+                        status = sessions[key].request(
+                            entry["method"], entry["path"], entry["data"])
+                    except Exception:
+                        # anything that stops a request from completing,
+                        # such as a network error or an error the test
+                        # client raises despite raise_request_exception,
+                        # is a failure of that request alone, and must
+                        # not stop this thread replaying the rest
+                        status = None
+                    seconds = time.perf_counter() - begin
+                results.append({
+                    "endpoint": endpoint(entry["method"], entry["path"]),
+                    "status": status,
+                    "seconds": seconds,
+                    "lag": lag,
+                })
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=work, daemon=True)
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    for entry in entries:
+        due = start + (entry["offset"] / speed if speed else 0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((entry, due))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def seeded_accounts():
+    """
+    Return the accounts to replay as for each role: the users in
+    the 'member' and 'admin' groups, in the order they were
+    created.
+    """
+    return {
+        role: list(User.objects.filter(groups__name=role).order_by("id"))
+        for role in ("member", "admin")
+    }
@@ -0,0 +1,391 @@
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from layout.benchmarks.queries import QueryRecorder
+from layout.models import Bookings, CalendarFeed, Classes, Waitlist
+
+# URL patterns that aren't the app's own views
+EXCLUDED_URLS = {"admin/"}
+# Days shown by FullCalendar's month view, which starts on the
+# Monday of the week the month starts in
+CALENDAR_DAYS = 42
+
+
+def _fixtures(users):
+    """
+    Return the objects the benchmarked URLs point at.
+    """
+    member = users["member"]
+    booking = Bookings.objects.filter(user=member).order_by("id").first()
+    class_instance = Classes.objects.order_by("id").first()
+    waitlist, _ = Waitlist.objects.get_or_create(
+        user=member, class_id=Classes.objects.order_by("-id").first())
+    month = timezone.localdate().replace(day=1)
+    calendar_start = month - timedelta(days=month.weekday())
+    return {
+        "member": member,
+        "class_id": class_instance.id,
+        "booking_id": booking.id,
+        "waitlist_id": waitlist.id,
+        "feed_token": CalendarFeed.objects.get_or_create(user=member)[0].token,
+        "uidb64": urlsafe_base64_encode(force_bytes(member.pk)),
+        "reset_token": default_token_generator.make_token(member),
+        "calendar_start": calendar_start,
+        "calendar_end": calendar_start + timedelta(days=CALENDAR_DAYS),
+    }
+
+
+# The benchmark of each named URL: the role of the user requesting
+# it, and a function returning its URL arguments from the fixtures
+VIEW_BENCHMARKS = {
+    "homepage": ("anonymous", None),
+    "register": ("anonymous", None),
+    "create_member": ("admin", None),
+    "login": ("anonymous", None),
+    "password_reset_confirm": ("anonymous", lambda f: {
+        "uidb64": f["uidb64"], "token": f["reset_token"]}),
+    "logout": ("anonymous", None),
+    "available_classes": ("member", None),
+    "members": ("admin", None),
+    "update_member": ("admin", lambda f: {"pk": f["member"].id}),
+    "delete_member": ("admin", lambda f: {"pk": f["member"].id}),
+    "admin_dashboard": ("admin", None),
+    "create_class": ("admin", None),
+    "create_series": ("admin", None),
+    "copy_week": ("admin", None),
+    "update_class": ("admin", lambda f: {"pk": f["class_id"]}),
+    "delete_class": ("admin", lambda f: {"pk": f["class_id"]}),
+    "classes": ("member", None),
+    "book_class": ("member", lambda f: {"pk": f["class_id"]}),
+    "cancel_booking": ("member", lambda f: {"pk": f["booking_id"]}),
+    "join_waitlist": ("member", lambda f: {"pk": f["class_id"]}),
+    "leave_waitlist": ("member", lambda f: {"pk": f["waitlist_id"]}),
+    "user_bookings": ("member", None),
+    "get_classes": ("anonymous", None),
+    "profile": ("member", None),
+    "import": ("admin", None),
+    "export": ("admin", lambda f: {"dataset": "classes"}),
+    "schedule_feed": ("anonymous", None),
+    "member_feed": ("anonymous", lambda f: {"token": f["feed_token"]}),
+    "metrics": ("admin", None),
+    "profiles": ("admin", None),
+    "profile_download": ("admin", lambda f: {"filename": f["profile"]}),
+}
+
+# The query string of the benchmarks that need one, from the
+# fixtures. The calendar feed is requested for the current month's
+# view, in the format FullCalendar sends, rather than for every
+# class there is.
+VIEW_QUERY_STRINGS = {
+    "get_classes": lambda f: {
+        "start": f"{f['calendar_start'].isoformat()}T00:00:00Z",
+        "end": f"{f['calendar_end'].isoformat()}T00:00:00Z",
+    },
+}
+
+
+def url_names():
+    """
+    Return the names of the URL patterns in tough_glove/urls.py, or
+    for unnamed patterns such as included URLconfs, their route.
+    """
+    return [
+        getattr(pattern, "name", None) or str(pattern.pattern)
+        for pattern in get_resolver().url_patterns
+    ]
+
+
+def _request(client, url):
+    """
+    Request a URL and read the whole response, returning its
+    status code and the QueryRecorder of the queries it ran.
+    """
+    queries = QueryRecorder()
+    with connection.execute_wrapper(queries):
+        response = client.get(url)
+        if response.streaming:
+            for chunk in response.streaming_content:
+                pass
+    return response.status_code, queries
+
+
+def _requests(users, names):
+    """
+    Yield the URL name, client and URL of each view in
+    VIEW_BENCHMARKS, or only those named in `names`, after
+    requesting it once to warm caches and the user's session.
+    """
+    cache.clear()
+    clients = {
+        role: Client(HTTP_HOST="localhost", raise_request_exception=False)
+        for role in ("anonymous", "member", "admin")
+    }
+    clients["member"].force_login(users["member"])
+    clients["admin"].force_login(users["admin"])
+    fixtures = _fixtures(users)
+    # store a profile to download
+    fixtures["profile"] = clients["admin"].get(
+        reverse("profiles") + "?profile=1")["X-Profile"] + ".prof"
+
+    for name, (role, arguments) in VIEW_BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        url = reverse(name, kwargs=arguments(fixtures) if arguments else None)
+        if name in VIEW_QUERY_STRINGS:
+            url += "?" + urlencode(VIEW_QUERY_STRINGS[name](fixtures))
+        client = clients[role]
+        _request(client, url)
+        yield name, client, url
+
+
+def run_benchmarks(users, repeat=5, names=None):
+    """
+    Benchmark every view in VIEW_BENCHMARKS against the current
+    database.
+
+    Each URL is requested once to warm caches, then `repeat` more
+    times. Responses are read in full, so streamed exports and
+    feeds are timed to their last byte. Profiles are stored in a
+    temporary directory, which is removed afterwards.
+
+    Parameters:
+    - users (dict): The 'admin' and 'member' users to request as,
+    from `seed_dataset`.
+    - repeat (int): Number of timed requests per URL.
+    - names (iterable): Only benchmark these URL names.
+
+    Returns:
+    - dict: For each URL name, the median latency 'ms', the
+    number of 'queries' of the last request and its 'status'.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as profiles, override_settings(
+            REQUEST_PROFILING_DIR=profiles):
+        for name, client, url in _requests(users, names):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                status, queries = _request(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {
+                "ms": round(statistics.median(timings), 2),
+                "queries": queries.count,
+                "status": status,
+            }
+    return results
+
+
+def measure_queries(users, names=None):
+    """
+    Request every view in VIEW_BENCHMARKS once, after a warm-up
+    request, and record the queries it runs.
+
+    Parameters:
+    - users (dict): The 'admin' and 'member' users to request as,
+    from `seed_dataset`.
+    - names (iterable): Only request these URL names.
+
+    Returns:
+    - dict: The QueryRecorder of each URL name.
+    """
+    with tempfile.TemporaryDirectory() as profiles, override_settings(
+            REQUEST_PROFILING_DIR=profiles):
+        return {
+            name: _request(client, url)[1]
+            for name, client, url in _requests(users, names)
+        }
+
+
+def _post_fixtures(users):
+    """
+    Create the classes, bookings and waitlist entries the POST
+    benchmarks act on, and return their primary keys. They are
+    put on the day after the last class, at times no seeded class
+    starts at, so they never clash with the dataset or earlier
+    fixtures.
+
+    The member has a booking to cancel, a free class to book, a
+    full class to join the waitlist of, and a waitlist entry to
+    leave. A second full class has the member's booking and the
+    admin on its waitlist, so cancelling it promotes the admin.
+    """
+    member, other = users["member"], users["admin"]
+    last = Classes.objects.order_by("-class_date").values_list(
+        "class_date", flat=True).first()
+    day = max(last or timezone.localdate(), timezone.localdate())
+    day += timedelta(days=1)
+    names = ("open", "booked", "full", "queued", "promoted")
+    classes = {
+        name: Classes.objects.create(
+            class_name=f"POST benchmark {name}",
+            class_description="Benchmark class",
+            class_date=day,
+            class_start_time=f"{6 + n:02d}:10:00",
+            class_end_time=f"{6 + n:02d}:50:00",
+            slots_available=4 if name in ("open", "booked") else 0,
+            slots_filled=0 if name == "open" else 1,
+        )
+        for n, name in enumerate(names)
+    }
+    bookings = Bookings.objects.bulk_create([
+        Bookings(user=member, class_id=classes["booked"]),
+        Bookings(user=other, class_id=classes["full"]),
+        Bookings(user=other, class_id=classes["queued"]),
+        Bookings(user=member, class_id=classes["promoted"]),
+    ])
+    Waitlist.objects.bulk_create([
+        Waitlist(user=member, class_id=classes["queued"]),
+        Waitlist(user=other, class_id=classes["promoted"]),
+    ])
+    return {
+        "open_class": classes["open"].id,
+        "booking": bookings[0].id,
+        "full_class": classes["full"].id,
+        "waitlist": Waitlist.objects.get(
+            user=member, class_id=classes["queued"]).id,
+        "promoted_booking": bookings[3].id,
+    }
+
+
+# The POST benchmarks, each the URL name the member posts to and a
+# function returning its URL arguments from the POST fixtures.
+# 'promote_waitlist' cancels a booking in a class with a waitlist.
+POST_BENCHMARKS = {
+    "book_class": ("book_class", lambda f: {"pk": f["open_class"]}),
+    "cancel_booking": ("cancel_booking", lambda f: {"pk": f["booking"]}),
+    "join_waitlist": ("join_waitlist", lambda f: {"pk": f["full_class"]}),
+    "leave_waitlist": ("leave_waitlist", lambda f: {"pk": f["waitlist"]}),
+    "promote_waitlist": ("cancel_booking", lambda f: {
+        "pk": f["promoted_booking"]}),
+}
+
+
+def measure_post_queries(users):
+    """
+    Make each POST in POST_BENCHMARKS once, as the member, against
+    freshly created fixtures, and record the queries it runs.
+
+    The member's roles are cached in their session first, as they
+    would be by the page the form was posted from.
+
+    Parameters:
+    - users (dict): The 'admin' and 'member' users, from
+    `seed_dataset`.
+
+    Returns:
+    - dict: (status code, QueryRecorder) of each POST benchmark.
+    """
+    client = Client(HTTP_HOST="localhost", raise_request_exception=False)
+    client.force_login(users["member"])
+    client.get(reverse("user_bookings"))
+    fixtures = _post_fixtures(users)
+    results = {}
+    for name, (url_name, arguments) in POST_BENCHMARKS.items():
+        url = reverse(url_name, kwargs=arguments(fixtures))
+        queries = QueryRecorder()
+        with connection.execute_wrapper(queries):
+            response = client.post(url)
+        results[name] = (response.status_code, queries)
+    return results
+
+
+def merge_baseline(baseline, results):
+    """
+    Store benchmark results in a baseline, leaving out views that
+    failed with a server error, so a broken view is never recorded
+    as its expected result.
+
+    Parameters:
+    - baseline (dict): The baseline to update, by dataset size (as
+    a string), then by URL name.
+    - results (dict): Results in the same shape, from
+    `run_benchmarks`.
+
+    Returns:
+    - dict: The status code of each view left out, by URL name.
+    Their earlier baseline, if any, is removed as well.
+    """
+    failed = {
+        name: result["status"]
+        for views in results.values()
+        for name, result in views.items()
+        if result["status"] >= 500
+    }
+    for size, views in results.items():
+        stored = baseline.setdefault(size, {})
+        for name, result in views.items():
+            if name in failed:
+                stored.pop(name, None)
+            else:
+                stored[name] = result
+    return failed
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Compare benchmark results with a baseline.
+
+    Parameters:
+    - results (dict): Results by dataset size (as a string), then
+    by URL name, from `run_benchmarks`.
+    - baseline (dict): Earlier results in the same shape.
+    - tolerance (float): Percentage a view may be slower than its
+    baseline.
+    - min_delta_ms (float): Slowdowns smaller than this many
+    milliseconds are ignored as noise.
+
+    Returns:
+    - list: A message for each regression: a view that got more
+    than `tolerance` percent slower, ran more queries than its
+    baseline, started running more queries as the dataset grows,
+    or started failing.
+    """
+    failures = []
+    sizes = sorted(results, key=int)
+    for size in sizes:
+        for name, result in results[size].items():
+            before = baseline.get(size, {}).get(name)
+            if result["status"] >= 400 and (
+                    before is None or before["status"] != result["status"]):
+                failures.append(
+                    f"{name} at {size}: status {result['status']}")
+            if before is None:
+                continue
+            if (result["ms"] > before["ms"] * (1 + tolerance / 100)
+                    and result["ms"] - before["ms"] > min_delta_ms):
+                failures.append(
+                    f"{name} at {size}: {result['ms']} ms, was "
+                    f"{before['ms']} ms")
+            if result["queries"] > before["queries"]:
+                failures.append(
+                    f"{name} at {size}: {result['queries']} queries, was "
+                    f"{before['queries']}")
+
+    smallest, largest = sizes[0], sizes[-1]
+    for name in results[largest]:
+        queries = [results[size][name]["queries"] for size in sizes]
+        if queries[-1] <= queries[0]:
+            continue
+        known = [
+            baseline[size][name]["queries"] for size in (smallest, largest)
+            if name in baseline.get(size, {})
+        ]
+        if len(known) == 2 and known[1] > known[0]:
+            # already grew with the data when the baseline was taken
+            continue
+        failures.append(
+            f"{name}: queries grow with the data, {queries[0]} at "
+            f"{smallest} to {queries[-1]} at {largest}")
+    return failures
@@ -0,0 +1,261 @@
+from django.db import transaction, IntegrityError
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from layout.models import Classes, Bookings, Waitlist, slots_settled
+
+# Possible outcomes of a booking attempt
+BOOKED = "booked"
+FULL = "full"
+ALREADY_BOOKED = "already_booked"
+NOT_FOUND = "not_found"
+# Possible outcomes of joining a waitlist
+WAITLISTED = "waitlisted"
+ALREADY_WAITLISTED = "already_waitlisted"
+NOT_FULL = "not_full"
+
+# Number of bookings shown per page of a member's bookings
+BOOKINGS_PAGE_SIZE = 20
+
+
+def book_class(user, class_id):
+    """
+    Book a class for a user without racing other bookers.
+
+    A slot is claimed with a single conditional UPDATE that only
+    succeeds while the class still has slots available, so two
+    concurrent requests can never both take the last slot. The
+    booking row is inserted in the same transaction; if the insert
+    violates the (user, class_id) unique constraint the whole
+    transaction, including the claimed slot, is rolled back.
+
+    Parameters:
+    - user: The User making the booking.
+    - class_id: Primary key of the class to be booked.
+
+    Returns:
+    - str: One of BOOKED, FULL, ALREADY_BOOKED or NOT_FOUND.
+    """
+    try:
+        with transaction.atomic():
+            claimed = Classes.objects.filter(
+                id=class_id, slots_available__gt=0
+            ).update(
+                slots_filled=F("slots_filled") + 1,
+                slots_available=F("slots_available") - 1,
+                updated_at=timezone.now(),
+            )
+            if claimed:
+                Bookings.objects.create(user=user, class_id_id=class_id)
+                return BOOKED
+    except IntegrityError:
+        return ALREADY_BOOKED
+
+    # Nothing was claimed, work out why. This only runs on the
+    # failure path so a successful booking stays at two statements.
+    if Bookings.objects.filter(user=user, class_id_id=class_id).exists():
+        return ALREADY_BOOKED
+    if Classes.objects.filter(id=class_id).exists():
+        return FULL
+    return NOT_FOUND
+
+
+
+def join_waitlist(user, class_id):
+    """
+    Add a user to the waitlist of a fully booked class.
+
+    Parameters:
+    - user: The User joining the waitlist.
+    - class_id: Primary key of the class.
+
+    Returns:
+    - str: One of WAITLISTED, ALREADY_WAITLISTED, ALREADY_BOOKED,
+    NOT_FULL or NOT_FOUND.
+    """
+    class_instance = Classes.objects.filter(id=class_id).only(
+        "slots_available").first()
+    if class_instance is None:
+        return NOT_FOUND
+    if Bookings.objects.filter(user=user, class_id_id=class_id).exists():
+        return ALREADY_BOOKED
+    if class_instance.slots_available > 0:
+        return NOT_FULL
+    try:
+        with transaction.atomic():
+            Waitlist.objects.create(user=user, class_id_id=class_id)
+    except IntegrityError:
+        return ALREADY_WAITLISTED
+    return WAITLISTED
+
+
+def promote_waitlist(class_id):
+    """
+    Book the first user on a class's waitlist into a free slot.
+
+    Must be called inside a transaction. The head of the waitlist
+    is found with one probe of the (class_id, joined_at, id) index
+    and locked with SKIP LOCKED where the database supports it, so
+    concurrent cancellations of the same class each promote a
+    different user. The slot is claimed with the same conditional
+    UPDATE as `book_class`, so a class is never overfilled. Users
+    who have since booked the class themselves are skipped.
+
+    Parameters:
+    - class_id: Primary key of the class with a freed slot.
+
+    Returns:
+    - Waitlist: The promoted entry, or None if nobody was promoted.
+    """
+    already_booked = Bookings.objects.filter(
+        user=OuterRef("user"), class_id=OuterRef("class_id"))
+    entry = (
+        Waitlist.objects.select_for_update(skip_locked=True)
+        .filter(class_id_id=class_id)
+        .exclude(Exists(already_booked))
+        .order_by("joined_at", "id")
+        .first()
+    )
+    if entry is None:
+        return None
+    claimed = Classes.objects.filter(
+        id=class_id, slots_available__gt=0
+    ).update(
+        slots_filled=F("slots_filled") + 1,
+        slots_available=F("slots_available") - 1,
+        updated_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+    entry.delete()
+    Bookings.objects.create(user_id=entry.user_id, class_id_id=class_id)
+    return entry
+
+
+def cancel_booking(booking):
+    """
+    Cancel a booking and hand its slot to the waitlist.
+
+    The booking is deleted, which frees its slot through the
+    `decrement_slots` signal, and the first waitlisted user is
+    promoted in the same transaction, so the freed slot can't be
+    taken by anyone else in between.
+
+    Parameters:
+    - booking (Bookings): The booking to cancel.
+
+    Returns:
+    - Waitlist: The promoted waitlist entry, or None.
+    """
+    with transaction.atomic():
+        booking.delete()
+        return promote_waitlist(booking.class_id_id)
+
+
+def delete_class(class_instance):
+    """
+    Delete a class together with its bookings and waitlist.
+
+    Deleting a class cascades to its bookings, and `decrement_slots`
+    would then run an UPDATE for each of them to adjust a class
+    that is about to be deleted anyway. The delete runs with
+    `slots_settled`, so the bookings are deleted together and the
+    number of queries doesn't depend on how many the class has.
+
+    Parameters:
+    - class_instance (Classes): The class to delete.
+    """
+    with transaction.atomic(), slots_settled():
+        class_instance.delete()
+
+
+def delete_member(user):
+    """
+    Delete a user together with their bookings and waitlist entries.
+
+    A user has at most one booking per class, so the slots of every
+    class they booked are released with a single UPDATE, and the
+    user is then deleted with `slots_settled`, so the bookings that
+    cascade from them don't release their slots a second time, one
+    UPDATE each. Freed slots in upcoming classes with a waitlist
+    are handed to the waitlist, as with a cancellation.
+
+    Parameters:
+    - user: The User to delete.
+    """
+    with transaction.atomic():
+        bookings = Bookings.objects.filter(user=user)
+        upcoming = bookings.filter(
+            class_id__class_date__gte=timezone.localdate())
+        waitlisted = list(
+            Waitlist.objects.filter(class_id__in=upcoming.values("class_id"))
+            .exclude(user=user)
+            .values_list("class_id", flat=True)
+            .distinct()
+        )
+        Classes.objects.filter(id__in=bookings.values("class_id")).update(
+            slots_available=F("slots_available") + 1,
+            slots_filled=F("slots_filled") - 1,
+            updated_at=timezone.now(),
+        )
+        with slots_settled():
+            user.delete()
+        for class_id in waitlisted:
+            promote_waitlist(class_id)
+
+
+def recount_slots(classes):
+    """
+    Recompute the slot counters of classes from their bookings.
+
+    Paths that insert or delete bookings in bulk bypass the
+    per-booking bookkeeping, so they call this once afterwards. A
+    class's capacity is the sum of its counters, so it is kept
+    while `slots_filled` is set to the number of bookings and
+    `slots_available` to what is left, or to zero if the class has
+    more bookings than its capacity. Every class is updated with a
+    single UPDATE whatever the number of classes.
+
+    Parameters:
+    - classes (QuerySet): The classes to recount.
+
+    Returns:
+    - int: The number of classes updated.
+    """
+    booked = Bookings.objects.filter(
+        class_id=OuterRef("pk")
+    ).order_by().values("class_id").annotate(count=Count("id")).values(
+        "count")
+    filled = Coalesce(Subquery(booked), 0)
+    return classes.update(
+        slots_available=Greatest(
+            F("slots_available") + F("slots_filled") - filled, 0),
+        slots_filled=filled,
+        updated_at=timezone.now(),
+    )
+
+
+def get_user_bookings(user, past=False):
+    """
+    Return a member's upcoming or past bookings with their classes.
+
+    The class of each booking is joined in the same query with
+    `select_related`, so listing the bookings never makes a query
+    per booking.
+
+    Parameters:
+    - user: The User whose bookings are listed.
+    - past (bool): List classes before today, most recent first,
+    instead of classes from today onwards in schedule order.
+
+    Returns:
+    - QuerySet: The user's bookings.
+    """
+    bookings = Bookings.objects.filter(user=user).select_related("class_id")
+    today = timezone.localdate()
+    if past:
+        return bookings.filter(class_id__class_date__lt=today).order_by(
+            "-class_id__class_date", "-class_id__class_start_time")
+    return bookings.filter(class_id__class_date__gte=today).order_by(
+        "class_id__class_date", "class_id__class_start_time")
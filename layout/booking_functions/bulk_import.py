@@ -0,0 +1,399 @@
+import csv
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.mail import get_connection, EmailMessage
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.db.models.functions import Lower
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from layout.models import Classes, Bookings, Members, CLASSES
+from layout.roles import get_group
+from layout.booking_functions.booking import recount_slots
+
+# Number of CSV rows validated and saved per transaction
+IMPORT_BATCH_SIZE = 1000
+
+# The columns each kind of import requires, and the optional ones
+IMPORT_COLUMNS = {
+    "members": (
+        ("username", "email"),
+        ("first_name", "last_name", "phone_number"),
+    ),
+    "classes": (
+        ("class_name", "class_date", "class_start_time", "class_end_time",
+         "slots_available"),
+        ("class_description", "class_type"),
+    ),
+    "bookings": (
+        ("username", "class_date", "class_start_time"),
+        ("booked_at",),
+    ),
+}
+
+CLASS_TYPES = {
+    **{str(value): value for value, label in CLASSES},
+    **{label.lower(): value for value, label in CLASSES},
+}
+
+
+def _batches(reader, size):
+    """
+    Yield lists of (line number, row) pairs from a DictReader.
+    """
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, row))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _value(row, column):
+    return (row.get(column) or "").strip()
+
+
+def _parse(parser, row, column):
+    """
+    Parse a column with one of Django's dateparse functions,
+    returning None if it is missing or invalid.
+    """
+    try:
+        return parser(_value(row, column))
+    except ValueError:
+        return None
+
+
+def _import_members(batch, state):
+    """
+    Validate and save a batch of members.
+
+    Users are saved with an unusable password rather than a hashed
+    placeholder, and invited to set their own. Usernames, emails
+    and phone numbers already taken are each found with one query
+    per batch.
+    """
+    errors = []
+    rows = []
+    for line, row in batch:
+        username = _value(row, "username")
+        email = _value(row, "email")
+        phone_number = _value(row, "phone_number")
+        if not username or not email:
+            errors.append((line, "A username and email are required."))
+            continue
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append((line, f"'{email}' is not a valid email."))
+            continue
+        if (username in state["usernames"]
+                or email.lower() in state["emails"]
+                or phone_number in state["phone_numbers"]):
+            errors.append((line, "Duplicates an earlier row."))
+            continue
+        state["usernames"].add(username)
+        state["emails"].add(email.lower())
+        if phone_number:
+            state["phone_numbers"].add(phone_number)
+        rows.append((line, row, username, email, phone_number))
+
+    taken_usernames = set(User.objects.filter(
+        username__in=[r[2] for r in rows]
+    ).values_list("username", flat=True))
+    taken_emails = set(User.objects.alias(
+        email_lower=Lower("email")
+    ).filter(
+        email_lower__in=[r[3].lower() for r in rows]
+    ).values_list("email", flat=True))
+    taken_emails = {email.lower() for email in taken_emails}
+    taken_phone_numbers = set(Members.objects.filter(
+        phone_number__in=[r[4] for r in rows if r[4]]
+    ).values_list("phone_number", flat=True))
+
+    users = []
+    phone_numbers = []
+    for line, row, username, email, phone_number in rows:
+        if username in taken_usernames:
+            errors.append((line, f"Username '{username}' is taken."))
+        elif email.lower() in taken_emails:
+            errors.append((line, f"Email '{email}' is taken."))
+        elif phone_number in taken_phone_numbers:
+            errors.append((line, f"Phone number '{phone_number}' is taken."))
+        else:
+            users.append(User(
+                username=username,
+                email=email,
+                first_name=_value(row, "first_name"),
+                last_name=_value(row, "last_name"),
+                password=make_password(None),
+            ))
+            phone_numbers.append(phone_number)
+
+    users = User.objects.bulk_create(users)
+    group_id = get_group("member").id
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=user.id, group_id=group_id)
+        for user in users
+    ])
+    Members.objects.bulk_create([
+        Members(user=user, phone_number=phone_number)
+        for user, phone_number in zip(users, phone_numbers)
+        if phone_number
+    ])
+    state["created_users"].extend(users)
+    return len(users), errors
+
+
+def _import_classes(batch, state):
+    """
+    Validate and save a batch of classes.
+
+    Classes clashing with an existing class, or with another row,
+    on the same date and start and end times are rejected. The
+    existing classes are found with one query per batch.
+    """
+    errors = []
+    classes = []
+    for line, row in batch:
+        class_date = _parse(parse_date, row, "class_date")
+        start_time = _parse(parse_time, row, "class_start_time")
+        end_time = _parse(parse_time, row, "class_end_time")
+        class_type = CLASS_TYPES.get(_value(row, "class_type").lower() or "0")
+        try:
+            slots = int(_value(row, "slots_available"))
+        except ValueError:
+            slots = -1
+        if not _value(row, "class_name"):
+            errors.append((line, "A class name is required."))
+        elif None in (class_date, start_time, end_time):
+            errors.append((line, "Invalid class date or time."))
+        elif end_time <= start_time:
+            errors.append((line, "The class must end after it starts."))
+        elif class_type is None:
+            errors.append((line, "Invalid class type."))
+        elif slots < 0:
+            errors.append((line, "Invalid number of slots."))
+        elif (class_date, start_time, end_time) in state["slots"]:
+            errors.append((line, "Duplicates an earlier row."))
+        else:
+            state["slots"].add((class_date, start_time, end_time))
+            classes.append((line, Classes(
+                class_name=_value(row, "class_name"),
+                class_description=_value(row, "class_description"),
+                class_type=class_type,
+                class_date=class_date,
+                class_start_time=start_time,
+                class_end_time=end_time,
+                slots_available=slots,
+            )))
+
+    taken = set(Classes.objects.filter(
+        class_date__in={c.class_date for line, c in classes}
+    ).values_list("class_date", "class_start_time", "class_end_time"))
+    new = []
+    for line, class_instance in classes:
+        key = (class_instance.class_date, class_instance.class_start_time,
+               class_instance.class_end_time)
+        if key in taken:
+            errors.append((line, "A class already exists at this time."))
+        else:
+            new.append(class_instance)
+    Classes.objects.bulk_create(new)
+    return len(new), errors
+
+
+def _import_bookings(batch, state):
+    """
+    Validate and save a batch of historical bookings.
+
+    Users and classes are resolved with one query each per batch,
+    classes by their date and start time. Bookings that would
+    overfill a class are rejected. The slot counters are not
+    touched here; they are recounted once the whole file is in.
+    """
+    errors = []
+    rows = []
+    for line, row in batch:
+        class_date = _parse(parse_date, row, "class_date")
+        start_time = _parse(parse_time, row, "class_start_time")
+        booked_at = None
+        if _value(row, "booked_at"):
+            booked_at = _parse(parse_datetime, row, "booked_at")
+            if booked_at is None:
+                errors.append((line, "Invalid booking date."))
+                continue
+            if timezone.is_naive(booked_at):
+                booked_at = timezone.make_aware(booked_at)
+        if None in (class_date, start_time):
+            errors.append((line, "Invalid class date or time."))
+        else:
+            rows.append((line, _value(row, "username"), class_date,
+                         start_time, booked_at))
+
+    user_ids = dict(User.objects.filter(
+        username__in={r[1] for r in rows}
+    ).values_list("username", "id"))
+    classes = {}
+    for pk, class_date, start_time, slots in Classes.objects.filter(
+        class_date__in={r[2] for r in rows}
+    ).values_list("id", "class_date", "class_start_time", "slots_available"):
+        classes[(class_date, start_time)] = pk
+        state["remaining"].setdefault(pk, slots)
+    resolved = []
+    for line, username, class_date, start_time, booked_at in rows:
+        user_id = user_ids.get(username)
+        class_id = classes.get((class_date, start_time))
+        if user_id is None:
+            errors.append((line, f"No user '{username}'."))
+        elif class_id is None:
+            errors.append((line, "No class at this date and time."))
+        elif (user_id, class_id) in state["bookings"]:
+            errors.append((line, "Duplicates an earlier row."))
+        else:
+            state["bookings"].add((user_id, class_id))
+            resolved.append((line, user_id, class_id, booked_at))
+
+    booked = set(Bookings.objects.filter(
+        class_id__in={r[2] for r in resolved},
+        user_id__in={r[1] for r in resolved},
+    ).values_list("user_id", "class_id"))
+    bookings = []
+    booking_dates = {}
+    for line, user_id, class_id, booked_at in resolved:
+        if (user_id, class_id) in booked:
+            errors.append((line, "The user has already booked this class."))
+        elif state["remaining"][class_id] <= 0:
+            errors.append((line, "The class is full."))
+        else:
+            state["remaining"][class_id] -= 1
+            bookings.append(Bookings(user_id=user_id, class_id_id=class_id))
+            if booked_at:
+                booking_dates[len(bookings) - 1] = booked_at
+    bookings = Bookings.objects.bulk_create(bookings)
+    if booking_dates:
+        # booking_date is set on insert, so historical dates are
+        # written afterwards, with one UPDATE for the whole batch
+        ids = {bookings[i].id: booked_at
+               for i, booked_at in booking_dates.items()}
+        Bookings.objects.filter(id__in=ids).update(booking_date=Case(
+            *[When(id=pk, then=Value(booked_at))
+              for pk, booked_at in ids.items()],
+            output_field=DateTimeField(),
+        ))
+    state["classes"].update(booking.class_id_id for booking in bookings)
+    return len(bookings), errors
+
+
+IMPORTERS = {
+    "members": _import_members,
+    "classes": _import_classes,
+    "bookings": _import_bookings,
+}
+
+
+def import_csv(kind, csv_file, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Import members, classes or historical bookings from a CSV file.
+
+    Rows are validated and saved in batches of `batch_size`, each in
+    its own transaction. Every check against the database is one
+    set-based query per batch, and every batch is saved with
+    `bulk_create`, so no per-row queries or signals run. Invalid
+    rows are skipped and reported, the rest are imported. Once all
+    bookings are in, the slot counters of their classes are
+    recounted in one pass.
+
+    Parameters:
+    - kind (str): 'members', 'classes' or 'bookings'.
+    - csv_file: A text file object with a header row.
+    - batch_size (int): Number of rows per transaction.
+    - dry_run (bool): Validate the file, then roll back every batch.
+
+    Returns:
+    - dict: The number of rows `created`, the `errors` as (line
+    number, message) pairs, and the `users` created by a members
+    import, to be invited with `send_invites`.
+
+    Raises:
+    - KeyError: If there is no such kind of import.
+    - ValueError: If the file is missing a required column.
+    """
+    importer = IMPORTERS[kind]
+    required = IMPORT_COLUMNS[kind][0]
+    reader = csv.DictReader(csv_file)
+    missing = set(required) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(
+            "Missing column(s): " + ", ".join(sorted(missing)))
+
+    state = {
+        "usernames": set(),
+        "emails": set(),
+        "phone_numbers": set(),
+        "slots": set(),
+        "bookings": set(),
+        "remaining": {},
+        "classes": set(),
+        "created_users": [],
+    }
+    created = 0
+    errors = []
+    for batch in _batches(reader, batch_size):
+        with transaction.atomic():
+            batch_created, batch_errors = importer(batch, state)
+            if dry_run:
+                transaction.set_rollback(True)
+        created += batch_created
+        errors.extend(sorted(batch_errors))
+
+    if not dry_run:
+        class_ids = sorted(state["classes"])
+        for start in range(0, len(class_ids), batch_size):
+            recount_slots(Classes.objects.filter(
+                id__in=class_ids[start:start + batch_size]))
+    return {
+        "created": created,
+        "errors": errors,
+        "users": [] if dry_run else state["created_users"],
+    }
+
+
+def send_invites(users, base_url):
+    """
+    Email imported users a link to set their password.
+
+    The links are the same one-time links as a password reset, and
+    all emails are sent over one connection.
+
+    Parameters:
+    - users (list): The users to invite.
+    - base_url (str): The site's address, e.g. 'https://example.com'.
+
+    Returns:
+    - int: The number of emails sent.
+    """
+    messages = []
+    for user in users:
+        path = reverse("password_reset_confirm", kwargs={
+            "uidb64": urlsafe_base64_encode(force_bytes(user.pk)),
+            "token": default_token_generator.make_token(user),
+        })
+        body = render_to_string("accounts/invite_email.txt", {
+            "user": user,
+            "url": base_url.rstrip("/") + path,
+        })
+        messages.append(EmailMessage(
+            "Welcome to Tough Glove", body, to=[user.email]))
+    return get_connection().send_messages(messages) or 0
@@ -0,0 +1,168 @@
+import csv
+from datetime import date, datetime, time
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date
+
+from layout.models import Classes, Bookings
+
+# Number of rows fetched from the database cursor at a time
+EXPORT_CHUNK_SIZE = 2000
+
+# The data that can be exported. Each export has a function
+# returning its queryset in export order, the date field its
+# `from` and `to` filters apply to, and its (column, field) pairs.
+EXPORTS = {
+    "bookings": {
+        "queryset": lambda: Bookings.objects.order_by(
+            "class_id__class_date", "class_id__class_start_time", "id"),
+        "date_field": "class_id__class_date",
+        "columns": (
+            ("booking_id", "id"),
+            ("booked_at", "booking_date"),
+            ("class_id", "class_id"),
+            ("class_name", "class_id__class_name"),
+            ("class_type", "class_id__class_type"),
+            ("class_date", "class_id__class_date"),
+            ("class_start_time", "class_id__class_start_time"),
+            ("class_end_time", "class_id__class_end_time"),
+            ("user_id", "user"),
+            ("username", "user__username"),
+            ("first_name", "user__first_name"),
+            ("last_name", "user__last_name"),
+            ("email", "user__email"),
+        ),
+    },
+    "classes": {
+        "queryset": lambda: Classes.objects.order_by(
+            "class_date", "class_start_time", "id"),
+        "date_field": "class_date",
+        "columns": (
+            ("class_id", "id"),
+            ("class_name", "class_name"),
+            ("class_type", "class_type"),
+            ("class_date", "class_date"),
+            ("class_start_time", "class_start_time"),
+            ("class_end_time", "class_end_time"),
+            ("slots_available", "slots_available"),
+            ("slots_filled", "slots_filled"),
+            ("series_id", "series"),
+            ("updated_at", "updated_at"),
+        ),
+    },
+    "members": {
+        "queryset": lambda: User.objects.order_by("date_joined", "id"),
+        "date_field": "date_joined__date",
+        "columns": (
+            ("user_id", "id"),
+            ("username", "username"),
+            ("first_name", "first_name"),
+            ("last_name", "last_name"),
+            ("email", "email"),
+            ("phone_number", "members__phone_number"),
+            ("date_joined", "date_joined"),
+            ("is_active", "is_active"),
+        ),
+    },
+}
+
+
+class Echo:
+    """
+    A file-like object that returns what is written to it, so
+    `csv.writer` can format one row at a time for streaming.
+    """
+    def write(self, value):
+        return value
+
+
+def _parse_bound(params, param):
+    """
+    Parse an optional YYYY-MM-DD query parameter.
+
+    Raises:
+    - ValueError: If the parameter is present but invalid.
+    """
+    value = params.get(param)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValueError(f"Invalid '{param}' parameter")
+    return day
+
+
+def get_export(name, params):
+    """
+    Build the rows of an export.
+
+    The rows are read through `iterator`, which uses a server-side
+    cursor where the database supports one, so only
+    EXPORT_CHUNK_SIZE rows are held in memory at a time however
+    many rows the export has.
+
+    Parameters:
+    - name (str): The export's key in EXPORTS.
+    - params (QueryDict): The request's query parameters. The
+    optional `from` and `to` values are inclusive YYYY-MM-DD
+    dates.
+
+    Returns:
+    - tuple: The column names, and an iterator of row tuples.
+
+    Raises:
+    - KeyError: If there is no such export.
+    - ValueError: If `from` or `to` can't be parsed.
+    """
+    export = EXPORTS[name]
+    queryset = export["queryset"]()
+    date_field = export["date_field"]
+    date_from = _parse_bound(params, "from")
+    if date_from:
+        queryset = queryset.filter(**{f"{date_field}__gte": date_from})
+    date_to = _parse_bound(params, "to")
+    if date_to:
+        queryset = queryset.filter(**{f"{date_field}__lte": date_to})
+    columns = [column for column, field in export["columns"]]
+    fields = [field for column, field in export["columns"]]
+    rows = queryset.values_list(*fields).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE)
+    return columns, rows
+
+
+def _format_value(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(columns, rows):
+    """
+    Yield an export as CSV, one line at a time, starting with a
+    header line.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def stream_ndjson(columns, rows):
+    """
+    Yield an export as newline-delimited JSON, one object per row.
+    """
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+# Formats an export can be streamed in, with their content types
+# and the functions that format them
+EXPORT_FORMATS = {
+    "csv": ("text/csv", stream_csv),
+    "ndjson": ("application/x-ndjson", stream_ndjson),
+}
@@ -0,0 +1,198 @@
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from icalendar import Event, vText
+
+from layout.models import Classes, Bookings, CalendarFeed
+
+# Key of the studio-wide schedule feed
+SCHEDULE_FEED = "schedule"
+# How long a rendered feed is kept in the cache, in seconds. Feeds
+# are cached under their database state, so a changed feed is
+# rendered afresh and this only bounds how long an unused feed
+# takes up space.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# How many days of past classes the feeds include
+FEED_PAST_DAYS = 30
+# Number of classes fetched from the database at a time
+FEED_CHUNK_SIZE = 500
+PRODID = "-//Tough Glove//Class Schedule//EN"
+
+
+def member_feed(user_id):
+    """
+    Return the key of a member's feed of booked classes.
+    """
+    return f"user:{user_id}"
+
+
+def get_feed_state(request, feed):
+    """
+    Return the string that identifies the current rendering of a
+    feed, read from the database with a single aggregate query.
+
+    For the schedule it covers the number of classes in the feed's
+    window, their latest `updated_at` and highest id; for a
+    member's feed, the same of their bookings in the window. Edits,
+    bookings and cancellations touch a class's `updated_at`,
+    additions raise the highest id and deletions lower the count,
+    so every change to a feed changes its state, in every process
+    serving it. The date is included as the window moves on daily.
+    The state is cached on the request so the ETag check and the
+    view share one query.
+    """
+    if getattr(request, "_feed_state", None) is not None:
+        return request._feed_state
+    since = timezone.localdate() - timedelta(days=FEED_PAST_DAYS)
+    if feed == SCHEDULE_FEED:
+        state = Classes.objects.filter(class_date__gte=since).aggregate(
+            count=Count("id"),
+            updated=Max("updated_at"),
+            last=Max("id"),
+        )
+    else:
+        state = Bookings.objects.filter(
+            user_id=feed.split(":", 1)[1],
+            class_id__class_date__gte=since,
+        ).aggregate(
+            count=Count("id"),
+            updated=Max("class_id__updated_at"),
+            last=Max("id"),
+        )
+    updated = state["updated"].isoformat() if state["updated"] else ""
+    request._feed_state = (
+        f"{feed}|{state['count']}|{updated}|{state['last']}|"
+        f"{timezone.localdate().isoformat()}")
+    return request._feed_state
+
+
+def feed_etag(request, feed):
+    """
+    Return a strong ETag for a feed, without rendering it.
+    """
+    state = get_feed_state(request, feed)
+    return '"%s"' % hashlib.md5(state.encode()).hexdigest()
+
+
+def feed_classes(feed):
+    """
+    Return the classes a feed lists, in schedule order: every class
+    from FEED_PAST_DAYS days ago onwards, or for a member's feed,
+    only the classes they have booked.
+    """
+    classes = Classes.objects.filter(
+        class_date__gte=timezone.localdate() - timedelta(
+            days=FEED_PAST_DAYS),
+    ).only(
+        "id",
+        "class_name",
+        "class_description",
+        "class_date",
+        "class_start_time",
+        "class_end_time",
+        "updated_at",
+    ).order_by("class_date", "class_start_time", "id")
+    if feed != SCHEDULE_FEED:
+        classes = classes.filter(bookings__user_id=feed.split(":", 1)[1])
+    return classes
+
+
+def _to_utc(day, time_of_day):
+    start = timezone.make_aware(datetime.combine(day, time_of_day))
+    return start.astimezone(dt_timezone.utc)
+
+
+def render_feed(name, classes):
+    """
+    Render an iCalendar feed one component at a time.
+
+    Parameters:
+    - name (str): The calendar's display name.
+    - classes (QuerySet): The classes to list, read in chunks of
+    FEED_CHUNK_SIZE.
+
+    Yields:
+    - bytes: The calendar header, one VEVENT per class, and the
+    calendar footer.
+    """
+    yield (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        f"PRODID:{PRODID}\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+        f"X-WR-CALNAME:{vText(name).to_ical().decode()}\r\n"
+    ).encode()
+    for class_instance in classes.iterator(chunk_size=FEED_CHUNK_SIZE):
+        event = Event()
+        event.add("uid", f"class-{class_instance.id}@toughglove")
+        event.add("summary", class_instance.class_name)
+        event.add("description", class_instance.class_description)
+        event.add("dtstart", _to_utc(
+            class_instance.class_date, class_instance.class_start_time))
+        event.add("dtend", _to_utc(
+            class_instance.class_date, class_instance.class_end_time))
+        event.add("dtstamp", class_instance.updated_at)
+        event.add("last-modified", class_instance.updated_at)
+        yield event.to_ical()
+    yield b"END:VCALENDAR\r\n"
+
+
+def get_feed(request, feed, name):
+    """
+    Return a rendered feed, from the cache if it hasn't changed.
+
+    The cache key includes the feed's state, so a feed is rendered
+    again on the first request after its bookings or classes
+    change, and served from the cache until then.
+
+    Parameters:
+    - request: HttpRequest object for the feed.
+    - feed (str): The feed's key.
+    - name (str): The calendar's display name.
+
+    Returns:
+    - bytes: The iCalendar document.
+    """
+    key = f"calendar_feed:{get_feed_state(request, feed)}"
+    body = cache.get(key)
+    if body is None:
+        body = b"".join(render_feed(name, feed_classes(feed)))
+        cache.set(key, body, FEED_CACHE_TIMEOUT)
+    return body
+
+
+def get_member_feed(request, token):
+    """
+    Return the key of the member feed with the given token, or
+    None if there is none. The lookup is cached on the request so
+    the ETag check and the view share one query.
+    """
+    if not hasattr(request, "_member_feed"):
+        user_id = CalendarFeed.objects.filter(token=token).values_list(
+            "user_id", flat=True).first()
+        request._member_feed = (
+            member_feed(user_id) if user_id is not None else None)
+    return request._member_feed
+
+
+def schedule_feed_etag(request, *args, **kwargs):
+    """
+    Return the ETag of the schedule feed. Intended for use as the
+    `etag_func` of Django's `condition` decorator.
+    """
+    return feed_etag(request, SCHEDULE_FEED)
+
+
+def member_feed_etag(request, token, *args, **kwargs):
+    """
+    Return the ETag of a member's feed, or None if the token is
+    unknown. Intended for use as the `etag_func` of Django's
+    `condition` decorator.
+    """
+    feed = get_member_feed(request, token)
+    if feed is None:
+        return None
+    return feed_etag(request, feed)
@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
+
+from layout.models import Classes
+from layout.booking_functions.booking import recount_slots
+
+# Number of classes checked per grouped aggregate
+RECONCILE_CHUNK_SIZE = 1000
+
+
+def find_slot_drift(classes=None, chunk_size=RECONCILE_CHUNK_SIZE):
+    """
+    Find classes whose slot counters disagree with their bookings.
+
+    The classes are walked in ranges of `chunk_size` primary keys.
+    Each range is checked with one grouped aggregate that joins the
+    bookings through their class_id index and only returns the
+    classes whose `slots_filled` differs from their booking count,
+    so a run reads every booking once and holds one range of
+    results in memory at a time.
+
+    Parameters:
+    - classes (QuerySet): The classes to check. Defaults to all.
+    - chunk_size (int): Number of primary keys per range.
+
+    Yields:
+    - list: For each range with drift, (class id, slots_filled,
+    slots_available, number of bookings) tuples.
+    """
+    if classes is None:
+        classes = Classes.objects.all()
+    bounds = classes.aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return
+    for start in range(bounds["first"], bounds["last"] + 1, chunk_size):
+        drift = list(
+            classes.filter(id__gte=start, id__lt=start + chunk_size)
+            .order_by()
+            .annotate(booked=Count("bookings"))
+            .exclude(slots_filled=F("booked"))
+            .values_list("id", "slots_filled", "slots_available", "booked")
+        )
+        if drift:
+            yield drift
+
+
+def fix_slot_drift(class_ids):
+    """
+    Recount the slot counters of the given classes.
+
+    The classes are locked before they are recounted, so a booking
+    or cancellation that is in progress commits first and is
+    counted, rather than being overwritten by a count taken before
+    it committed.
+
+    Parameters:
+    - class_ids (list): Primary keys of the classes to fix.
+
+    Returns:
+    - int: The number of classes updated.
+    """
+    with transaction.atomic():
+        locked = list(
+            Classes.objects.select_for_update()
+            .filter(id__in=class_ids)
+            .values_list("id", flat=True)
+        )
+        return recount_slots(Classes.objects.filter(id__in=locked))
@@ -0,0 +1,229 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+
+from layout.models import Classes
+
+# Number of classes shown per page of the classes listing
+CLASSES_PAGE_SIZE = 25
+
+
+def get_schedule_window(params):
+    """
+    Build the Classes filter for a schedule feed's date range.
+
+    Parameters:
+    - params (QueryDict): The request's query parameters. The
+    optional `start` and `end` values are ISO 8601 dates or
+    datetimes, as sent by FullCalendar, with `end` being exclusive.
+
+    Returns:
+    - dict: Lookups to pass to `Classes.objects.filter`.
+
+    Raises:
+    - ValueError: If `start` or `end` can't be parsed.
+    """
+    window = {}
+    for param, lookup in (("start", "class_date__gte"),
+                          ("end", "class_date__lt")):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            day = parse_date(value[:10])
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValueError(f"Invalid '{param}' parameter")
+        window[lookup] = day
+    return window
+
+
+def get_schedule_state(request):
+    """
+    Summarise the classes a schedule feed request covers.
+
+    The summary is the number of classes in the requested window
+    and the latest `updated_at` among them, read with a single
+    aggregate query. Every booking and cancellation touches the
+    `updated_at` of its class, so any change that would alter the
+    feed changes this summary, and deleting a class lowers the
+    count. The result is cached on the request, so it is read once
+    per request.
+
+    Parameters:
+    - request: HttpRequest object for the feed.
+
+    Returns:
+    - tuple: (count, last_modified), or None if the window is
+    invalid.
+    """
+    if not hasattr(request, "_schedule_state"):
+        try:
+            window = get_schedule_window(request.GET)
+        except ValueError:
+            request._schedule_state = None
+        else:
+            state = Classes.objects.filter(**window).aggregate(
+                count=Count("id"), last_modified=Max("updated_at"))
+            request._schedule_state = (
+                state["count"], state["last_modified"])
+    return request._schedule_state
+
+
+def schedule_etag(request, *args, **kwargs):
+    """
+    Return a strong ETag for a schedule feed request.
+
+    The tag covers the request path and query string as well as the
+    state of the classes in the window, so different ranges of the
+    same feed never share a tag. Intended for use as the `etag_func`
+    of Django's `condition` decorator.
+    """
+    state = get_schedule_state(request)
+    if state is None:
+        return None
+    count, last_modified = state
+    stamp = last_modified.isoformat() if last_modified else ""
+    key = f"{request.get_full_path()}|{count}|{stamp}"
+    return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+
+def _parse_day(value):
+    """
+    Parse a YYYY-MM-DD query parameter, returning None if it is
+    missing or invalid.
+    """
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+def _parse_cursor(value):
+    """
+    Parse a classes listing cursor of the form
+    `<class_date>_<class_start_time>_<id>`, returning None if it is
+    missing or invalid.
+    """
+    try:
+        day, start_time, pk = (value or "").split("_")
+        cursor = (parse_date(day), parse_time(start_time), int(pk))
+    except ValueError:
+        return None
+    if None in cursor:
+        return None
+    return cursor
+
+
+def _parse_total(value):
+    """
+    Parse the classes count carried in a classes listing query
+    string, returning None if it is missing or invalid.
+    """
+    try:
+        total = int(value)
+    except (TypeError, ValueError):
+        return None
+    return total if total >= 0 else None
+
+
+def get_class_page(params, page_size=CLASSES_PAGE_SIZE, count=True):
+    """
+    Fetch one page of the classes listing.
+
+    Classes are listed in schedule order and paged with a keyset
+    cursor on (class_date, class_start_time, id) rather than an
+    offset, so every page is an index range scan whose cost does
+    not depend on how many classes came before it. By default
+    only upcoming classes are listed.
+
+    Parameters:
+    - params (QueryDict): The request's query parameters:
+        - type: Only list classes of this type (0 or 1).
+        - from: First date to list (YYYY-MM-DD), defaults to
+        today.
+        - to: Last date to list (YYYY-MM-DD), inclusive.
+        - after: Cursor of the last class on the previous page.
+        - total: Number of classes matching the filters, as
+        counted on the first page.
+    - page_size (int): Number of classes per page.
+    - count (bool): Whether to count the classes matching the
+    filters. Pages that don't show the total can skip the query.
+    The count is made on the first page only and carried to the
+    next pages in their query strings, since it scans every
+    matching class.
+
+    Returns:
+    - dict: The page of `classes`, the `classes_count` matching
+    the filters (None if not counted), the active `filters`, and
+    the query strings for the `next_query` and `first_query` pages
+    (None when there is no such page).
+    """
+    classes = Classes.objects.only(
+        "id",
+        "class_name",
+        "class_type",
+        "class_date",
+        "class_start_time",
+        "slots_available",
+        "slots_filled",
+    ).order_by("class_date", "class_start_time", "id")
+
+    filters = {}
+    class_type = params.get("type")
+    if class_type in ("0", "1"):
+        classes = classes.filter(class_type=int(class_type))
+        filters["type"] = class_type
+    date_from = _parse_day(params.get("from")) or timezone.localdate()
+    classes = classes.filter(class_date__gte=date_from)
+    filters["from"] = date_from.isoformat()
+    date_to = _parse_day(params.get("to"))
+    if date_to:
+        classes = classes.filter(class_date__lte=date_to)
+        filters["to"] = date_to.isoformat()
+
+    cursor = _parse_cursor(params.get("after"))
+    classes_count = None
+    if count:
+        if cursor:
+            classes_count = _parse_total(params.get("total"))
+        # Count on the first page, or if a later page's link came
+        # without a total (e.g. from the admin dashboard)
+        if classes_count is None:
+            classes_count = classes.count()
+
+    if cursor:
+        day, start_time, pk = cursor
+        classes = classes.filter(
+            Q(class_date__gt=day)
+            | Q(class_date=day, class_start_time__gt=start_time)
+            | Q(class_date=day, class_start_time=start_time, id__gt=pk)
+        )
+
+    # Fetch one extra row to find out whether there is a next page
+    page = list(classes[:page_size + 1])
+    next_query = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        last = page[-1]
+        after = "_".join([
+            last.class_date.isoformat(),
+            last.class_start_time.isoformat(),
+            str(last.id),
+        ])
+        next_query = {**filters, "after": after}
+        if classes_count is not None:
+            next_query["total"] = classes_count
+        next_query = urlencode(next_query)
+
+    return {
+        "classes": page,
+        "classes_count": classes_count,
+        "filters": filters,
+        "next_query": next_query,
+        "first_query": urlencode(filters) if cursor else None,
+    }
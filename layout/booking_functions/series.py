@@ -0,0 +1,148 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+
+from layout.models import Classes
+
+# Longest span a series may cover, in days
+MAX_SERIES_DAYS = 366
+# Most weeks a week can be copied forward in one go
+MAX_COPY_WEEKS = 52
+
+# Fields copied from a series or a class to the classes generated
+# from it
+CLASS_FIELDS = (
+    "class_name",
+    "class_description",
+    "class_type",
+    "class_start_time",
+    "class_end_time",
+    "slots_available",
+)
+
+
+def expand_series(series):
+    """
+    Build the classes of a weekly series, without saving them.
+
+    Parameters:
+    - series (ClassSeries): The series to expand.
+
+    Returns:
+    - list: Unsaved Classes, one for every date between the
+    series' `starts_on` and `ends_on` that falls on one of its
+    `weekdays` and is not one of its `exceptions`, in date order.
+    """
+    weekdays = set(series.weekdays)
+    exceptions = set(series.exceptions)
+    fields = {name: getattr(series, name) for name in CLASS_FIELDS}
+    occurrences = []
+    day = series.starts_on
+    while day <= series.ends_on:
+        if day.weekday() in weekdays and day.isoformat() not in exceptions:
+            occurrences.append(
+                Classes(series=series, class_date=day, **fields))
+        day += timedelta(days=1)
+    return occurrences
+
+
+def copy_week(week_start, weeks):
+    """
+    Build copies of a week's classes for the following weeks,
+    without saving them.
+
+    Parameters:
+    - week_start (date): The first day of the week to copy.
+    - weeks (int): How many following weeks to copy it to.
+
+    Returns:
+    - list: Unsaved Classes, each a copy of a class in the week
+    starting on `week_start`, moved forward by a whole number of
+    weeks. Bookings are not copied.
+    """
+    week = Classes.objects.filter(
+        class_date__gte=week_start,
+        class_date__lt=week_start + timedelta(days=7),
+    ).only("class_date", "series", *CLASS_FIELDS)
+    occurrences = []
+    for class_instance in week:
+        fields = {name: getattr(class_instance, name) for name in CLASS_FIELDS}
+        for offset in range(1, weeks + 1):
+            occurrences.append(Classes(
+                series_id=class_instance.series_id,
+                class_date=class_instance.class_date + timedelta(
+                    weeks=offset),
+                **fields,
+            ))
+    return occurrences
+
+
+def find_conflicts(occurrences):
+    """
+    Find the existing classes that clash with new ones.
+
+    Two classes clash when they are on the same date and their
+    times overlap. All existing classes that could clash are
+    fetched with a single query, over the dates of the new classes
+    and the widest time range among them, and the exact overlap is
+    checked in memory.
+
+    Parameters:
+    - occurrences (list): Unsaved Classes.
+
+    Returns:
+    - list: (new class, existing class) pairs that clash, in the
+    order of `occurrences`.
+    """
+    if not occurrences:
+        return []
+    existing = {}
+    for class_instance in Classes.objects.filter(
+        Q(class_date__in={o.class_date for o in occurrences}),
+        Q(class_start_time__lt=max(o.class_end_time for o in occurrences)),
+        Q(class_end_time__gt=min(o.class_start_time for o in occurrences)),
+    ).only("class_name", "class_date", "class_start_time", "class_end_time"):
+        existing.setdefault(class_instance.class_date, []).append(
+            class_instance)
+
+    conflicts = []
+    for occurrence in occurrences:
+        for class_instance in existing.get(occurrence.class_date, ()):
+            if (class_instance.class_start_time < occurrence.class_end_time
+                    and class_instance.class_end_time
+                    > occurrence.class_start_time):
+                conflicts.append((occurrence, class_instance))
+    return conflicts
+
+
+def create_classes(occurrences, series=None):
+    """
+    Save generated classes, unless any of them clash with the
+    existing schedule.
+
+    The conflict check and the insert run in one transaction, and
+    the classes are inserted with a single `bulk_create`, so a
+    quarter's timetable takes a handful of queries however many
+    classes it has.
+
+    Parameters:
+    - occurrences (list): Unsaved Classes, from `expand_series`
+    or `copy_week`.
+    - series (ClassSeries): An unsaved series the classes belong
+    to, saved along with them.
+
+    Returns:
+    - tuple: (created, conflicts). Nothing is saved if there are
+    any conflicts, in which case `created` is empty.
+    """
+    with transaction.atomic():
+        conflicts = find_conflicts(occurrences)
+        if conflicts:
+            return [], conflicts
+        if series is not None:
+            series.save()
+            for occurrence in occurrences:
+                occurrence.series = series
+        created = Classes.objects.bulk_create(occurrences)
+    return created, []
@@ -2,6 +2,8 @@ from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 
+from .roles import has_role
+
 
 def unauthenticated_user(view_func):
     """
@@ -37,7 +39,10 @@ def allowed_users(allowed_roles=[]):
 
     This decorator function is used to restrict access to certain
     views based on the user's group membership
-    in Django.
+    in Django. The user's roles are resolved through
+    `layout.roles.get_user_roles`, which caches them for the
+    request and in the session, so most requests make no group
+    queries at all.
 
     Parameters:
     - allowed_roles (list): A list of strings representing the group
@@ -45,7 +50,7 @@ def allowed_users(allowed_roles=[]):
     decorated view. Default is an empty list, which means no group is allowed.
 
     Returns:
-    - The original view function if the user is in an allowed group.
+    - The original view function if the user is in any allowed group.
     - HttpResponse with a message "You are not authorized to view this
     page" if the user is not in an
     allowed group.
@@ -53,11 +58,7 @@ def allowed_users(allowed_roles=[]):
 
     def decorator(view_func):
         def wrapper_func(request, *args, **kwargs):
-            group = None
-            if request.user.groups.exists():
-                group = request.user.groups.all()[0].name
-
-            if group in allowed_roles:
+            if has_role(request, *allowed_roles):
                 return view_func(request, *args, **kwargs)
             else:
                 messages.error(
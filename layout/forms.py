@@ -4,7 +4,28 @@ from django.contrib.auth.models import User
 from django import forms
 from bootstrap_datepicker_plus.widgets import DatePickerInput, TimePickerInput
 
+from datetime import timedelta
+
 from .models import *
+from .backends import users_with_email
+from .booking_functions.bulk_import import IMPORT_COLUMNS
+from .booking_functions.series import MAX_COPY_WEEKS, MAX_SERIES_DAYS
+
+
+def validate_unique_email(form):
+    """
+    Return the form's cleaned email, raising a ValidationError if
+    another user already has it (ignoring case).
+    """
+    email = form.cleaned_data.get('email')
+    if email:
+        existing = users_with_email(email)
+        if form.instance.pk:
+            existing = existing.exclude(pk=form.instance.pk)
+        if existing.exists():
+            raise forms.ValidationError(
+                'An account with this email already exists.')
+    return email
 
 
 class CreateUserForm(UserCreationForm):
@@ -25,6 +46,8 @@ class CreateUserForm(UserCreationForm):
     'first_name', 'last_name', and 'email' fields.
 
     The __init__ method ensures all specified fields are required.
+    The clean_email method rejects an email address that another
+    user already has, ignoring case.
     """
     password1 = forms.CharField(
         widget=forms.PasswordInput(
@@ -69,6 +92,9 @@ class CreateUserForm(UserCreationForm):
                           'password2']:
             self.fields[fieldname].required = True
 
+    def clean_email(self):
+        return validate_unique_email(self)
+
 
 class UpdateUserForm(forms.ModelForm):
     """
@@ -90,7 +116,9 @@ class UpdateUserForm(forms.ModelForm):
 
     The __init__ method of this class ensures that
     all the specified fields are set as required, meaning
-    they must be filled out when the form is submitted.
+    they must be filled out when the form is submitted. The
+    clean_email method rejects an email address that another user
+    already has, ignoring case.
     """
     class Meta:
         model = User
@@ -118,6 +146,9 @@ class UpdateUserForm(forms.ModelForm):
         for fieldname in ['username', 'email', 'first_name', 'last_name']:
             self.fields[fieldname].required = True
 
+    def clean_email(self):
+        return validate_unique_email(self)
+
 
 class CreateClassForm(forms.ModelForm):
     """
@@ -255,6 +286,159 @@ class UpdateClassForm(forms.ModelForm):
         }
 
 
+class ClassSeriesForm(forms.ModelForm):
+    """
+    A form for creating a class that repeats every week.
+
+    This form, derived from Django's ModelForm, is linked to the
+    ClassSeries model. The class fields use the same widgets as
+    CreateClassForm.
+
+    Attributes:
+    - weekdays (TypedMultipleChoiceField): The days of the week the
+    class runs on, chosen with checkboxes.
+    - exceptions (CharField): Dates the class does not run on, one
+    YYYY-MM-DD date per line or separated by commas.
+
+    The clean method checks that the series ends after it starts,
+    doesn't span more than MAX_SERIES_DAYS days, and that every
+    exception falls within it.
+    """
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=WEEKDAYS,
+        coerce=int,
+        widget=forms.CheckboxSelectMultiple)
+    exceptions = forms.CharField(
+        required=False,
+        widget=forms.Textarea(
+            attrs={'placeholder': 'Dates without a class (YYYY-MM-DD)',
+                   'rows': 3,
+                   'class': 'form-control item'}))
+
+    class Meta:
+        model = ClassSeries
+        fields = ['class_name',
+                  'class_description',
+                  'class_type',
+                  'class_start_time',
+                  'class_end_time',
+                  'slots_available',
+                  'weekdays',
+                  'starts_on',
+                  'ends_on',
+                  'exceptions']
+        widgets = {
+            'class_name': forms.TextInput(
+                attrs={'placeholder': 'Class Name',
+                       'class': 'form-control item'}),
+            'class_description': forms.Textarea(
+                attrs={'placeholder': 'Class Description',
+                       'class': 'form-control item'}),
+            'class_type': forms.Select(
+                attrs={'placeholder': 'Class Type',
+                       'class': 'form-control item'}),
+            'class_start_time': TimePickerInput(
+                options={"format": 'HH:mm', "stepping": 15, },
+                attrs={'placeholder': 'Class Start Time',
+                       'class': 'form-control item'}),
+            'class_end_time': TimePickerInput(
+                options={"format": 'HH:mm', "stepping": 15, },
+                attrs={'placeholder': 'Class End Time',
+                       'class': 'form-control item'},
+                range_from='class_start_time'),
+            'slots_available': forms.NumberInput(
+                attrs={'placeholder': 'Slots Available',
+                       'class': 'form-control item'}),
+            'starts_on': DatePickerInput(
+                attrs={'placeholder': 'First Date',
+                       'class': 'form-control item'}),
+            'ends_on': DatePickerInput(
+                attrs={'placeholder': 'Last Date',
+                       'class': 'form-control item'},
+                range_from='starts_on'),
+        }
+
+    def clean_exceptions(self):
+        exceptions = set()
+        value = self.cleaned_data.get('exceptions') or ''
+        for item in value.replace(',', ' ').split():
+            try:
+                exceptions.add(forms.DateField().clean(item).isoformat())
+            except forms.ValidationError:
+                raise forms.ValidationError(f'"{item}" is not a valid date.')
+        return sorted(exceptions)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        starts_on = cleaned_data.get('starts_on')
+        ends_on = cleaned_data.get('ends_on')
+        if starts_on and ends_on:
+            if ends_on < starts_on:
+                raise forms.ValidationError(
+                    'The series must end after it starts.')
+            if ends_on - starts_on >= timedelta(days=MAX_SERIES_DAYS):
+                raise forms.ValidationError(
+                    f'A series can span at most {MAX_SERIES_DAYS} days.')
+            for day in cleaned_data.get('exceptions') or []:
+                if not starts_on.isoformat() <= day <= ends_on.isoformat():
+                    raise forms.ValidationError(
+                        f'{day} is outside the series.')
+        start_time = cleaned_data.get('class_start_time')
+        end_time = cleaned_data.get('class_end_time')
+        if start_time and end_time and end_time <= start_time:
+            raise forms.ValidationError(
+                'The class must end after it starts.')
+        return cleaned_data
+
+
+class CopyWeekForm(forms.Form):
+    """
+    A form for copying a week of classes to the following weeks.
+
+    Attributes:
+    - week_start (DateField): Any date in the week to copy. The
+    week runs from Monday to Sunday.
+    - weeks (IntegerField): How many following weeks to copy the
+    classes to, up to MAX_COPY_WEEKS.
+    """
+    week_start = forms.DateField(
+        widget=DatePickerInput(
+            attrs={'placeholder': 'Week To Copy',
+                   'class': 'form-control item'}))
+    weeks = forms.IntegerField(
+        min_value=1,
+        max_value=MAX_COPY_WEEKS,
+        widget=forms.NumberInput(
+            attrs={'placeholder': 'Number Of Weeks',
+                   'class': 'form-control item'}))
+
+    def clean_week_start(self):
+        day = self.cleaned_data['week_start']
+        return day - timedelta(days=day.weekday())
+
+
+class ImportForm(forms.Form):
+    """
+    A form for uploading a CSV file of members, classes or
+    historical bookings to import.
+
+    Attributes:
+    - kind (ChoiceField): What the file contains.
+    - csv_file (FileField): The CSV file, with a header row.
+    - dry_run (BooleanField): Only validate the file.
+    - send_invites (BooleanField): Email imported members a link to
+    set their password.
+    """
+    kind = forms.ChoiceField(
+        choices=[(kind, kind.title()) for kind in IMPORT_COLUMNS],
+        widget=forms.Select(attrs={'class': 'form-control item'}))
+    csv_file = forms.FileField(
+        widget=forms.ClearableFileInput(
+            attrs={'accept': '.csv', 'class': 'form-control item'}))
+    dry_run = forms.BooleanField(required=False)
+    send_invites = forms.BooleanField(required=False, initial=True)
+
+
 class BookingForm(forms.ModelForm):
     """
     A form for creating and managing bookings for classes.
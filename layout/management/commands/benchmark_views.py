@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from layout.benchmarks.datasets import seed_dataset
+from layout.benchmarks.views import (
+    compare, merge_baseline, run_benchmarks, VIEW_BENCHMARKS)
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    "benchmarks", "baseline.json")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every view against seeded datasets of increasing "
+        "size, in a throwaway test database, and compare the latency "
+        "and query counts with the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1000, 10000, 100000],
+            help="Numbers of classes and bookings to benchmark at.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Timed requests per view and size.",
+        )
+        parser.add_argument(
+            "--views",
+            nargs="+",
+            choices=sorted(VIEW_BENCHMARKS),
+            metavar="VIEW",
+            help="Only benchmark the views with these URL names.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=25,
+            help="Percentage a view may be slower than its baseline.",
+        )
+        parser.add_argument(
+            "--min-delta-ms",
+            type=float,
+            default=2,
+            help="Ignore slowdowns smaller than this, as noise.",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=BASELINE_FILE,
+            help="The baseline JSON file.",
+        )
+        parser.add_argument(
+            "--update-baseline",
+            action="store_true",
+            help="Store the results as the new baseline.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(set(options["sizes"]))
+        if sizes[0] < 1 or options["repeat"] < 1:
+            raise CommandError("--sizes and --repeat must be at least 1")
+
+        timing_log = logging.getLogger("layout.timing")
+        timing_log_disabled = timing_log.disabled
+        timing_log.disabled = True
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        results = {}
+        try:
+            for size in sizes:
+                self.stdout.write(f"Seeding {size} classes and bookings...")
+                users = seed_dataset(size)
+                results[str(size)] = run_benchmarks(
+                    users, options["repeat"], options["views"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            timing_log.disabled = timing_log_disabled
+
+        baseline = {}
+        tolerance = options["tolerance"]
+        if os.path.exists(options["baseline"]):
+            with open(options["baseline"]) as f:
+                stored = json.load(f)
+            baseline = stored["results"]
+            if stored["database"] != connection.vendor:
+                self.stdout.write(self.style.WARNING(
+                    f"The baseline was taken on {stored['database']}, so "
+                    "only query counts are compared."))
+                tolerance = float("inf")
+        self.write_table(results, baseline)
+
+        if options["update_baseline"]:
+            failed = merge_baseline(baseline, results)
+            with open(options["baseline"], "w") as f:
+                json.dump({
+                    "database": connection.vendor,
+                    "results": baseline,
+                }, f, indent=2, sort_keys=True)
+                f.write("\n")
+            self.stdout.write(self.style.SUCCESS(
+                f"Baseline written to {options['baseline']}."))
+            for name, status in sorted(failed.items()):
+                self.stdout.write(self.style.ERROR(
+                    f"FAIL: {name} left out of the baseline, status "
+                    f"{status}"))
+            if failed:
+                raise CommandError(
+                    f"{len(failed)} view(s) failed and were not recorded")
+            return
+
+        failures = compare(
+            results, baseline, tolerance, options["min_delta_ms"])
+        for failure in failures:
+            self.stdout.write(self.style.ERROR(f"FAIL: {failure}"))
+        if failures:
+            raise CommandError(f"{len(failures)} benchmark regression(s)")
+        self.stdout.write(self.style.SUCCESS("No regressions."))
+
+    def write_table(self, results, baseline):
+        """
+        Write each view's latency and query count at every size,
+        next to the baseline's.
+        """
+        sizes = sorted(results, key=int)
+        self.stdout.write(
+            f"{'view':<24}" + "".join(f"{size:>28}" for size in sizes))
+        for name in results[sizes[0]]:
+            cells = []
+            for size in sizes:
+                result = results[size][name]
+                cell = f"{result['ms']:.1f}ms {result['queries']}q"
+                before = baseline.get(size, {}).get(name)
+                if before:
+                    cell += f" ({before['ms']:.1f}ms {before['queries']}q)"
+                cells.append(f"{cell:>28}")
+            self.stdout.write(f"{name:<24}" + "".join(cells))
@@ -0,0 +1,382 @@
+import logging
+import math
+import queue
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError, connection, connections
+from django.test import Client
+from django.utils import timezone
+
+from layout.booking_functions.booking import (
+    delete_class, BOOKED, FULL, ALREADY_BOOKED)
+from layout.models import Classes, Bookings
+
+# Outcome of a request that failed outright
+ERROR = "error"
+# Password shared by the simulated members, for logging in over HTTP
+STORM_PASSWORD = "booking-storm-password"
+# Seconds between the monitor's reads of the class's counters
+MONITOR_INTERVAL = 0.005
+# Times of day of the seeded class
+STORM_START_TIME = "06:00:00"
+STORM_END_TIME = "07:00:00"
+
+
+def _percentile(values, percent):
+    """
+    Return the nearest-rank percentile of a sorted list.
+    """
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def _outcome(status_code, content):
+    """
+    Work out how a booking request went from its response: a
+    redirect means the class was booked, and the page is shown
+    again with an error when it wasn't.
+    """
+    if status_code == 302:
+        return BOOKED
+    if status_code == 200 and b"fully booked" in content:
+        return FULL
+    if status_code == 200 and b"already booked" in content:
+        return ALREADY_BOOKED
+    return ERROR
+
+
+class ClientMember:
+    """
+    A simulated member booking through Django's test client, in
+    this process.
+    """
+    def __init__(self, user, class_id):
+        self.path = f"/book_class/{class_id}/"
+        self.client = Client(
+            HTTP_HOST="localhost", raise_request_exception=False)
+        self.client.force_login(user)
+        # open the booking page, which caches the member's roles in
+        # their session before the storm
+        self.client.get(self.path)
+
+    def book(self):
+        response = self.client.post(self.path)
+        return _outcome(response.status_code, response.content)
+
+    def leave(self):
+        self.client.logout()
+
+
+class HttpMember:
+    """
+    A simulated member booking over HTTP, against a running server.
+    """
+    def __init__(self, user, class_id, url):
+        self.url = url
+        self.path = f"{url}/book_class/{class_id}/"
+        self.session = requests.Session()
+        self.session.get(f"{url}/login/")
+        response = self.session.post(
+            f"{url}/login/",
+            data={
+                "email": user.email,
+                "password": STORM_PASSWORD,
+                "csrfmiddlewaretoken": self.session.cookies["csrftoken"],
+            },
+            headers={"Referer": f"{url}/login/"},
+            allow_redirects=False,
+        )
+        if response.status_code != 302:
+            raise CommandError(f"Could not log in as {user.email}")
+        self.session.get(self.path)
+
+    def book(self):
+        try:
+            response = self.session.post(
+                self.path,
+                headers={
+                    "X-CSRFToken": self.session.cookies["csrftoken"],
+                    "Referer": self.path,
+                },
+                allow_redirects=False,
+            )
+        except requests.RequestException:
+            return ERROR
+        return _outcome(response.status_code, response.content)
+
+    def leave(self):
+        self.session.get(f"{self.url}/logout/")
+
+
+class Monitor(threading.Thread):
+    """
+    Polls the class's counters and bookings while the storm runs,
+    keeping the highest values seen, so an oversell that is later
+    corrected is still caught.
+    """
+    def __init__(self, class_id):
+        super().__init__(daemon=True)
+        self.class_id = class_id
+        self.peak_filled = 0
+        self.peak_bookings = 0
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            while not self.done.wait(MONITOR_INTERVAL):
+                try:
+                    filled = Classes.objects.filter(
+                        id=self.class_id).values_list(
+                        "slots_filled", flat=True).first() or 0
+                    bookings = Bookings.objects.filter(
+                        class_id_id=self.class_id).count()
+                except DatabaseError:
+                    continue
+                self.peak_filled = max(self.peak_filled, filled)
+                self.peak_bookings = max(self.peak_bookings, bookings)
+        finally:
+            connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a class and simulate a crowd of members trying to book "
+        "it at the same moment, then report throughput, latency, "
+        "failures and whether the class was ever oversold. Runs "
+        "against the configured database; the seeded data is "
+        "removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--members",
+            type=int,
+            default=200,
+            help="Number of simulated members.",
+        )
+        parser.add_argument(
+            "--slots",
+            type=int,
+            default=20,
+            help="Number of slots in the class.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Number of threads booking at once.",
+        )
+        parser.add_argument(
+            "--attempts",
+            type=int,
+            default=1,
+            help="Booking requests each member sends, to simulate "
+                 "double submits.",
+        )
+        parser.add_argument(
+            "--url",
+            help="Book over HTTP against a server running at this "
+                 "URL (e.g. a local gunicorn using the same database) "
+                 "instead of through the test client.",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the seeded class and members.",
+        )
+
+    def handle(self, *args, **options):
+        for name in ("members", "slots", "concurrency", "attempts"):
+            if options[name] < 1:
+                raise CommandError(f"--{name} must be at least 1")
+        url = (options["url"] or "").rstrip("/")
+
+        timing_log = logging.getLogger("layout.timing")
+        timing_log_disabled = timing_log.disabled
+        timing_log.disabled = options["verbosity"] < 2
+        prefix = f"storm-{secrets.token_hex(4)}"
+        class_instance, users = self.seed(
+            prefix, options["members"], options["slots"])
+        members = []
+        try:
+            for user in users:
+                if url:
+                    members.append(HttpMember(user, class_instance.id, url))
+                else:
+                    members.append(ClientMember(user, class_instance.id))
+            results, elapsed, monitor = self.storm(
+                class_instance.id, members, options["concurrency"],
+                options["attempts"])
+            oversold = self.report(
+                class_instance, options, url, results, elapsed, monitor)
+        finally:
+            for member in members:
+                member.leave()
+            timing_log.disabled = timing_log_disabled
+            if not options["keep"]:
+                delete_class(class_instance)
+                User.objects.filter(username__startswith=prefix).delete()
+        if oversold:
+            raise CommandError("The class was oversold or miscounted")
+
+    def seed(self, prefix, count, slots):
+        """
+        Create a class with `slots` slots on the first day from
+        tomorrow whose early slot is free, and `count` members
+        sharing one password, so it is hashed only once.
+        """
+        taken = set(Classes.objects.filter(
+            class_date__gt=timezone.localdate(),
+            class_start_time=STORM_START_TIME,
+            class_end_time=STORM_END_TIME,
+        ).values_list("class_date", flat=True))
+        class_date = timezone.localdate() + timedelta(days=1)
+        while class_date in taken:
+            class_date += timedelta(days=1)
+        try:
+            class_instance = Classes.objects.create(
+                class_name=f"Booking storm {prefix}",
+                class_description="Simulated class",
+                class_date=class_date,
+                class_start_time=STORM_START_TIME,
+                class_end_time=STORM_END_TIME,
+                slots_available=slots,
+            )
+        except IntegrityError:
+            # another class took the slot since it was checked
+            raise CommandError(
+                f"Could not seed a class on {class_date}, try again")
+        password = make_password(STORM_PASSWORD)
+        users = User.objects.bulk_create([
+            User(
+                username=f"{prefix}-{n}",
+                email=f"{prefix}-{n}@example.com",
+                password=password,
+            )
+            for n in range(count)
+        ])
+        group, _ = Group.objects.get_or_create(name="member")
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.id, group_id=group.id)
+            for user in users
+        ])
+        return class_instance, users
+
+    def storm(self, class_id, members, concurrency, attempts):
+        """
+        Release every thread at once and have them book for the
+        members until each has sent `attempts` requests.
+
+        Returns:
+        - tuple: ((outcome, seconds) for each request, the wall
+        time of the storm, the finished Monitor).
+        """
+        pending = queue.SimpleQueue()
+        for member in members:
+            pending.put(member)
+        concurrency = min(concurrency, len(members))
+        start_line = threading.Barrier(concurrency + 1)
+        results = []
+
+        def work():
+            try:
+                start_line.wait()
+                while True:
+                    try:
+                        member = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    for _ in range(attempts):
+                        start = time.perf_counter()
+                        try:
+                            outcome = member.book()
+                        except Exception:
+                            # e.g. a missing CSRF cookie; counted as a
+                            # failed request, so the thread carries on
+                            # with the remaining members
+                            outcome = ERROR
+                        results.append(
+                            (outcome, time.perf_counter() - start))
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=work, daemon=True)
+            for _ in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        monitor = Monitor(class_id)
+        monitor.start()
+        start_line.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        monitor.done.set()
+        monitor.join()
+        return results, elapsed, monitor
+
+    def report(self, class_instance, options, url, results, elapsed,
+               monitor):
+        """
+        Write the storm's results, and return True if the class was
+        oversold at any point or its counters don't add up.
+        """
+        class_instance.refresh_from_db()
+        capacity = options["slots"]
+        bookings = Bookings.objects.filter(class_id=class_instance).count()
+        outcomes = {BOOKED: 0, FULL: 0, ALREADY_BOOKED: 0, ERROR: 0}
+        for outcome, seconds in results:
+            outcomes[outcome] += 1
+        latencies = sorted(seconds * 1000 for outcome, seconds in results)
+
+        self.stdout.write(
+            f"Booking storm: {options['members']} members, {capacity} "
+            f"slots, {options['concurrency']} threads, via "
+            f"{url or 'the test client'} on {connection.vendor}")
+        self.stdout.write(
+            f"Requests: {len(results)} in {elapsed:.2f}s "
+            f"({len(results) / elapsed:.1f} req/s)")
+        self.stdout.write(
+            "Latency: " + ", ".join(
+                f"p{percent} {_percentile(latencies, percent):.1f} ms"
+                for percent in (50, 95, 99))
+            + f", max {latencies[-1]:.1f} ms")
+        self.stdout.write(
+            f"Outcomes: {outcomes[BOOKED]} booked, {outcomes[FULL]} full, "
+            f"{outcomes[ALREADY_BOOKED]} already booked, "
+            f"{outcomes[ERROR]} failed")
+        self.stdout.write(
+            f"Class: {class_instance.slots_filled} filled, "
+            f"{class_instance.slots_available} available, {bookings} "
+            f"bookings (peaks: {monitor.peak_filled} filled, "
+            f"{monitor.peak_bookings} bookings)")
+
+        problems = []
+        if max(class_instance.slots_filled, bookings, monitor.peak_filled,
+               monitor.peak_bookings) > capacity:
+            problems.append(f"more than {capacity} slots were taken")
+        if class_instance.slots_filled != bookings:
+            problems.append("slots_filled doesn't match the bookings")
+        if outcomes[BOOKED] != bookings:
+            problems.append(
+                f"{outcomes[BOOKED]} members were told they booked but "
+                f"there are {bookings} bookings")
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(f"FAIL: {problem}"))
+            return True
+        if outcomes[ERROR]:
+            self.stdout.write(self.style.WARNING(
+                f"No oversell, but {outcomes[ERROR]} requests failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No oversell."))
+        return False
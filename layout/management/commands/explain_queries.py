@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from layout.backends import users_with_email
+from layout.booking_functions.availability import get_available_classes
+from layout.booking_functions.booking import get_user_bookings
+from layout.booking_functions.schedule import CLASSES_PAGE_SIZE
+from layout.models import Classes, Bookings, Members, Waitlist
+
+
+def _hot_queries(user):
+    """
+    Return the hot query shapes of the app as (name, description,
+    queryset) tuples, using `user` for the per-user queries.
+    """
+    today = timezone.localdate()
+    return [
+        (
+            "available_classes",
+            "Classes with free slots, newest first",
+            get_available_classes(),
+        ),
+        (
+            "classes_newest",
+            "Classes in their default order (newest first)",
+            Classes.objects.all()[:CLASSES_PAGE_SIZE],
+        ),
+        (
+            "classes_upcoming",
+            "A page of the upcoming classes listing",
+            Classes.objects.filter(class_date__gte=today).order_by(
+                "class_date", "class_start_time", "id"
+            )[:CLASSES_PAGE_SIZE + 1],
+        ),
+        (
+            "classes_by_type",
+            "A page of the upcoming classes listing filtered by type",
+            Classes.objects.filter(class_type=0, class_date__gte=today)
+            .order_by("class_date", "class_start_time", "id")
+            [:CLASSES_PAGE_SIZE + 1],
+        ),
+        (
+            "calendar_week",
+            "One week of the calendar feed",
+            Classes.objects.filter(
+                class_date__gte=today, class_date__lt=today + timedelta(7)
+            ).order_by("class_date", "class_start_time").values_list(
+                "id", "class_name", "class_date", "class_start_time",
+                "class_end_time", "slots_available",
+            ),
+        ),
+        (
+            "user_bookings",
+            "A user's bookings, newest first",
+            Bookings.objects.filter(user=user),
+        ),
+        (
+            "user_upcoming_bookings",
+            "A user's upcoming bookings with their classes",
+            get_user_bookings(user),
+        ),
+        (
+            "members_newest",
+            "Members, most recently joined first",
+            Members.objects.all()[:CLASSES_PAGE_SIZE],
+        ),
+        (
+            "waitlist_head",
+            "The first user on a class's waitlist",
+            Waitlist.objects.filter(class_id_id=1).order_by(
+                "joined_at", "id")[:1],
+        ),
+        (
+            "login_email",
+            "Login lookup of a user by email",
+            users_with_email(user.email or "member@example.com"),
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the EXPLAIN output of each hot query so that index "
+        "regressions are visible."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="Only explain the queries with these names.",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run the queries with EXPLAIN ANALYZE (PostgreSQL only).",
+        )
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="List the names of the hot queries and exit.",
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by("id").first() or User(id=0)
+        queries = _hot_queries(user)
+
+        if options["list"]:
+            for name, description, queryset in queries:
+                self.stdout.write(f"{name}: {description}")
+            return
+
+        known = {name for name, description, queryset in queries}
+        unknown = set(options["names"]) - known
+        if unknown:
+            raise CommandError(
+                "Unknown queries: " + ", ".join(sorted(unknown)))
+
+        explain_options = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze is only supported on PostgreSQL")
+            explain_options["analyze"] = True
+
+        for name, description, queryset in queries:
+            if options["names"] and name not in options["names"]:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"== {name}: {description} =="))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
@@ -0,0 +1,130 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from layout.benchmarks.datasets import (
+    generate_dataset, GENERATED_PREFIX, SEED_BATCH_SIZE, SEED_PASSWORD)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large synthetic dataset of members, classes and "
+        "bookings for load and scale testing, with seeded, "
+        "controllable distributions. Writes to the configured "
+        "database, so point it at a throwaway one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--members",
+            type=int,
+            default=100000,
+            help="Number of members to create.",
+        )
+        parser.add_argument(
+            "--classes",
+            type=int,
+            default=100000,
+            help="Number of classes to create.",
+        )
+        parser.add_argument(
+            "--bookings",
+            type=int,
+            default=1000000,
+            help="Number of bookings to create.",
+        )
+        parser.add_argument(
+            "--popularity",
+            type=float,
+            default=1.0,
+            help="Zipf exponent of class popularity: 0 books every "
+                 "class equally, higher values fill a few classes "
+                 "first.",
+        )
+        parser.add_argument(
+            "--activity",
+            type=float,
+            default=0.5,
+            help="Zipf exponent of member activity: 0 makes every "
+                 "member book as often, higher values make a few "
+                 "members book most classes.",
+        )
+        parser.add_argument(
+            "--private-share",
+            type=float,
+            default=0.1,
+            help="Share of the classes that are private (1-2 slots) "
+                 "rather than group classes.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random generator.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes inserting bookings in parallel. Ignored "
+                 "on SQLite, which allows one writer at a time.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=SEED_BATCH_SIZE,
+            help="Rows inserted per query.",
+        )
+
+    def handle(self, *args, **options):
+        for name in ("members", "classes", "workers", "batch_size"):
+            if options[name] < 1:
+                raise CommandError(
+                    f"--{name.replace('_', '-')} must be at least 1")
+        if options["bookings"] < 0:
+            raise CommandError("--bookings can't be negative")
+        if options["popularity"] < 0 or options["activity"] < 0:
+            raise CommandError("--popularity and --activity can't be "
+                               "negative")
+        if not 0 <= options["private_share"] <= 1:
+            raise CommandError("--private-share must be between 0 and 1")
+        if User.objects.filter(
+                username__startswith=GENERATED_PREFIX).exists():
+            raise CommandError(
+                "This database already has generated data; run "
+                "'manage.py flush' or use an empty database.")
+        if options["workers"] > 1 and connection.vendor == "sqlite":
+            self.stdout.write(self.style.WARNING(
+                "SQLite allows one writer at a time, so bookings are "
+                "inserted by a single process."))
+
+        started = time.perf_counter()
+
+        def progress(message):
+            self.stdout.write(
+                f"{message} ({time.perf_counter() - started:.1f}s)")
+
+        try:
+            created = generate_dataset(
+                options["classes"], options["members"], options["bookings"],
+                popularity=options["popularity"],
+                activity=options["activity"],
+                private_share=options["private_share"],
+                seed=options["seed"],
+                workers=options["workers"],
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {created['members']} members, "
+            f"{created['classes']} classes and {created['bookings']} "
+            f"bookings in {elapsed:.1f}s ({created['bookings'] / elapsed:.0f} "
+            f"bookings/s). Members log in as "
+            f"{GENERATED_PREFIX}N@example.com and the admin as "
+            f"{GENERATED_PREFIX}admin@example.com, with the password "
+            f"'{SEED_PASSWORD}'."))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from layout.booking_functions.bulk_import import (
+    import_csv, send_invites, IMPORT_BATCH_SIZE, IMPORT_COLUMNS)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import members, classes or historical bookings from a CSV "
+        "file, in batches, reporting the rows that can't be imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORT_COLUMNS))
+        parser.add_argument("path", help="The CSV file to import.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Number of rows saved per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the file without saving anything.",
+        )
+        parser.add_argument(
+            "--invite-url",
+            help="Email imported members a link to set their password "
+                 "on the site at this address, e.g. https://example.com.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], newline="",
+                      encoding="utf-8-sig") as csv_file:
+                result = import_csv(
+                    options["kind"],
+                    csv_file,
+                    batch_size=options["batch_size"],
+                    dry_run=options["dry_run"],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        for line, message in result["errors"]:
+            self.stderr.write(f"Line {line}: {message}")
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['created']} {options['kind']}, "
+            f"skipped {len(result['errors'])} row(s)."))
+
+        if options["invite_url"] and result["users"]:
+            sent = send_invites(result["users"], options["invite_url"])
+            self.stdout.write(f"Sent {sent} invite(s).")
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from layout.booking_functions.reconcile import (
+    find_slot_drift, fix_slot_drift, RECONCILE_CHUNK_SIZE)
+from layout.models import Classes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the slot counters of classes from their bookings, "
+        "reporting and fixing any drift. Safe to run from cron every "
+        "few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=RECONCILE_CHUNK_SIZE,
+            help="Number of classes checked per query.",
+        )
+        parser.add_argument(
+            "--from",
+            dest="date_from",
+            help="Only check classes on or after this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without fixing it.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        classes = Classes.objects.all()
+        if options["date_from"]:
+            try:
+                date_from = parse_date(options["date_from"])
+            except ValueError:
+                date_from = None
+            if date_from is None:
+                raise CommandError("--from must be a YYYY-MM-DD date")
+            classes = classes.filter(class_date__gte=date_from)
+
+        drifted = 0
+        fixed = 0
+        for drift in find_slot_drift(classes, options["chunk_size"]):
+            for pk, slots_filled, slots_available, booked in drift:
+                self.stdout.write(
+                    f"Class {pk}: slots_filled is {slots_filled} "
+                    f"(slots_available {slots_available}) but it has "
+                    f"{booked} booking(s)")
+            drifted += len(drift)
+            if not options["dry_run"]:
+                fixed += fix_slot_drift([row[0] for row in drift])
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(
+                f"Found drift in {drifted} class(es)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Fixed drift in {fixed} of {drifted} class(es)."))
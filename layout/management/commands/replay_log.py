@@ -0,0 +1,166 @@
+import logging
+import statistics
+from collections import defaultdict
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from layout.benchmarks.datasets import SEED_PASSWORD
+from layout.benchmarks.replay import (
+    load_log, map_accounts, replay, seeded_accounts, ClientSession,
+    HttpSession)
+
+
+def _summary(values):
+    """
+    Return the p50, p95, p99 and maximum of a list of latencies,
+    in milliseconds.
+    """
+    values = sorted(value * 1000 for value in values)
+    if len(values) == 1:
+        return values * 4
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return [cuts[49], cuts[94], cuts[98], values[-1]]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a recorded access log, one JSON request per line with "
+        "its method, path, role, timestamp and optionally user and "
+        "form data, at its recorded speed or faster. Logged users are "
+        "mapped onto the member and admin accounts in the database, "
+        "e.g. those of generate_data, and the latency and errors of "
+        "each endpoint are reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help="The JSONL access log.")
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1.0,
+            help="How many times faster than recorded to replay; 0 "
+                 "sends every request as fast as possible.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=20,
+            help="Number of threads sending requests.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Only replay the first this many requests.",
+        )
+        parser.add_argument(
+            "--url",
+            help="Replay over HTTP against a server running at this "
+                 "URL (e.g. a local gunicorn using the same database) "
+                 "instead of through the test client.",
+        )
+        parser.add_argument(
+            "--password",
+            default=SEED_PASSWORD,
+            help="Password of the accounts, to log in over HTTP.",
+        )
+
+    def handle(self, *args, **options):
+        if options["speed"] < 0:
+            raise CommandError("--speed can't be negative")
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        try:
+            with open(options["log"]) as log:
+                entries = load_log(log)
+        except OSError as error:
+            raise CommandError(f"Could not read {options['log']}: {error}")
+        except ValueError as error:
+            raise CommandError(str(error))
+        entries = entries[:options["limit"]]
+        if not entries:
+            raise CommandError("The log has no requests")
+        try:
+            accounts = map_accounts(entries, seeded_accounts())
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        url = (options["url"] or "").rstrip("/")
+        timing_log = logging.getLogger("layout.timing")
+        timing_log_disabled = timing_log.disabled
+        timing_log.disabled = options["verbosity"] < 2
+        try:
+            sessions = {}
+            for key, user in accounts.items():
+                if url:
+                    sessions[key] = HttpSession(user, url, options["password"])
+                else:
+                    sessions[key] = ClientSession(user)
+            results, elapsed = replay(
+                entries, sessions, options["speed"], options["concurrency"])
+        except (ValueError, requests.RequestException) as error:
+            raise CommandError(str(error))
+        finally:
+            timing_log.disabled = timing_log_disabled
+        self.report(entries, accounts, results, elapsed, options, url)
+
+    def report(self, entries, accounts, results, elapsed, options, url):
+        """
+        Write the latency distribution and errors of each endpoint,
+        busiest first, and how far the replay fell behind the log.
+        Entries of the log without a result, which should never
+        happen, are counted as failed.
+        """
+        users = len({key for key, user in accounts.items() if user})
+        distinct = len({user for user in accounts.values() if user})
+        rate = len(results) / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Replayed {len(results)} of {len(entries)} requests recorded "
+            f"over {entries[-1]['offset']:.1f}s in {elapsed:.1f}s "
+            f"({rate:.1f} req/s), via "
+            f"{url or 'the test client'} on {connection.vendor}; "
+            f"{users} logged in users as {distinct} accounts")
+        missing = len(entries) - len(results)
+        if not results:
+            self.stdout.write(self.style.ERROR(
+                f"FAIL: none of the {missing} requests were replayed."))
+            return
+
+        by_endpoint = defaultdict(list)
+        for result in results:
+            by_endpoint[result["endpoint"]].append(result)
+        width = max(len(name) for name in by_endpoint) + 2
+        self.stdout.write(
+            "endpoint".ljust(width) + f"{'requests':>9}{'errors':>8}"
+            f"{'4xx':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'max ms':>9}")
+        errors = 0
+        for name, group in sorted(
+                by_endpoint.items(), key=lambda item: -len(item[1])):
+            failed = sum(
+                1 for result in group
+                if result["status"] is None or result["status"] >= 500)
+            client_errors = sum(
+                1 for result in group
+                if result["status"] and 400 <= result["status"] < 500)
+            errors += failed
+            line = name.ljust(width) + f"{len(group):>9}{failed:>8}"
+            line += f"{client_errors:>6}" + "".join(
+                f"{value:>9.1f}" for value in _summary(
+                    [result["seconds"] for result in group]))
+            self.stdout.write(
+                self.style.ERROR(line) if failed else line)
+
+        lag = _summary([result["lag"] for result in results])
+        self.stdout.write(
+            f"Lag behind the log: p95 {lag[1]:.1f} ms, max {lag[3]:.1f} ms")
+        if missing:
+            self.stdout.write(self.style.ERROR(
+                f"FAIL: {missing} requests were not replayed."))
+        if errors or missing:
+            self.stdout.write(self.style.WARNING(
+                f"{errors + missing} requests failed or returned a "
+                f"server error."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No server errors."))
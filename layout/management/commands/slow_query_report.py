@@ -0,0 +1,108 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _log_files(path, backups):
+    """
+    Return the slow query log and its rotated backups, oldest
+    first.
+    """
+    files = [f"{path}.{n}" for n in range(backups, 0, -1)] + [path]
+    return [name for name in files if os.path.exists(name)]
+
+
+def summarize(records):
+    """
+    Group slow query records by fingerprint.
+
+    Parameters:
+    - records (iterable): Records written by
+    `layout.slow_queries.record_slow_query`, oldest first.
+
+    Returns:
+    - list: A dict for each query shape, with its 'fingerprint',
+    'sql', 'count', 'total_ms', 'max_ms', the 'views' that ran it
+    and its latest 'plan', by total time, slowest first.
+    """
+    shapes = {}
+    for record in records:
+        shape = shapes.setdefault(record["fingerprint"], {
+            "fingerprint": record["fingerprint"],
+            "sql": record["sql"],
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "views": set(),
+            "plan": None,
+        })
+        shape["count"] += 1
+        shape["total_ms"] += record["duration_ms"]
+        shape["max_ms"] = max(shape["max_ms"], record["duration_ms"])
+        shape["views"].add(record["view"] or "-")
+        if record["plan"]:
+            shape["plan"] = record["plan"]
+    return sorted(
+        shapes.values(), key=lambda shape: shape["total_ms"], reverse=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarise the slow query log: the query shapes that took the "
+        "most time in total, with the views that ran them and their "
+        "latest query plan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Number of query shapes to show.",
+        )
+        parser.add_argument(
+            "--file",
+            default=settings.SLOW_QUERY_LOG_FILE,
+            help="The slow query log. Its rotated backups are read too.",
+        )
+        parser.add_argument(
+            "--no-plans",
+            action="store_true",
+            help="Leave out the query plans.",
+        )
+
+    def handle(self, *args, **options):
+        if options["top"] < 1:
+            raise CommandError("--top must be at least 1")
+
+        records = []
+        for name in _log_files(
+                options["file"], settings.SLOW_QUERY_LOG_BACKUPS):
+            with open(name) as log:
+                for line in log:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        if not records:
+            self.stdout.write(self.style.SUCCESS("No slow queries logged."))
+            return
+
+        shapes = summarize(records)
+        self.stdout.write(
+            f"{len(records)} slow queries of {len(shapes)} shapes, "
+            f"from {records[0]['time']} to {records[-1]['time']}.")
+        for rank, shape in enumerate(shapes[:options["top"]], 1):
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{rank} {shape['fingerprint']}: "
+                f"{shape['total_ms']:.1f} ms total, {shape['count']} runs, "
+                f"{shape['total_ms'] / shape['count']:.1f} ms mean, "
+                f"{shape['max_ms']:.1f} ms max"))
+            self.stdout.write(
+                "Views: " + ", ".join(sorted(shape["views"])))
+            self.stdout.write(shape["sql"])
+            if shape["plan"] and not options["no_plans"]:
+                self.stdout.write(shape["plan"])
@@ -0,0 +1,100 @@
+import os
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    CONTENT_TYPE_LATEST,
+)
+
+from layout.booking_functions.booking import (
+    BOOKED, FULL, ALREADY_BOOKED, NOT_FOUND)
+
+# Metrics are kept in memory per process, or when the
+# PROMETHEUS_MULTIPROC_DIR environment variable is set, in files in
+# that directory that every gunicorn worker writes to, so a scrape
+# of any worker reports the totals of all of them. The directory
+# must exist and be emptied before the server starts; see
+# gunicorn.conf.py.
+
+# Request methods given their own label; any other method a client
+# sends is labelled "other", so clients can't add series at will
+REQUEST_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+REQUEST_LATENCY = Histogram(
+    "toughglove_request_duration_seconds",
+    "Time taken to handle a request, by URL name.",
+    ["view", "method"],
+    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Counter(
+    "toughglove_request_db_queries",
+    "Database queries run while handling requests, by URL name.",
+    ["view"],
+)
+BOOKING_ATTEMPTS = Counter(
+    "toughglove_booking_attempts",
+    "Attempts to book a class, by result.",
+    ["result"],
+)
+CANCELLATIONS = Counter(
+    "toughglove_booking_cancellations",
+    "Bookings cancelled by members.",
+)
+LOGIN_ATTEMPTS = Counter(
+    "toughglove_login_attempts",
+    "Attempts to log in, by result.",
+    ["result"],
+)
+
+# Start every known result at zero, so rates can be taken before
+# the first attempt of each kind
+for result in (BOOKED, FULL, ALREADY_BOOKED, NOT_FOUND):
+    BOOKING_ATTEMPTS.labels(result)
+for result in ("success", "failure"):
+    LOGIN_ATTEMPTS.labels(result)
+
+
+def observe_request(request, response, seconds, queries):
+    """
+    Record a handled request's latency and query count.
+
+    Requests are labelled with the name of the URL pattern they
+    matched, rather than their path, and with their method, or
+    "other" for methods outside REQUEST_METHODS, so the number of
+    series stays fixed whatever clients send.
+
+    Parameters:
+    - request (HttpRequest): The request.
+    - response (HttpResponse): The response returned for it.
+    - seconds (float): Time taken to handle the request.
+    - queries (int): Number of database queries it ran.
+    """
+    match = getattr(request, "resolver_match", None)
+    view = (match.url_name or match.view_name) if match else "unmatched"
+    method = request.method
+    if method not in REQUEST_METHODS:
+        method = "other"
+    REQUEST_LATENCY.labels(view, method).observe(seconds)
+    if queries:
+        REQUEST_QUERIES.labels(view).inc(queries)
+
+
+def render_metrics():
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+    - tuple: (body, content type). In multiprocess mode the body
+    aggregates the metrics of every worker.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
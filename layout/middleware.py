@@ -0,0 +1,233 @@
+import cProfile
+import logging
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils.functional import empty
+
+from .metrics import observe_request
+from .profiling import claim_profile_slot, save_profile, StackSampler
+from .roles import has_role
+from .slow_queries import record_slow_query
+
+logger = logging.getLogger("layout.timing")
+
+# The timings of the request being handled, if any
+_current_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Collects where the time of one request goes.
+
+    An instance is installed as a database execute wrapper, so it
+    sees every query, and template rendering adds to it through
+    `_instrument_templates`. Queries slower than `slow_query_seconds`
+    are logged with `layout.slow_queries.record_slow_query`.
+
+    Attributes:
+    - queries (int): Number of database queries.
+    - db_time (float): Seconds spent in the database.
+    - template_time (float): Seconds spent rendering templates,
+    including any queries run while rendering.
+    - statements (Counter): How many times each SQL statement ran,
+    to spot N+1 queries.
+    """
+    def __init__(self, request=None, slow_query_seconds=None):
+        self.request = request
+        self.slow_query_seconds = slow_query_seconds
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.db_time += elapsed
+            self.queries += 1
+            self.statements[sql] += 1
+        if self.slow_query_seconds and elapsed > self.slow_query_seconds:
+            record_slow_query(
+                context["connection"], sql, params, many, elapsed,
+                self.request)
+        return result
+
+    @property
+    def duplicate_queries(self):
+        """
+        The most times any one statement ran.
+        """
+        return max(self.statements.values(), default=0)
+
+
+def _instrument_templates():
+    """
+    Wrap the Django template backend's render method so the time
+    spent rendering is added to the current request's timings.
+
+    Only the backend's top-level render is wrapped, so included
+    templates are not counted twice. Installed once per process.
+    """
+    if getattr(Template.render, "_timed", False):
+        return
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        timings = _current_timings.get()
+        if timings is None:
+            return render(self, context, request)
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            timings.template_time += time.perf_counter() - start
+
+    timed_render._timed = True
+    Template.render = timed_render
+
+
+def _user_loaded(request):
+    """
+    Return True if the request's user has already been loaded, so
+    checking their roles doesn't add queries to a request that
+    never needed the user, like a public feed's 304.
+    """
+    user = getattr(request, "user", None)
+    return user is not None and getattr(user, "_wrapped", None) is not empty
+
+
+class RequestTimingMiddleware:
+    """
+    Time every request and flag the slow and query-heavy ones.
+
+    Records the wall time, number of database queries, database
+    time and template render time of each request, and logs them
+    as one key=value line on the 'layout.timing' logger and in the
+    Prometheus metrics of `layout.metrics`. Requests over the
+    REQUEST_TIMING_SLOW_MS, REQUEST_TIMING_MAX_QUERIES or
+    REQUEST_TIMING_MAX_DUPLICATE_QUERIES settings are logged as
+    warnings with the thresholds they broke, and single queries
+    slower than SLOW_QUERY_MS go to the slow query log. Admins also
+    get the timings in a Server-Timing header, which browsers show
+    in their developer tools, on every request that loads the user.
+
+    Should be the first middleware, so its wall time covers the
+    rest of the stack.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instrument_templates()
+
+    def __call__(self, request):
+        timings = RequestTimings(
+            request, getattr(settings, "SLOW_QUERY_MS", 0) / 1000)
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        elapsed = time.perf_counter() - start
+        observe_request(request, response, elapsed, timings.queries)
+        total_ms = elapsed * 1000
+        db_ms = timings.db_time * 1000
+        template_ms = timings.template_time * 1000
+
+        flags = []
+        if total_ms > getattr(settings, "REQUEST_TIMING_SLOW_MS", 500):
+            flags.append("slow")
+        if timings.queries > getattr(
+                settings, "REQUEST_TIMING_MAX_QUERIES", 30):
+            flags.append("queries")
+        if timings.duplicate_queries > getattr(
+                settings, "REQUEST_TIMING_MAX_DUPLICATE_QUERIES", 5):
+            flags.append("duplicates")
+
+        values = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 1),
+            "db_ms": round(db_ms, 1),
+            "queries": timings.queries,
+            "duplicate_queries": timings.duplicate_queries,
+            "template_ms": round(template_ms, 1),
+            "flags": ",".join(flags) or "-",
+        }
+        logger.log(
+            logging.WARNING if flags else logging.INFO,
+            " ".join(f"{key}={value}" for key, value in values.items()),
+            extra={"timing": values},
+        )
+
+        if _user_loaded(request) and has_role(request, "admin"):
+            response["Server-Timing"] = ", ".join([
+                f"total;dur={total_ms:.1f}",
+                f'db;dur={db_ms:.1f};desc="{timings.queries} queries"',
+                f"tpl;dur={template_ms:.1f}",
+            ])
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile single requests on demand, for admins.
+
+    An admin adds `?profile=1` to a URL, or sends an `X-Profile: 1`
+    header, and that request is run under cProfile and stored by
+    `layout.profiling.save_profile`, both as a .prof file and as
+    collapsed stacks for a flamegraph, sampled from a background
+    thread while it runs. The name of the stored
+    profile is returned in the X-Profile response header.
+
+    Profiling slows the request down, so only one request is
+    profiled every REQUEST_PROFILING_INTERVAL seconds; requests
+    asking for a profile while it is rate limited are served as
+    usual, with an X-Profile header of 'rate-limited'. Requests
+    that don't ask for a profile pay for one dictionary lookup.
+
+    Must come after AuthenticationMiddleware, which loads the user
+    whose role is checked.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (request.GET.get("profile") != "1"
+                and request.headers.get("X-Profile") != "1"):
+            return self.get_response(request)
+        if not has_role(request, "admin"):
+            return self.get_response(request)
+        if not claim_profile_slot():
+            response = self.get_response(request)
+            response["X-Profile"] = "rate-limited"
+            return response
+
+        profiler = cProfile.Profile()
+        sampler = StackSampler(sys._getframe())
+        start = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            sampler.stop()
+        name = save_profile(
+            profiler, sampler, request, time.perf_counter() - start)
+        response["X-Profile"] = name
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 4.1 on 2026-10-18 13:28
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def recount_slots(apps, schema_editor):
+    """
+    Recount every class's slot counters from its bookings before
+    the constraint is added.
+
+    Concurrent bookings could overbook a class, leaving
+    `slots_available` negative and `slots_filled` off from the
+    real number of bookings, and such rows would fail the
+    constraint. A class's capacity is the sum of its counters, so
+    `slots_filled` is set to its number of bookings and
+    `slots_available` to what is left of the capacity, or to zero
+    if the class is overbooked.
+    """
+    Classes = apps.get_model("layout", "Classes")
+    Bookings = apps.get_model("layout", "Bookings")
+    booked = Bookings.objects.filter(
+        class_id=OuterRef("pk")
+    ).order_by().values("class_id").annotate(count=Count("id")).values(
+        "count")
+    filled = Coalesce(Subquery(booked), 0)
+    Classes.objects.update(
+        slots_available=Greatest(
+            F("slots_available") + F("slots_filled") - filled, 0),
+        slots_filled=filled,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("layout", "0002_remove_comments_author_remove_comments_post_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="classes",
+            constraint=models.CheckConstraint(
+                check=models.Q(("slots_available__gte", 0)),
+                name="classes_slots_available_gte_0",
+            ),
+        ),
+    ]
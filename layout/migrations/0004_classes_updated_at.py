@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("layout", "0003_classes_slots_available_check"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="classes",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("layout", "0004_classes_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="classes",
+            index=models.Index(
+                fields=["class_type", "class_date", "class_start_time"],
+                name="classes_type_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Refuse to create the unique index while users share an email
+    address, listing the addresses that need to be fixed first.
+    """
+    User = apps.get_model("auth", "User")
+    duplicates = list(
+        User.objects.filter(email__gt="")
+        .values(email_lower=Lower("email"))
+        .annotate(users=Count("id"))
+        .filter(users__gt=1)
+        .values_list("email_lower", flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Cannot make user emails unique, these addresses are used "
+            "by more than one account: " + ", ".join(sorted(duplicates))
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("layout", "0005_classes_type_date_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        # Case-insensitive email lookups for layout.backends.EmailBackend.
+        # Blank emails are left out so accounts without one are allowed.
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_lower_uniq "
+            "ON auth_user (LOWER(email)) WHERE email > ''",
+            "DROP INDEX auth_user_email_lower_uniq",
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("layout", "0006_auth_user_email_lower_uniq"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bookings",
+            index=models.Index(
+                fields=["user", "-booking_date"], name="bookings_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="classes",
+            index=models.Index(
+                condition=models.Q(
+                    ("slots_filled__lt", models.F("slots_available"))
+                ),
+                fields=["-class_date"],
+                name="classes_open_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="members",
+            index=models.Index(
+                fields=["-date_joined"], name="members_date_joined_idx"
+            ),
+        ),
+    ]
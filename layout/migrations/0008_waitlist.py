@@ -0,0 +1,57 @@
+# Generated by Django 4.1 on 2026-10-18 13:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("layout", "0007_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Waitlist",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("joined_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "class_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="layout.classes"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Waitlist",
+                "ordering": ["joined_at", "id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="waitlist",
+            index=models.Index(
+                fields=["class_id", "joined_at", "id"], name="waitlist_class_queue_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="waitlist",
+            unique_together={("user", "class_id")},
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1 on 2026-10-18 13:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("layout", "0008_waitlist"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClassSeries",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("class_name", models.CharField(max_length=200)),
+                ("class_description", models.TextField()),
+                (
+                    "class_type",
+                    models.IntegerField(
+                        choices=[(0, "Group"), (1, "Private")], default=0
+                    ),
+                ),
+                ("class_start_time", models.TimeField()),
+                ("class_end_time", models.TimeField()),
+                ("slots_available", models.IntegerField()),
+                ("weekdays", models.JSONField()),
+                ("starts_on", models.DateField()),
+                ("ends_on", models.DateField()),
+                ("exceptions", models.JSONField(blank=True, default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name_plural": "Class Series",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="classes",
+            name="series",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="layout.classseries",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.1 on 2026-10-18 15:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("layout", "0010_calendar_feed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoleVersion",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("version", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
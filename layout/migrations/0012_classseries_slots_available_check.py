@@ -0,0 +1,31 @@
+# Generated by Django 4.1 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+def clamp_slots(apps, schema_editor):
+    """
+    Raise negative capacities to zero before the constraint is
+    added. The check was missing, so a series could be saved with
+    one through the Django admin.
+    """
+    ClassSeries = apps.get_model("layout", "ClassSeries")
+    ClassSeries.objects.filter(slots_available__lt=0).update(
+        slots_available=0)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("layout", "0011_role_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="classseries",
+            constraint=models.CheckConstraint(
+                check=models.Q(("slots_available__gte", 0)),
+                name="classseries_slots_available_gte_0",
+            ),
+        ),
+    ]
@@ -1,12 +1,21 @@
+import secrets
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from cloudinary.models import CloudinaryField
 
 # Create your models here.
 STATUS = ((0, "Draft"), (1, "Publish"))
 CLASSES = ((0, "Group"), (1, "Private"))
+WEEKDAYS = (
+    (0, "Monday"), (1, "Tuesday"), (2, "Wednesday"), (3, "Thursday"),
+    (4, "Friday"), (5, "Saturday"), (6, "Sunday"),
+)
 
 
 class Members(models.Model):
@@ -31,6 +40,7 @@ class Members(models.Model):
     admin interface.
     - ordering (list): Default ordering of member records, set to
     display the most recently joined members first.
+    - indexes (list): An index serving the default ordering.
 
     Methods:
     - __str__(self): Returns a string representation of the member,
@@ -45,6 +55,10 @@ class Members(models.Model):
     class Meta:
         verbose_name_plural = 'Members'
         ordering = ['-date_joined']
+        indexes = [
+            models.Index(
+                fields=['-date_joined'], name='members_date_joined_idx'),
+        ]
 
     def __str__(self):
         return self.user.get_full_name() + " " + self.user.email
@@ -74,6 +88,11 @@ class Classes(models.Model):
     available for participants to book.
     - slots_filled (IntegerField): The number of slots that have
     already been filled. Defaults to 0.
+    - updated_at (DateTimeField): When the class, or its slot
+    counters, last changed. Bookings and cancellations touch this
+    too, so it tracks every change to the schedule feeds.
+    - series (ForeignKey): The ClassSeries the class was generated
+    from, if any. Kept as null if the series is deleted.
 
     Meta:
     - verbose_name_plural (str): A human-readable plural name
@@ -84,6 +103,15 @@ class Classes(models.Model):
     taken together, must be unique throughout the table.
     This ensures that no two classes
     can have the same date and start/end times.
+    - constraints (list): Database CHECK constraints. Bookings
+    decrement slots_available as they increment slots_filled, so
+    requiring slots_available to stay non-negative guarantees that
+    slots_filled can never exceed the capacity of the class.
+    - indexes (list): A (class_type, class_date, class_start_time)
+    index serving the class listing when it is filtered by type,
+    and a partial index on class_date covering only the classes
+    returned by get_available_classes. Unfiltered date ranges and
+    the default ordering use the unique_together index.
     """
     class_name = models.CharField(max_length=200)
     class_description = models.TextField()
@@ -93,11 +121,86 @@ class Classes(models.Model):
     class_end_time = models.TimeField()
     slots_available = models.IntegerField()
     slots_filled = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    series = models.ForeignKey(
+        'ClassSeries', null=True, blank=True, on_delete=models.SET_NULL)
 
     class Meta:
         verbose_name_plural = 'Classes'
         ordering = ['-class_date']
         unique_together = ['class_date', 'class_start_time', 'class_end_time']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(slots_available__gte=0),
+                name='classes_slots_available_gte_0',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['class_type', 'class_date', 'class_start_time'],
+                name='classes_type_date_idx',
+            ),
+            models.Index(
+                fields=['-class_date'],
+                name='classes_open_date_idx',
+                condition=models.Q(
+                    slots_filled__lt=models.F('slots_available')),
+            ),
+        ]
+
+
+class ClassSeries(models.Model):
+    """
+    Represents a class that repeats every week.
+
+    A series is a template for its classes. Its occurrences are
+    generated in bulk, one class per matching day, and each
+    generated class keeps a link back to the series.
+
+    Attributes:
+    - class_name, class_description, class_type, class_start_time,
+    class_end_time, slots_available: Copied to every generated
+    class, as on the Classes model.
+    - weekdays (JSONField): The days of the week the class runs
+    on, as integers from 0 (Monday) to 6 (Sunday).
+    - starts_on (DateField): The first date of the series.
+    - ends_on (DateField): The last date of the series, inclusive.
+    - exceptions (JSONField): ISO dates within the series on which
+    the class does not run, e.g. bank holidays.
+    - created_at (DateTimeField): When the series was created.
+
+    Meta:
+    - verbose_name_plural (str): A human-readable plural name
+    for the class, which is used in the Django admin.
+    - ordering (list): The default ordering for the queryset,
+    which is the most recently created series first.
+    - constraints (list): `slots_available` can't be negative, as
+    on the classes generated from the series.
+    """
+    class_name = models.CharField(max_length=200)
+    class_description = models.TextField()
+    class_type = models.IntegerField(choices=CLASSES, default=0)
+    class_start_time = models.TimeField()
+    class_end_time = models.TimeField()
+    slots_available = models.IntegerField()
+    weekdays = models.JSONField()
+    starts_on = models.DateField()
+    ends_on = models.DateField()
+    exceptions = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Class Series'
+        ordering = ['-created_at']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(slots_available__gte=0),
+                name='classseries_slots_available_gte_0',
+            ),
+        ]
+
+    def __str__(self):
+        return self.class_name
 
 
 class Bookings(models.Model):
@@ -124,6 +227,8 @@ class Bookings(models.Model):
     - unique_together (tuple): A set of field names that, taken
     together, must be unique throughout the table. This ensures
     that a user cannot book the same class more than once.
+    - indexes (list): A (user, booking_date) index serving a user's
+    bookings in the default ordering.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     class_id = models.ForeignKey(Classes, on_delete=models.CASCADE)
@@ -133,6 +238,126 @@ class Bookings(models.Model):
         verbose_name_plural = 'Bookings'
         ordering = ['-booking_date']
         unique_together = ['user', 'class_id']
+        indexes = [
+            models.Index(
+                fields=['user', '-booking_date'],
+                name='bookings_user_date_idx',
+            ),
+        ]
+
+
+class Waitlist(models.Model):
+    """
+    Represents a user waiting for a place in a fully booked class.
+
+    When a booking for the class is cancelled, the user who joined
+    the waitlist first is booked into the freed slot.
+
+    Attributes:
+    - user (ForeignKey): A reference to the User model,
+    indicating which user is waiting.
+    - class_id (ForeignKey): A reference to the Classes model,
+    indicating which class the user is waiting for.
+    - joined_at (DateTimeField): The date and time when the user
+    joined the waitlist, which sets their place in the queue.
+
+    Meta:
+    - verbose_name_plural (str): A human-readable plural name
+    for the class, which is used in the Django admin.
+    - ordering (list): The default ordering for the queryset,
+    which is the order users will be promoted in.
+    - unique_together (tuple): A user can only wait for a class
+    once.
+    - indexes (list): A (class_id, joined_at, id) index, so the
+    head of a class's waitlist is found with a single index probe
+    however long the waitlist is.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    class_id = models.ForeignKey(Classes, on_delete=models.CASCADE)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Waitlist'
+        ordering = ['joined_at', 'id']
+        unique_together = ['user', 'class_id']
+        indexes = [
+            models.Index(
+                fields=['class_id', 'joined_at', 'id'],
+                name='waitlist_class_queue_idx',
+            ),
+        ]
+
+
+def new_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeed(models.Model):
+    """
+    Represents a member's private calendar subscription.
+
+    Calendar apps can't log in, so a member's feed of booked
+    classes is served to anyone with its unguessable token.
+
+    Attributes:
+    - user (OneToOneField): A one-to-one link to the User whose
+    bookings the feed lists.
+    - token (CharField): The random token in the feed's URL.
+    - created_at (DateTimeField): When the feed was created.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    token = models.CharField(
+        max_length=64, unique=True, default=new_feed_token)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.user.username
+
+
+class RoleVersion(models.Model):
+    """
+    Counts the changes to a user's group membership.
+
+    Roles cached in a session are tagged with the version they were
+    read at, and are read again once it moves on. It is kept in the
+    database, rather than in a process's cache, so a change made by
+    one worker is seen by every other, and it is read together
+    with the user, so checking it costs no extra query.
+
+    Attributes:
+    - user (OneToOneField): The User whose roles changed, also the
+    primary key. Users whose roles never changed have no row.
+    - version (PositiveIntegerField): Bumped on every change.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.version}"
+
+
+# Set while bookings are deleted by code that settles the slot
+# counters itself, so `decrement_slots` leaves them alone
+_slots_settled = ContextVar("slots_settled", default=False)
+
+
+@contextmanager
+def slots_settled():
+    """
+    Stop `decrement_slots` from releasing a slot for each booking
+    deleted in the block.
+
+    For bulk deletes that release the slots of every class at once,
+    or that delete the classes too, where an UPDATE per booking
+    would be wasted. The caller is responsible for the counters of
+    any class that outlives the block.
+    """
+    token = _slots_settled.set(True)
+    try:
+        yield
+    finally:
+        _slots_settled.reset(token)
 
 
 @receiver(post_delete, sender=Bookings)
@@ -143,6 +368,10 @@ def decrement_slots(sender, instance, **kwargs):
     number of available slots for a class when a booking
     is deleted.
 
+    The counters are changed with a single UPDATE rather than
+    by saving the class, so concurrent cancellations can't
+    overwrite each other's changes.
+
     Args:
         sender (Model): The model class that sent the
         signal.
@@ -154,7 +383,10 @@ def decrement_slots(sender, instance, **kwargs):
     Returns:
         None
     """
-    class_instance = instance.class_id
-    class_instance.slots_available += 1
-    class_instance.slots_filled -= 1
-    class_instance.save()
+    if _slots_settled.get():
+        return
+    Classes.objects.filter(id=instance.class_id_id).update(
+        slots_available=models.F('slots_available') + 1,
+        slots_filled=models.F('slots_filled') - 1,
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+# Cache key held while profiling is rate limited
+RATE_LIMIT_KEY = "request_profiling:rate_limit"
+# File extensions of a stored profile: the cProfile data, and the
+# same profile as collapsed stacks for flamegraph tools
+PROFILE_EXTENSIONS = (".prof", ".collapsed")
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.001
+
+_profile_name = re.compile(
+    r"^(?P<stamp>\d{8}-\d{6}-\d{6})-(?P<pid>\d+)-(?P<view>\w+)"
+    r"-(?P<ms>\d+)ms\Z")
+
+
+def profile_dir():
+    """
+    Return the directory profiles are stored in, from the
+    REQUEST_PROFILING_DIR setting.
+    """
+    return Path(settings.REQUEST_PROFILING_DIR)
+
+
+def claim_profile_slot():
+    """
+    Return True if a request may be profiled now, and if so, stop
+    any other request being profiled for the next
+    REQUEST_PROFILING_INTERVAL seconds.
+    """
+    return cache.add(RATE_LIMIT_KEY, True, settings.REQUEST_PROFILING_INTERVAL)
+
+
+def _label(code):
+    filename = Path(code.co_filename).name
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread from a background thread.
+
+    cProfile records how long each function took and who called it,
+    but not whole stacks, so flamegraphs are built from these
+    samples instead. Each sample is weighted by the time since the
+    one before, so the collapsed output is in microseconds however
+    often the sampling thread actually gets to run.
+
+    Attributes:
+    - stacks (Counter): Seconds spent in each stack, keyed by its
+    frames from the outermost, joined with ';'.
+    """
+    def __init__(self, root, interval=SAMPLE_INTERVAL):
+        """
+        Parameters:
+        - root (frame): The frame of the sampled thread to sample
+        below, so frames of the server that called it are left
+        out.
+        - interval (float): Seconds between samples.
+        """
+        self.root = root
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None and frame is not self.root:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += now - last
+            last = now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """
+        Return the samples as "frame;frame;frame microseconds"
+        lines, the input format of flamegraph.pl and speedscope.
+        """
+        return [
+            f"{stack} {round(seconds * 1e6)}"
+            for stack, seconds in self.stacks.items()
+            if round(seconds * 1e6)
+        ]
+
+
+def save_profile(profiler, sampler, request, seconds):
+    """
+    Store a request's profile, and remove the oldest profiles
+    beyond the REQUEST_PROFILING_KEEP most recent.
+
+    Parameters:
+    - profiler (cProfile.Profile): The finished profile.
+    - sampler (StackSampler): The stopped sampler of the request's
+    stacks.
+    - request (HttpRequest): The profiled request.
+    - seconds (float): How long the request took.
+
+    Returns:
+    - str: The name of the profile, which its files are named
+    after.
+    """
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    match = getattr(request, "resolver_match", None)
+    view = re.sub(r"\W", "_", (match.url_name or "") if match else "")
+    name = "%s-%d-%s-%dms" % (
+        timezone.now().strftime("%Y%m%d-%H%M%S-%f"),
+        os.getpid(),
+        view or "unmatched",
+        seconds * 1000,
+    )
+    profiler.dump_stats(directory / f"{name}.prof")
+    with open(directory / f"{name}.collapsed", "w") as collapsed:
+        for line in sampler.collapsed():
+            collapsed.write(line + "\n")
+
+    for old in list_profiles()[settings.REQUEST_PROFILING_KEEP:]:
+        for _, filename in old["files"]:
+            (directory / filename).unlink(missing_ok=True)
+    return name
+
+
+def list_profiles():
+    """
+    List the stored profiles, newest first.
+
+    Returns:
+    - list: A dict for each profile, with its 'name', the 'view'
+    (URL name) of the request, when it was 'created', the request's
+    'duration_ms' and its 'files', as (extension, file name)
+    pairs.
+    """
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = {}
+    for filename in os.listdir(directory):
+        stem, extension = os.path.splitext(filename)
+        match = _profile_name.match(stem)
+        if extension not in PROFILE_EXTENSIONS or not match:
+            continue
+        if stem not in profiles:
+            profiles[stem] = {
+                "name": stem,
+                "view": match["view"],
+                "created": timezone.make_aware(
+                    datetime.strptime(match["stamp"], "%Y%m%d-%H%M%S-%f"),
+                    dt_timezone.utc),
+                "duration_ms": int(match["ms"]),
+                "files": [],
+            }
+        profiles[stem]["files"].append((extension[1:], filename))
+    for profile in profiles.values():
+        profile["files"].sort()
+    return sorted(profiles.values(), key=lambda p: p["name"], reverse=True)
+
+
+def profile_file(filename):
+    """
+    Return the path of a stored profile file, or None if there is
+    no such file. Only names of files in the profile directory are
+    accepted, so the name can come straight from a URL.
+    """
+    directory = profile_dir()
+    if (not filename.endswith(PROFILE_EXTENSIONS)
+            or not _profile_name.match(os.path.splitext(filename)[0])
+            or not (directory / filename).is_file()):
+        return None
+    return directory / filename
@@ -0,0 +1,167 @@
+import time
+
+from django.contrib.auth.models import Group, User
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete)
+from django.dispatch import receiver
+
+from layout.models import RoleVersion
+
+# Session key holding a user's cached roles
+SESSION_KEY = "_user_roles"
+# How long roles cached in a session are trusted, in seconds. Role
+# changes invalidate the cache straight away through the user's
+# RoleVersion, which every worker reads from the database; this
+# only bounds how long a session carries roles at all.
+ROLES_SESSION_TTL = 300
+
+# Process-wide cache of Group objects by name
+_groups = {}
+
+
+def _bump_versions(user_ids):
+    """
+    Move on the RoleVersion of each user, creating it for users
+    whose roles never changed before, with two queries however
+    many users there are.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    RoleVersion.objects.bulk_create(
+        [RoleVersion(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True)
+    RoleVersion.objects.filter(user_id__in=user_ids).update(
+        version=F("version") + 1)
+
+
+def _get_version(user):
+    """
+    Return a user's RoleVersion number, as loaded with the user by
+    `layout.backends.EmailBackend`, or read from the database for
+    users loaded any other way.
+    """
+    version = getattr(user, "roles_version", None)
+    if version is None:
+        version = RoleVersion.objects.filter(user_id=user.id).values_list(
+            "version", flat=True).first() or 0
+    return version
+
+
+def get_group(name):
+    """
+    Return the Group with the given name, caching it for the
+    lifetime of the process.
+
+    The cache is cleared whenever a group is saved or deleted.
+
+    Parameters:
+    - name (str): The group name.
+
+    Returns:
+    - Group: The matching group.
+
+    Raises:
+    - Group.DoesNotExist: If there is no such group.
+    """
+    group = _groups.get(name)
+    if group is None:
+        group = Group.objects.get(name=name)
+        _groups[name] = group
+    return group
+
+
+def get_user_roles(request):
+    """
+    Return the names of the groups the current user belongs to.
+
+    Roles are resolved at most once per request. They are also
+    cached in the user's session, so most requests don't query
+    the user's groups at all. The session cache is invalidated when
+    the user's group membership changes, through a version kept in
+    the database so every worker process sees it, and expires
+    after ROLES_SESSION_TTL seconds regardless.
+
+    Parameters:
+    - request: HttpRequest object for the current user.
+
+    Returns:
+    - frozenset: The user's group names. Empty for anonymous users.
+    """
+    roles = getattr(request, "_user_roles", None)
+    if roles is not None:
+        return roles
+
+    user = request.user
+    if not user.is_authenticated:
+        roles = frozenset()
+    else:
+        session = getattr(request, "session", None)
+        version = _get_version(user)
+        cached = session.get(SESSION_KEY) if session is not None else None
+        if (
+            cached
+            and cached["user"] == user.id
+            and cached["version"] == version
+            and cached["expires"] > time.time()
+        ):
+            roles = frozenset(cached["roles"])
+        else:
+            roles = frozenset(user.groups.values_list("name", flat=True))
+            if session is not None:
+                session[SESSION_KEY] = {
+                    "user": user.id,
+                    "version": version,
+                    "expires": time.time() + ROLES_SESSION_TTL,
+                    "roles": sorted(roles),
+                }
+    request._user_roles = roles
+    return roles
+
+
+def has_role(request, *roles):
+    """
+    Return True if the current user has any of the given roles.
+    """
+    return not get_user_roles(request).isdisjoint(roles)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """
+    Signal handler to invalidate cached roles when group
+    membership changes.
+
+    Handles changes made from either side of the relation, e.g.
+    `user.groups.add(group)` and `group.user_set.add(user)`.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif pk_set:
+        user_ids = pk_set
+    else:
+        user_ids = instance.user_set.values_list("pk", flat=True)
+    _bump_versions(user_ids)
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_group_roles(sender, instance, **kwargs):
+    """
+    Signal handler to invalidate the cached roles of a group's
+    members before the group is deleted.
+    """
+    _bump_versions(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def clear_group_cache(sender, **kwargs):
+    """
+    Signal handler to clear the process-wide group cache when a
+    group is saved or deleted.
+    """
+    _groups.clear()
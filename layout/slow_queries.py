@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import re
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils import timezone
+
+logger = logging.getLogger("layout.slow_queries")
+
+# Set while a slow query is being recorded, so the queries that
+# explain it are never recorded themselves
+_recording = ContextVar("recording_slow_query", default=False)
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """
+    Reduce a SQL statement to its shape, so that runs of the same
+    query with different values can be grouped.
+
+    Parameters and literals become '?', IN lists of any length
+    become 'IN (...)' and whitespace is collapsed.
+    """
+    sql = _literals.sub("?", sql).replace("%s", "?")
+    sql = _in_lists.sub("IN (...)", sql)
+    return " ".join(sql.split())
+
+
+def fingerprint(normalized_sql):
+    """
+    Return a short, stable identifier for a normalized statement.
+    """
+    return hashlib.md5(normalized_sql.encode()).hexdigest()[:16]
+
+
+def explain(connection, sql, params):
+    """
+    Return the query plan of a statement, or None if the database
+    can't explain it.
+
+    SELECTs are run with EXPLAIN ANALYZE on PostgreSQL, to show the
+    actual row counts and timings; other statements are only
+    planned, so explaining them never changes any data. The EXPLAIN
+    runs on the raw cursor, so it isn't itself timed or logged, and
+    inside a savepoint, so a failure can't break the transaction of
+    the request.
+    """
+    if not connection.features.supports_explaining_query_execution:
+        return None
+    options = {}
+    if (connection.vendor == "postgresql"
+            and sql.lstrip()[:6].upper() == "SELECT"):
+        options["analyze"] = True
+    prefix = connection.ops.explain_query_prefix(**options)
+    savepoint = connection.in_atomic_block and connection.savepoint()
+    try:
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            cursor.cursor.execute(f"{prefix} {sql}", params)
+            rows = cursor.cursor.fetchall()
+    except DatabaseError:
+        if savepoint:
+            connection.savepoint_rollback(savepoint)
+        return None
+    if savepoint:
+        connection.savepoint_commit(savepoint)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def record_slow_query(connection, sql, params, many, seconds, request=None):
+    """
+    Log a query that took longer than SLOW_QUERY_MS.
+
+    The record is logged as a line of JSON on the
+    'layout.slow_queries' logger, which writes to the rotating
+    SLOW_QUERY_LOG_FILE, for the `slow_query_report` command. A
+    query shape is explained at most once every
+    SLOW_QUERY_EXPLAIN_INTERVAL seconds, as EXPLAIN ANALYZE runs the
+    query again; records in between have no plan.
+
+    Parameters:
+    - connection: The database connection that ran the query.
+    - sql (str): The statement, with placeholders.
+    - params: Its parameters.
+    - many (bool): Whether it was run with executemany.
+    - seconds (float): How long it took.
+    - request (HttpRequest): The request that ran it, if any.
+
+    Returns:
+    - dict: The record, or None if called while recording another
+    query.
+    """
+    if _recording.get():
+        return None
+    token = _recording.set(True)
+    try:
+        return _record(connection, sql, params, many, seconds, request)
+    finally:
+        _recording.reset(token)
+
+
+def _record(connection, sql, params, many, seconds, request):
+    normalized = normalize_sql(sql)
+    key = fingerprint(normalized)
+    match = getattr(request, "resolver_match", None)
+    plan = None
+    if not many and cache.add(
+            f"slow_query_explained:{key}", True,
+            settings.SLOW_QUERY_EXPLAIN_INTERVAL):
+        plan = explain(connection, sql, params)
+    record = {
+        "time": timezone.now().isoformat(),
+        "view": (match.url_name or match.view_name) if match else None,
+        "fingerprint": key,
+        "sql": normalized,
+        "duration_ms": round(seconds * 1000, 3),
+        "plan": plan,
+    }
+    logger.warning(json.dumps(record), extra={"slow_query": record})
+    return record
@@ -0,0 +1,393 @@
+from django.contrib.auth.models import User
+from django.db.models import Count, F
+from django.urls import get_resolver
+from django.test import TestCase
+
+from .benchmarks.datasets import (
+    allocate, generate_dataset, seed_dataset, GENERATED_PREFIX,
+    SEED_PASSWORD)
+from .benchmarks.queries import (
+    check_query_budgets, query_budget, QueryBudgetExceeded, QueryRecorder,
+    POST_QUERY_BUDGETS, QUERY_BUDGETS)
+from .benchmarks.replay import endpoint, load_log, map_accounts, replay
+from .benchmarks.views import (
+    compare, measure_post_queries, measure_queries, merge_baseline,
+    run_benchmarks, url_names, EXCLUDED_URLS, POST_BENCHMARKS,
+    VIEW_BENCHMARKS)
+from .booking_functions.booking import recount_slots
+from . import views
+from .models import Bookings, Classes, Members, Waitlist
+
+
+class TestSeedDataset(TestCase):
+    def test_seed_dataset_grows(self):
+        """
+        Test that seeding grows the dataset to the requested size,
+        keeps every class's slot counters consistent with its
+        bookings, and only adds the missing rows when called again.
+        """
+        users = seed_dataset(50)
+        self.assertEqual(Classes.objects.count(), 50)
+        seed_dataset(120)
+        self.assertEqual(Classes.objects.count(), 120)
+        self.assertEqual(
+            Bookings.objects.exclude(user=users["member"]).count(), 120)
+        self.assertEqual(
+            Bookings.objects.filter(user=users["member"]).count(), 2)
+        self.assertFalse(
+            Classes.objects.annotate(booked=Count("bookings"))
+            .exclude(slots_filled=F("booked")).exists())
+        self.assertEqual(seed_dataset(120)["admin"], users["admin"])
+        self.assertEqual(Classes.objects.count(), 120)
+
+
+class TestGenerateDataset(TestCase):
+    def test_allocate(self):
+        """
+        Test that items are shared in proportion to the weights,
+        that full bins overflow into the others, and that too many
+        items are refused.
+        """
+        self.assertEqual(allocate(6, [1, 1, 1], [5, 5, 5]), [2, 2, 2])
+        self.assertEqual(allocate(9, [8, 1, 1], [5, 5, 5]), [5, 2, 2])
+        self.assertEqual(allocate(2, [1, 3, 2], [1, 1, 5]), [0, 1, 1])
+        self.assertEqual(allocate(0, [1, 1], [1, 1]), [0, 0])
+        with self.assertRaises(ValueError):
+            allocate(3, [1, 1], [1, 1])
+
+    def test_generate_dataset(self):
+        """
+        Test that the requested rows are generated, with every
+        class's counters matching its bookings and within its
+        capacity, and that the same seed generates the same data.
+        """
+        created = generate_dataset(
+            50, 30, 400, popularity=1.5, private_share=0.2, seed=3)
+        self.assertEqual(
+            created, {"members": 30, "classes": 50, "bookings": 400})
+        self.assertEqual(Members.objects.count(), 31)
+        self.assertEqual(
+            User.objects.filter(groups__name="member").count(), 30)
+        self.assertEqual(Bookings.objects.count(), 400)
+        self.assertFalse(
+            Classes.objects.annotate(booked=Count("bookings"))
+            .exclude(slots_filled=F("booked")).exists())
+        self.assertFalse(Classes.objects.filter(
+            class_type=1, slots_available__gt=2).exists())
+        self.assertTrue(Classes.objects.filter(
+            slots_available=0).exists())
+        self.assertTrue(User.objects.get(
+            username=f"{GENERATED_PREFIX}0").check_password(
+            SEED_PASSWORD))
+
+        bookings = set(Bookings.objects.values_list(
+            "user__username", "class_id__class_name"))
+        User.objects.all().delete()
+        Classes.objects.all().delete()
+        generate_dataset(
+            50, 30, 400, popularity=1.5, private_share=0.2, seed=3)
+        self.assertEqual(bookings, set(Bookings.objects.values_list(
+            "user__username", "class_id__class_name")))
+
+    def test_generate_around_existing_classes(self):
+        """
+        Test that generated classes take the free slots of the
+        schedule, next to classes already there.
+        """
+        seed_dataset(25)
+        generate_dataset(25, 5, 10)
+        self.assertEqual(Classes.objects.count(), 50)
+
+
+class TestViewBenchmarks(TestCase):
+    def test_every_url_is_benchmarked(self):
+        """
+        Test that every URL in tough_glove/urls.py has a benchmark,
+        so new views can't be left out.
+        """
+        self.assertEqual(
+            set(url_names()) - EXCLUDED_URLS, set(VIEW_BENCHMARKS))
+
+    def test_run_benchmarks(self):
+        """
+        Test that every view is requested and measured, and that the
+        paginated views run the same queries at both sizes.
+        """
+        users = seed_dataset(40)
+        small = run_benchmarks(users, repeat=1)
+        self.assertEqual(set(small), set(VIEW_BENCHMARKS))
+        self.assertEqual(
+            {name for name, result in small.items()
+             if result["status"] >= 500}, set())
+        self.assertEqual(small["classes"]["status"], 200)
+        self.assertGreater(small["classes"]["ms"], 0)
+        self.assertGreater(small["classes"]["queries"], 0)
+
+        names = ["classes", "user_bookings", "get_classes"]
+        seed_dataset(80)
+        large = run_benchmarks(users, repeat=1, names=names)
+        self.assertEqual(set(large), set(names))
+        small = {name: small[name] for name in names}
+        self.assertEqual(
+            compare({"40": small, "80": large}, {}, 25, 2), [])
+
+    def test_compare(self):
+        """
+        Test that regressions against the baseline are reported, and
+        that noise and known problems are not.
+        """
+        def result(ms, queries, status=200):
+            return {"ms": ms, "queries": queries, "status": status}
+
+        baseline = {
+            "10": {"a": result(10, 3), "b": result(10, 3),
+                   "c": result(10, 3, 500)},
+            "100": {"a": result(10, 3), "b": result(10, 30),
+                    "c": result(10, 3, 500)},
+        }
+        unchanged = {
+            "10": {"a": result(11, 3), "b": result(10, 3),
+                   "c": result(10, 3, 500)},
+            "100": {"a": result(11.5, 3), "b": result(10, 30),
+                    "c": result(10, 3, 500)},
+        }
+        self.assertEqual(compare(unchanged, baseline, 25, 2), [])
+
+        regressed = {
+            "10": {"a": result(20, 3), "b": result(10, 3),
+                   "c": result(10, 3)},
+            "100": {"a": result(10, 9), "b": result(10, 30),
+                    "d": result(10, 1, 404)},
+        }
+        regressed["10"]["d"] = result(10, 1)
+        self.assertEqual(compare(regressed, baseline, 25, 2), [
+            "a at 10: 20 ms, was 10 ms",
+            "a at 100: 9 queries, was 3",
+            "d at 100: status 404",
+            "a: queries grow with the data, 3 at 10 to 9 at 100",
+        ])
+
+    def test_merge_baseline(self):
+        """
+        Test that views failing with a server error are left out of
+        the baseline, along with their earlier results, and that
+        the other results are stored.
+        """
+        def result(ms, status=200):
+            return {"ms": ms, "queries": 1, "status": status}
+
+        baseline = {"10": {"a": result(10), "b": result(10),
+                           "c": result(10)}}
+        results = {
+            "10": {"a": result(20), "b": result(20, 500)},
+            "100": {"a": result(30), "b": result(30)},
+        }
+        self.assertEqual(merge_baseline(baseline, results), {"b": 500})
+        self.assertEqual(baseline, {
+            "10": {"a": result(20), "c": result(10)},
+            "100": {"a": result(30)},
+        })
+
+
+class TestQueryBudgets(TestCase):
+    def test_every_view_has_a_budget(self):
+        """
+        Test that every view in layout/views.py is served by a URL
+        with a query budget.
+        """
+        self.assertEqual(set(QUERY_BUDGETS), set(VIEW_BENCHMARKS))
+        budgeted = {
+            pattern.callback for pattern in get_resolver().url_patterns
+            if getattr(pattern, "name", None) in QUERY_BUDGETS
+        }
+        for name, view in vars(views).items():
+            if (callable(view) and getattr(view, "__module__", None)
+                    == views.__name__ and not name.startswith("_")):
+                self.assertIn(view, budgeted, name)
+
+    def test_queries_dont_grow_with_the_data(self):
+        """
+        Test that no view runs more queries when there are more
+        users, classes and bookings, and that each stays within its
+        budget.
+        """
+        users = seed_dataset(40)
+        smaller = measure_queries(users)
+        self.assertEqual(set(smaller), set(VIEW_BENCHMARKS))
+
+        seed_dataset(200)
+        member = users["member"]
+        classes = Classes.objects.exclude(bookings__user=member)
+        Bookings.objects.bulk_create(
+            [Bookings(user=member, class_id=c) for c in classes[:20]])
+        Waitlist.objects.bulk_create(
+            [Waitlist(user=member, class_id=c) for c in classes[20:25]])
+        recount_slots(Classes.objects.all())
+        larger = measure_queries(users)
+        failures = check_query_budgets(smaller, larger)
+        self.assertFalse(failures, "\n" + "\n".join(failures))
+
+    def test_post_queries_dont_grow_with_the_data(self):
+        """
+        Test that booking, cancelling, and joining and leaving a
+        waitlist run no more queries with more data, that each
+        stays within its budget, and that cancelling a booking
+        promotes the waitlist.
+        """
+        self.assertEqual(set(POST_QUERY_BUDGETS), set(POST_BENCHMARKS))
+        users = seed_dataset(40)
+        smaller = measure_post_queries(users)
+        seed_dataset(200)
+        larger = measure_post_queries(users)
+        for results in (smaller, larger):
+            self.assertEqual(
+                {status for status, queries in results.values()}, {302})
+        self.assertEqual(Bookings.objects.filter(
+            user=users["admin"],
+            class_id__class_name="POST benchmark promoted").count(), 2)
+        failures = check_query_budgets(
+            {name: queries for name, (status, queries) in smaller.items()},
+            {name: queries for name, (status, queries) in larger.items()},
+            POST_QUERY_BUDGETS)
+        self.assertFalse(failures, "\n" + "\n".join(failures))
+
+    def test_query_budget(self):
+        """
+        Test that the budget fails a block or a function running
+        too many queries, listing the repeated queries.
+        """
+        with query_budget(2) as queries:
+            list(Classes.objects.all())
+        self.assertEqual(queries.count, 1)
+
+        with self.assertRaises(QueryBudgetExceeded) as caught:
+            with query_budget(1, label="The loop"):
+                for pk in (1, 2, 3):
+                    Classes.objects.filter(pk=pk).exists()
+        message = str(caught.exception)
+        self.assertIn("The loop ran 3 queries, over its budget of 1", message)
+        self.assertRegex(message, r"[0-9a-f]{16} x3: SELECT")
+
+        @query_budget(0)
+        def query():
+            Classes.objects.count()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            query()
+
+    def test_check_query_budgets(self):
+        """
+        Test that views whose queries grow or exceed their budget
+        are reported with their repeated queries.
+        """
+        def recorder(*statements):
+            queries = QueryRecorder()
+            queries.statements.extend(statements)
+            return queries
+
+        select = "SELECT * FROM layout_classes WHERE id = %s"
+        smaller = {"profile": recorder(select), "homepage": recorder()}
+        larger = {
+            "profile": recorder(select, select),
+            "homepage": recorder(),
+            "unknown": recorder(),
+        }
+        smaller["unknown"] = recorder()
+        failures = check_query_budgets(smaller, larger)
+        self.assertEqual(len(failures), 2)
+        self.assertTrue(failures[0].startswith(
+            "profile: queries grow with the data, 1 to 2\n"))
+        self.assertIn(
+            "x2: SELECT * FROM layout_classes WHERE id = ?", failures[0])
+        self.assertEqual(failures[1], "unknown: no query budget")
+
+
+class TestReplay(TestCase):
+    def test_load_log(self):
+        """
+        Test that logged requests are parsed and put in the order
+        they were made, with their offset from the first.
+        """
+        entries = load_log([
+            '{"method": "post", "path": "/book_class/1/", "role": "member",'
+            ' "user": "u1", "timestamp": "2026-10-12T07:00:02Z"}',
+            "",
+            '{"path": "/", "timestamp": 1791788400.5}',
+        ])
+        self.assertEqual(
+            [(e["method"], e["path"], e["role"], e["user"], e["offset"])
+             for e in entries],
+            [("GET", "/", "anonymous", None, 0),
+             ("POST", "/book_class/1/", "member", "u1", 1.5)])
+
+    def test_load_log_errors(self):
+        """
+        Test that invalid entries are refused with their line number.
+        """
+        for line, message in (
+            ('{"path": "/"}', "Line 1: missing 'timestamp'"),
+            ('{"path": "x", "timestamp": 0}', "Line 1: invalid path"),
+            ('{"path": "/", "role": "owner", "timestamp": 0}',
+             "Line 1: unknown role"),
+            ('{"path": "/", "timestamp": "Monday"}',
+             "Line 1: invalid timestamp"),
+            ("[]", "Line 1: not a JSON object"),
+        ):
+            with self.assertRaisesMessage(ValueError, message):
+                load_log([line])
+
+    def test_map_accounts(self):
+        """
+        Test that logged users are given accounts of their role in
+        the order they appear, sharing them when there are too few.
+        """
+        users = seed_dataset(20)
+        entries = [
+            {"role": role, "user": user}
+            for role, user in (
+                ("member", "a"), ("member", "b"), ("anonymous", None),
+                ("member", "a"), ("admin", None))
+        ]
+        self.assertEqual(
+            map_accounts(entries, {
+                "member": [users["member"]], "admin": [users["admin"]]}),
+            {("member", "a"): users["member"],
+             ("member", "b"): users["member"],
+             ("anonymous", None): None,
+             ("admin", None): users["admin"]})
+        with self.assertRaisesMessage(ValueError, "No admin accounts"):
+            map_accounts(entries, {"member": [users["member"]]})
+
+    def test_replay_records_failures(self):
+        """
+        Test that a request raising an error is recorded as failed,
+        and the thread that made it goes on replaying the rest.
+        """
+        class Session:
+            def request(self, method, path, data):
+                if path == "/classes/":
+                    raise KeyError("csrftoken")
+                return 200
+
+        entries = load_log([
+            f'{{"path": "{path}", "role": "member", "timestamp": {n}}}'
+            for n, path in enumerate(
+                ["/classes/", "/profile/", "/classes/", "/"])
+        ])
+        results, elapsed = replay(
+            entries, {("member", None): Session()}, speed=0, concurrency=1)
+        self.assertEqual(
+            [(result["endpoint"], result["status"]) for result in results],
+            [("GET classes", None), ("GET profile", 200),
+             ("GET classes", None), ("GET homepage", 200)])
+
+    def test_endpoint(self):
+        """
+        Test that requests are grouped by method and URL name.
+        """
+        self.assertEqual(
+            endpoint("POST", "/book_class/12/"), "POST book_class")
+        self.assertEqual(
+            endpoint("GET", "/get_classes/?start=2026-10-12"),
+            "GET get_classes")
+        self.assertEqual(endpoint("GET", "/nowhere/"), "GET (unmatched)")
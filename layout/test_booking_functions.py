@@ -0,0 +1,584 @@
+from datetime import date, time
+from django.test import TestCase
+from io import StringIO
+from django.contrib.auth.models import Group, User
+from django.db import IntegrityError, connection
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+from .models import *
+from layout.booking_functions.booking import (
+    book_class, cancel_booking, delete_class, delete_member, join_waitlist,
+    BOOKED, FULL, ALREADY_BOOKED, NOT_FOUND,
+    WAITLISTED, ALREADY_WAITLISTED, NOT_FULL)
+from layout.booking_functions.bulk_import import import_csv
+from layout.booking_functions.schedule import get_class_page
+from layout.booking_functions.series import (
+    copy_week, create_classes, expand_series, find_conflicts)
+
+
+class TestBookClass(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating two users
+        and a class with a single slot.
+        """
+        self.user = User.objects.create_user(
+            username="testuser1",
+            email="testemail@gmail.com",
+            password="testpassword332",
+        )
+        self.other_user = User.objects.create_user(
+            username="testuser2",
+            email="testuseremail2@email.com",
+            password="testpassword3322",
+        )
+        self.class_instance = Classes.objects.create(
+            class_name="Test Class",
+            class_description="Test Description",
+            class_type=0,
+            class_date="2024-01-01",
+            class_start_time="09:00:00",
+            class_end_time="10:00:00",
+            slots_available=1,
+            slots_filled=0,
+        )
+
+    def test_book_class_claims_slot(self):
+        """
+        Test that a successful booking creates the booking
+        and moves one slot from available to filled.
+        """
+        result = book_class(self.user, self.class_instance.id)
+        self.assertEqual(result, BOOKED)
+        self.class_instance.refresh_from_db()
+        self.assertEqual(self.class_instance.slots_available, 0)
+        self.assertEqual(self.class_instance.slots_filled, 1)
+        self.assertTrue(
+            Bookings.objects.filter(
+                user=self.user, class_id=self.class_instance).exists())
+
+    def test_book_class_query_count(self):
+        """
+        Test that a successful booking is a single conditional
+        UPDATE and a single INSERT, wrapped in a savepoint.
+        """
+        with self.assertNumQueries(4):
+            book_class(self.user, self.class_instance.id)
+
+    def test_book_full_class(self):
+        """
+        Test that booking a class with no slots left is
+        rejected without changing the slot counters.
+        """
+        book_class(self.other_user, self.class_instance.id)
+        result = book_class(self.user, self.class_instance.id)
+        self.assertEqual(result, FULL)
+        self.class_instance.refresh_from_db()
+        self.assertEqual(self.class_instance.slots_available, 0)
+        self.assertEqual(self.class_instance.slots_filled, 1)
+        self.assertFalse(
+            Bookings.objects.filter(user=self.user).exists())
+
+    def test_book_class_twice(self):
+        """
+        Test that booking the same class twice is rejected and
+        the slot claimed by the second attempt is rolled back.
+        """
+        self.class_instance.slots_available = 5
+        self.class_instance.save()
+        book_class(self.user, self.class_instance.id)
+        result = book_class(self.user, self.class_instance.id)
+        self.assertEqual(result, ALREADY_BOOKED)
+        self.class_instance.refresh_from_db()
+        self.assertEqual(self.class_instance.slots_available, 4)
+        self.assertEqual(self.class_instance.slots_filled, 1)
+
+    def test_book_missing_class(self):
+        """
+        Test that booking a class that does not exist is reported.
+        """
+        result = book_class(self.user, self.class_instance.id + 1)
+        self.assertEqual(result, NOT_FOUND)
+
+    def test_slots_available_check_constraint(self):
+        """
+        Test that the database refuses to let slots_available
+        go below zero.
+        """
+        self.class_instance.slots_available = -1
+        with self.assertRaises(IntegrityError):
+            self.class_instance.save()
+
+
+
+class TestWaitlist(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating three users and a
+        single slot class that the first user has booked.
+        """
+        self.users = [
+            User.objects.create_user(username=f"testuser{i}")
+            for i in range(3)
+        ]
+        self.class_instance = Classes.objects.create(
+            class_name="Test Class",
+            class_description="Test Description",
+            class_type=0,
+            class_date="2024-01-01",
+            class_start_time="09:00:00",
+            class_end_time="10:00:00",
+            slots_available=1,
+            slots_filled=0,
+        )
+        book_class(self.users[0], self.class_instance.id)
+
+    def test_join_waitlist(self):
+        """
+        Test that users can join the waitlist of a full class
+        once, and that a booked user can't join it.
+        """
+        pk = self.class_instance.id
+        self.assertEqual(join_waitlist(self.users[1], pk), WAITLISTED)
+        self.assertEqual(
+            join_waitlist(self.users[1], pk), ALREADY_WAITLISTED)
+        self.assertEqual(join_waitlist(self.users[0], pk), ALREADY_BOOKED)
+        self.assertEqual(join_waitlist(self.users[1], pk + 1), NOT_FOUND)
+
+    def test_join_waitlist_of_open_class(self):
+        """
+        Test that a class with free slots has no waitlist.
+        """
+        self.class_instance.slots_available = 1
+        self.class_instance.save()
+        self.assertEqual(
+            join_waitlist(self.users[1], self.class_instance.id), NOT_FULL)
+
+    def test_cancellation_promotes_first_waitlisted(self):
+        """
+        Test that cancelling a booking books the user who joined
+        the waitlist first into the freed slot, keeping the slot
+        counters consistent.
+        """
+        join_waitlist(self.users[1], self.class_instance.id)
+        join_waitlist(self.users[2], self.class_instance.id)
+
+        promoted = cancel_booking(Bookings.objects.get(user=self.users[0]))
+        self.assertEqual(promoted.user, self.users[1])
+        self.assertTrue(Bookings.objects.filter(user=self.users[1]).exists())
+        self.assertEqual(
+            list(Waitlist.objects.values_list("user", flat=True)),
+            [self.users[2].id])
+        self.class_instance.refresh_from_db()
+        self.assertEqual(self.class_instance.slots_available, 0)
+        self.assertEqual(self.class_instance.slots_filled, 1)
+
+    def test_cancellation_without_waitlist(self):
+        """
+        Test that cancelling a booking with nobody waiting just
+        frees the slot.
+        """
+        promoted = cancel_booking(Bookings.objects.get(user=self.users[0]))
+        self.assertIsNone(promoted)
+        self.class_instance.refresh_from_db()
+        self.assertEqual(self.class_instance.slots_available, 1)
+        self.assertEqual(self.class_instance.slots_filled, 0)
+
+    def test_promotion_skips_users_who_booked(self):
+        """
+        Test that a waitlisted user who has since booked the class
+        is skipped in favour of the next user.
+        """
+        join_waitlist(self.users[1], self.class_instance.id)
+        join_waitlist(self.users[2], self.class_instance.id)
+        Bookings.objects.create(
+            user=self.users[1], class_id=self.class_instance)
+
+        promoted = cancel_booking(Bookings.objects.get(user=self.users[0]))
+        self.assertEqual(promoted.user, self.users[2])
+
+
+class TestDelete(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating four users and two
+        upcoming classes with two slots, both booked by the first
+        user.
+        """
+        self.users = [
+            User.objects.create_user(username=f"testuser{i}")
+            for i in range(4)
+        ]
+        self.classes = [
+            Classes.objects.create(
+                class_name=f"Test Class {i}",
+                class_description="Test Description",
+                class_type=0,
+                class_date="2099-01-01",
+                class_start_time=f"{9 + i:02d}:00:00",
+                class_end_time=f"{9 + i:02d}:45:00",
+                slots_available=2,
+            )
+            for i in range(2)
+        ]
+        for class_instance in self.classes:
+            book_class(self.users[0], class_instance.id)
+
+    def count_queries(self, func, *args):
+        with CaptureQueriesContext(connection) as queries:
+            func(*args)
+        return len(queries)
+
+    def test_delete_class_query_count(self):
+        """
+        Test that deleting a class takes the same number of queries
+        however many bookings it has.
+        """
+        few = self.count_queries(delete_class, self.classes[0])
+        for user in self.users[1:]:
+            Bookings.objects.create(user=user, class_id=self.classes[1])
+        many = self.count_queries(delete_class, self.classes[1])
+        self.assertEqual(few, many)
+        self.assertFalse(Bookings.objects.exists())
+
+    def test_delete_member_releases_slots(self):
+        """
+        Test that deleting a member releases one slot in each
+        class they booked, with the same number of queries
+        however many bookings they have.
+        """
+        book_class(self.users[1], self.classes[0].id)
+        few = self.count_queries(delete_member, self.users[1])
+        many = self.count_queries(delete_member, self.users[0])
+        self.assertEqual(few, many)
+        for class_instance in self.classes:
+            class_instance.refresh_from_db()
+            self.assertEqual(class_instance.slots_available, 2)
+            self.assertEqual(class_instance.slots_filled, 0)
+        self.assertFalse(Bookings.objects.exists())
+
+    def test_delete_member_promotes_waitlist(self):
+        """
+        Test that a slot freed by deleting a member goes to the
+        first user on the class's waitlist.
+        """
+        book_class(self.users[1], self.classes[0].id)
+        join_waitlist(self.users[2], self.classes[0].id)
+        delete_member(self.users[0])
+        self.assertTrue(
+            Bookings.objects.filter(
+                user=self.users[2], class_id=self.classes[0]).exists())
+        self.assertFalse(Waitlist.objects.exists())
+        self.classes[0].refresh_from_db()
+        self.assertEqual(self.classes[0].slots_available, 0)
+        self.assertEqual(self.classes[0].slots_filled, 2)
+
+
+class TestClassPage(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating five classes,
+        two of them private, across two days.
+        """
+        for day, hour in [(1, 9), (1, 10), (1, 11), (2, 9), (2, 10)]:
+            Classes.objects.create(
+                class_name=f"Class {day}-{hour}",
+                class_description="Test Description",
+                class_type=1 if hour == 10 else 0,
+                class_date=f"2024-01-0{day}",
+                class_start_time=f"{hour:02d}:00:00",
+                class_end_time=f"{hour:02d}:45:00",
+                slots_available=10,
+            )
+
+    def test_pages_do_not_overlap(self):
+        """
+        Test that following the next page cursor lists every
+        class exactly once and in schedule order.
+        """
+        seen = []
+        query = "from=2024-01-01"
+        while query:
+            page = get_class_page(QueryDict(query), page_size=2)
+            self.assertLessEqual(len(page["classes"]), 2)
+            self.assertEqual(page["classes_count"], 5)
+            seen.extend(c.class_name for c in page["classes"])
+            query = page["next_query"]
+        self.assertEqual(seen, [
+            "Class 1-9", "Class 1-10", "Class 1-11",
+            "Class 2-9", "Class 2-10",
+        ])
+
+    def test_count_on_first_page_only(self):
+        """
+        Test that the classes are counted on the first page only,
+        and later pages reuse the total carried in their query
+        string.
+        """
+        with self.assertNumQueries(2):
+            page = get_class_page(
+                QueryDict("from=2024-01-01"), page_size=2)
+        self.assertIn("total=5", page["next_query"])
+        with self.assertNumQueries(1):
+            page = get_class_page(QueryDict(page["next_query"]), 2)
+        self.assertEqual(page["classes_count"], 5)
+
+        # A later page linked without a total counts again
+        after = QueryDict(page["next_query"]).copy()
+        del after["total"]
+        with self.assertNumQueries(2):
+            page = get_class_page(after, page_size=2)
+        self.assertEqual(page["classes_count"], 5)
+
+    def test_filters(self):
+        """
+        Test that the class type and date range filters are
+        applied and carried over to the next page.
+        """
+        page = get_class_page(
+            QueryDict("type=1&from=2024-01-01&to=2024-01-01"))
+        self.assertEqual(
+            [c.class_name for c in page["classes"]], ["Class 1-10"])
+        self.assertEqual(page["filters"], {
+            "type": "1", "from": "2024-01-01", "to": "2024-01-01"})
+
+    def test_upcoming_only_by_default(self):
+        """
+        Test that past classes are not listed by default.
+        """
+        page = get_class_page(QueryDict())
+        self.assertEqual(page["classes"], [])
+        self.assertIsNone(page["next_query"])
+
+
+class TestSeries(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment with an unsaved series running
+        on Mondays and Wednesdays through January 2024, except on
+        New Year's Day.
+        """
+        self.series = ClassSeries(
+            class_name="Weekly Class",
+            class_description="Test Description",
+            class_type=0,
+            class_start_time=time(18),
+            class_end_time=time(19),
+            slots_available=10,
+            weekdays=[0, 2],
+            starts_on=date(2024, 1, 1),
+            ends_on=date(2024, 1, 31),
+            exceptions=["2024-01-01"],
+        )
+
+    def test_expand_series(self):
+        """
+        Test that a series expands to one class per matching day,
+        skipping its exceptions.
+        """
+        occurrences = expand_series(self.series)
+        self.assertEqual(
+            [o.class_date.day for o in occurrences],
+            [3, 8, 10, 15, 17, 22, 24, 29, 31])
+        self.assertEqual(occurrences[0].class_name, "Weekly Class")
+
+    def test_create_classes_query_count(self):
+        """
+        Test that saving a series takes the same number of queries
+        however many classes it has.
+        """
+        short = self.series
+        short.ends_on = date(2024, 1, 7)
+        with CaptureQueriesContext(connection) as few:
+            created, conflicts = create_classes(
+                expand_series(short), series=short)
+        self.assertEqual(len(created), 1)
+
+        self.series.pk = None
+        self.series.starts_on = date(2024, 2, 1)
+        self.series.ends_on = date(2024, 4, 30)
+        with CaptureQueriesContext(connection) as many:
+            created, conflicts = create_classes(
+                expand_series(self.series), series=self.series)
+        self.assertEqual(len(created), 25)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(
+            Classes.objects.filter(series=self.series).count(), 25)
+
+    def test_conflicts_prevent_creation(self):
+        """
+        Test that a series overlapping an existing class is
+        reported and nothing is saved.
+        """
+        existing = Classes.objects.create(
+            class_name="Existing Class",
+            class_description="Test Description",
+            class_date="2024-01-17",
+            class_start_time="18:30:00",
+            class_end_time="19:30:00",
+            slots_available=10,
+        )
+        Classes.objects.create(
+            class_name="Back To Back Class",
+            class_description="Test Description",
+            class_date="2024-01-17",
+            class_start_time="19:00:00",
+            class_end_time="20:00:00",
+            slots_available=10,
+        )
+        created, conflicts = create_classes(
+            expand_series(self.series), series=self.series)
+        self.assertEqual(created, [])
+        self.assertEqual(
+            [(o.class_date, c) for o, c in conflicts],
+            [(date(2024, 1, 17), existing)])
+        self.assertIsNone(self.series.pk)
+        self.assertEqual(Classes.objects.count(), 2)
+
+    def test_copy_week(self):
+        """
+        Test that a week's classes are copied to the following
+        weeks, and that copying them again conflicts.
+        """
+        for day, hour in ((1, 9), (3, 9), (8, 11)):
+            Classes.objects.create(
+                class_name=f"Class {day}",
+                class_description="Test Description",
+                class_date=f"2024-01-0{day}",
+                class_start_time=f"{hour:02d}:00:00",
+                class_end_time=f"{hour:02d}:45:00",
+                slots_available=10,
+            )
+        created, conflicts = create_classes(copy_week(date(2024, 1, 1), 3))
+        self.assertEqual(
+            sorted((c.class_date.day, c.class_name) for c in created),
+            [(8, "Class 1"), (10, "Class 3"), (15, "Class 1"),
+             (17, "Class 3"), (22, "Class 1"), (24, "Class 3")])
+        self.assertEqual(conflicts, [])
+        self.assertEqual(
+            len(find_conflicts(copy_week(date(2024, 1, 1), 1))), 2)
+
+
+class TestImport(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment with the member group, an
+        existing user and an existing class with two slots.
+        """
+        Group.objects.create(name="member")
+        User.objects.create_user(username="existing", email="old@email.com")
+        self.class_instance = Classes.objects.create(
+            class_name="Test Class",
+            class_description="Test Description",
+            class_date="2024-01-01",
+            class_start_time="09:00:00",
+            class_end_time="10:00:00",
+            slots_available=2,
+        )
+
+    def import_rows(self, kind, header, rows, **kwargs):
+        csv_file = StringIO("\n".join([header] + rows) + "\n")
+        return import_csv(kind, csv_file, **kwargs)
+
+    def test_import_members(self):
+        """
+        Test that members are created in the member group without
+        hashing a password, and that invalid rows are reported.
+        """
+        result = self.import_rows(
+            "members", "username,email,first_name,phone_number", [
+                "ann,ann@email.com,Ann,0871234567",
+                "bob,bob@email.com,Bob,",
+                "ann,ann2@email.com,Ann,",
+                "carl,OLD@email.com,Carl,",
+                "dan,not-an-email,Dan,",
+            ])
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(
+            [line for line, message in result["errors"]], [4, 5, 6])
+        ann = User.objects.get(username="ann")
+        self.assertFalse(ann.has_usable_password())
+        self.assertTrue(ann.groups.filter(name="member").exists())
+        self.assertEqual(ann.members.phone_number, "0871234567")
+        self.assertFalse(Members.objects.filter(user__username="bob").exists())
+        self.assertEqual(
+            [user.username for user in result["users"]], ["ann", "bob"])
+
+    def test_import_query_count(self):
+        """
+        Test that a batch takes the same number of queries however
+        many rows it has.
+        """
+        header = "username,email"
+        # the member group is cached after its first lookup
+        self.import_rows("members", header, ["warm,warm@email.com"])
+        with CaptureQueriesContext(connection) as few:
+            self.import_rows("members", header, ["a0,a0@email.com"])
+        with CaptureQueriesContext(connection) as many:
+            self.import_rows("members", header, [
+                f"b{i},b{i}@email.com" for i in range(50)])
+        self.assertEqual(len(few), len(many))
+
+    def test_import_classes(self):
+        """
+        Test that classes are created, and that clashes with
+        existing classes are reported.
+        """
+        result = self.import_rows(
+            "classes",
+            "class_name,class_date,class_start_time,class_end_time,"
+            "slots_available,class_type", [
+                "Boxing,2024-01-02,09:00,10:00,12,Group",
+                "Sparring,2024-01-02,18:00,19:00,2,1",
+                "Clash,2024-01-01,09:00,10:00,5,0",
+                "Backwards,2024-01-03,10:00,09:00,5,0",
+            ])
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(
+            [line for line, message in result["errors"]], [4, 5])
+        sparring = Classes.objects.get(class_name="Sparring")
+        self.assertEqual(sparring.class_type, 1)
+        self.assertEqual(sparring.slots_available, 2)
+
+    def test_import_bookings_recounts_slots(self):
+        """
+        Test that historical bookings are created with their dates,
+        bookings beyond a class's capacity are rejected, and the
+        slot counters are recounted once at the end.
+        """
+        for name in ("ann", "bob", "carl"):
+            User.objects.create_user(username=name)
+        result = self.import_rows(
+            "bookings", "username,class_date,class_start_time,booked_at", [
+                "ann,2024-01-01,09:00,2023-12-20 10:30",
+                "bob,2024-01-01,09:00,",
+                "carl,2024-01-01,09:00,",
+                "nobody,2024-01-01,09:00,",
+            ], batch_size=2)
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(
+            [line for line, message in result["errors"]], [4, 5])
+        self.class_instance.refresh_from_db()
+        self.assertEqual(self.class_instance.slots_filled, 2)
+        self.assertEqual(self.class_instance.slots_available, 0)
+        booking = Bookings.objects.get(user__username="ann")
+        self.assertEqual(
+            booking.booking_date.date(), date(2023, 12, 20))
+
+    def test_dry_run(self):
+        """
+        Test that a dry run reports what would be imported without
+        saving anything.
+        """
+        result = self.import_rows(
+            "members", "username,email", ["ann,ann@email.com"],
+            dry_run=True)
+        self.assertEqual(result["created"], 1)
+        self.assertFalse(User.objects.filter(username="ann").exists())
+
+    def test_missing_column(self):
+        """
+        Test that a file without a required column is rejected.
+        """
+        with self.assertRaises(ValueError):
+            self.import_rows("members", "username", ["ann"])
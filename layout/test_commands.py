@@ -0,0 +1,461 @@
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from layout.benchmarks.datasets import generate_dataset
+from layout.booking_functions.booking import BOOKED
+from layout.benchmarks.replay import load_log
+from layout.models import Classes, Bookings
+from layout.management.commands.booking_storm import (
+    _percentile, Command as BookingStormCommand, ERROR)
+from layout.management.commands.replay_log import (
+    Command as ReplayLogCommand)
+
+
+class TestExplainQueries(TestCase):
+    def explain(self, *args):
+        out = StringIO()
+        call_command("explain_queries", *args, stdout=out)
+        return out.getvalue()
+
+    def test_list_queries(self):
+        """
+        Test that --list names every hot query.
+        """
+        output = self.explain("--list")
+        self.assertIn("available_classes:", output)
+        self.assertIn("login_email:", output)
+
+    def test_hot_queries_use_indexes(self):
+        """
+        Test that the hot queries are planned with their indexes,
+        so that a dropped or unused index shows up as a failure.
+        """
+        expected = {
+            "available_classes": "classes_open_date_idx",
+            "classes_by_type": "classes_type_date_idx",
+            "user_bookings": "bookings_user_date_idx",
+            "members_newest": "members_date_joined_idx",
+            "login_email": "auth_user_email_lower_uniq",
+            "waitlist_head": "waitlist_class_queue_idx",
+        }
+        for name, index in expected.items():
+            with self.subTest(name=name):
+                self.assertIn(index, self.explain(name))
+
+    def test_unknown_query(self):
+        """
+        Test that asking for an unknown query is an error.
+        """
+        with self.assertRaises(CommandError):
+            self.explain("no_such_query")
+
+
+class TestImportCsv(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating the member group.
+        """
+        Group.objects.create(name="member")
+
+    def import_file(self, content, *args):
+        with tempfile.NamedTemporaryFile(
+                "w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(content)
+        self.addCleanup(os.remove, csv_file.name)
+        out = StringIO()
+        err = StringIO()
+        call_command("import_csv", *args[:1], csv_file.name, *args[1:],
+                     stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_members_and_invite(self):
+        """
+        Test that imported members are emailed a link to set their
+        password, and that skipped rows are reported.
+        """
+        out, err = self.import_file(
+            "username,email\nann,ann@email.com\nbob,\n",
+            "members", "--invite-url", "https://example.com")
+        self.assertIn("Imported 1 members, skipped 1 row(s).", out)
+        self.assertIn("Line 3:", err)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["ann@email.com"])
+        self.assertIn("https://example.com/set_password/", mail.outbox[0].body)
+
+    def test_missing_file(self):
+        """
+        Test that a missing file is reported as a command error.
+        """
+        with self.assertRaises(CommandError):
+            call_command("import_csv", "members", "/no/such/file.csv")
+
+
+class TestReconcileSlots(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment with three classes of ten slots,
+        each booked by one user, and corrupt the counters of two.
+        """
+        user = User.objects.create_user(username="testuser1")
+        self.classes = []
+        for day in (1, 2, 3):
+            class_instance = Classes.objects.create(
+                class_name=f"Class {day}",
+                class_description="Test Description",
+                class_date=f"2024-01-0{day}",
+                class_start_time="09:00:00",
+                class_end_time="10:00:00",
+                slots_available=9,
+                slots_filled=1,
+            )
+            Bookings.objects.create(user=user, class_id=class_instance)
+            self.classes.append(class_instance)
+        # a crash after claiming a slot, and a booking made directly
+        Classes.objects.filter(id=self.classes[0].id).update(
+            slots_available=8, slots_filled=2)
+        Classes.objects.filter(id=self.classes[2].id).update(
+            slots_available=10, slots_filled=0)
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command("reconcile_slots", *args, stdout=out)
+        return out.getvalue()
+
+    def counters(self):
+        return list(Classes.objects.order_by("id").values_list(
+            "slots_filled", "slots_available"))
+
+    def test_reconcile_fixes_drift(self):
+        """
+        Test that drifted counters are reported and recounted from
+        the bookings, keeping each class's capacity.
+        """
+        output = self.reconcile("--chunk-size", "2")
+        self.assertIn(f"Class {self.classes[0].id}: slots_filled is 2", output)
+        self.assertIn(f"Class {self.classes[2].id}: slots_filled is 0", output)
+        self.assertIn("Fixed drift in 2 of 2 class(es).", output)
+        self.assertEqual(self.counters(), [(1, 9)] * 3)
+        self.assertIn("No drift found.", self.reconcile())
+
+    def test_dry_run(self):
+        """
+        Test that a dry run reports drift without fixing it.
+        """
+        output = self.reconcile("--dry-run")
+        self.assertIn("Found drift in 2 class(es).", output)
+        self.assertEqual(self.counters(), [(2, 8), (1, 9), (0, 10)])
+
+    def test_from_date(self):
+        """
+        Test that only classes from the given date are checked.
+        """
+        output = self.reconcile("--from", "2024-01-02")
+        self.assertIn("Fixed drift in 1 of 1 class(es).", output)
+        self.assertEqual(self.counters(), [(2, 8), (1, 9), (1, 9)])
+
+    def test_one_query_per_chunk(self):
+        """
+        Test that checking classes without drift takes one query per
+        chunk, plus one to find the range of classes.
+        """
+        self.reconcile()
+        with self.assertNumQueries(3):
+            self.reconcile("--chunk-size", "2")
+
+    def test_invalid_chunk_size(self):
+        """
+        Test that a chunk size below one is rejected rather than
+        checking no classes.
+        """
+        for chunk_size in ("0", "-1"):
+            with self.assertRaisesMessage(
+                    CommandError, "--chunk-size must be at least 1"):
+                self.reconcile("--chunk-size", chunk_size)
+
+
+class TestSlowQueryReport(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment with a rotated slow query log of
+        two query shapes.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "slow_queries.jsonl")
+        records = [
+            ("classes", "aaaa", "SELECT classes", 150, "SCAN layout_classes"),
+            ("profile", "bbbb", "SELECT bookings", 400, None),
+            ("classes", "aaaa", "SELECT classes", 300, None),
+            ("user_bookings", "bbbb", "SELECT bookings", 200, None),
+        ]
+        for name, lines in ((f"{self.path}.1", records[:2]),
+                            (self.path, records[2:])):
+            with open(name, "w") as log:
+                for view, fingerprint, sql, ms, plan in lines:
+                    log.write(json.dumps({
+                        "time": "2024-01-01T09:00:00+00:00",
+                        "view": view,
+                        "fingerprint": fingerprint,
+                        "sql": sql,
+                        "duration_ms": ms,
+                        "plan": plan,
+                    }) + "\n")
+
+    def report(self, *args):
+        out = StringIO()
+        call_command(
+            "slow_query_report", "--file", self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_report_ranks_by_total_time(self):
+        """
+        Test that query shapes are ranked by their total time across
+        the log and its backups, with their views and latest plan.
+        """
+        output = self.report()
+        self.assertIn("4 slow queries of 2 shapes", output)
+        self.assertLess(output.index("#1 bbbb"), output.index("#2 aaaa"))
+        self.assertIn(
+            "#1 bbbb: 600.0 ms total, 2 runs, 300.0 ms mean, 400.0 ms max",
+            output)
+        self.assertIn("Views: profile, user_bookings", output)
+        self.assertIn("SCAN layout_classes", output)
+
+    def test_report_options(self):
+        """
+        Test that the report can be limited to the top shapes and
+        left without plans.
+        """
+        output = self.report("--top", "1", "--no-plans")
+        self.assertIn("#1 bbbb", output)
+        self.assertNotIn("aaaa", output)
+        self.assertNotIn("SCAN", self.report("--no-plans"))
+        with self.assertRaises(CommandError):
+            self.report("--top", "0")
+
+    def test_empty_log(self):
+        """
+        Test that a missing log is reported as having no slow
+        queries.
+        """
+        out = StringIO()
+        call_command(
+            "slow_query_report", "--file", self.path + ".missing",
+            stdout=out)
+        self.assertIn("No slow queries logged.", out.getvalue())
+
+
+class TestBookingStorm(TransactionTestCase):
+    def storm(self, *args):
+        out = StringIO()
+        call_command("booking_storm", *args, stdout=out)
+        return out.getvalue()
+
+    def test_storm_fills_the_class_exactly(self):
+        """
+        Test that a crowd of members booking at once fills the class
+        without overselling it, that double submits are turned away,
+        and that the seeded data is removed afterwards.
+        """
+        output = self.storm(
+            "--members", "12", "--slots", "5", "--concurrency", "4",
+            "--attempts", "2")
+        self.assertIn("Requests: 24 in", output)
+        self.assertRegex(
+            output, r"Latency: p50 [\d.]+ ms, p95 [\d.]+ ms, "
+                    r"p99 [\d.]+ ms, max [\d.]+ ms")
+        booked, full, already, failed = map(int, re.search(
+            r"Outcomes: (\d+) booked, (\d+) full, (\d+) already booked, "
+            r"(\d+) failed", output).groups())
+        self.assertEqual(booked + full + already + failed, 24)
+        self.assertLessEqual(booked, 5)
+        self.assertIn("No oversell", output)
+        self.assertFalse(Classes.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_storm_keeps_seeded_data(self):
+        """
+        Test that the seeded class and members can be kept, with
+        every booking counted.
+        """
+        self.storm("--members", "3", "--slots", "5", "--concurrency", "1",
+                   "--keep")
+        class_instance = Classes.objects.get()
+        self.assertEqual(class_instance.slots_filled, 3)
+        self.assertEqual(class_instance.slots_available, 2)
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_storm_avoids_taken_slot(self):
+        """
+        Test that the seeded class is moved to a later day when an
+        existing class already takes its slot tomorrow.
+        """
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        Classes.objects.create(
+            class_name="Early Class",
+            class_description="Test Description",
+            class_date=tomorrow,
+            class_start_time="06:00:00",
+            class_end_time="07:00:00",
+            slots_available=5,
+        )
+        self.storm("--members", "2", "--slots", "5", "--concurrency", "1",
+                   "--keep")
+        seeded = Classes.objects.exclude(class_name="Early Class").get()
+        self.assertEqual(seeded.class_date, tomorrow + timedelta(days=1))
+        self.assertEqual(seeded.slots_filled, 2)
+
+    def test_storm_counts_raising_requests_as_failed(self):
+        """
+        Test that a booking request that raises is counted as failed
+        rather than stopping its thread, so the other members still
+        book.
+        """
+        class BrokenMember:
+            def book(self):
+                raise KeyError("csrftoken")
+
+        class WorkingMember:
+            def book(self):
+                return BOOKED
+
+        members = [BrokenMember(), WorkingMember(), WorkingMember()]
+        results, elapsed, monitor = BookingStormCommand().storm(
+            0, members, 1, 2)
+        self.assertEqual(
+            sorted(outcome for outcome, seconds in results),
+            [BOOKED] * 4 + [ERROR] * 2)
+
+    def test_percentile(self):
+        """
+        Test the nearest-rank percentiles of the latency report.
+        """
+        values = list(range(1, 101))
+        self.assertEqual(_percentile(values, 50), 50)
+        self.assertEqual(_percentile(values, 99), 99)
+        self.assertEqual(_percentile([7], 95), 7)
+
+
+class TestGenerateData(TestCase):
+    def test_generate_data(self):
+        """
+        Test that the requested data is generated and reported, and
+        that a database with generated data is refused.
+        """
+        out = StringIO()
+        call_command(
+            "generate_data", "--members", "20", "--classes", "30",
+            "--bookings", "200", "--workers", "2", stdout=out)
+        self.assertIn("single process", out.getvalue())
+        self.assertIn(
+            "Generated 20 members, 30 classes and 200 bookings",
+            out.getvalue())
+        self.assertEqual(Bookings.objects.count(), 200)
+        with self.assertRaisesMessage(CommandError, "already has"):
+            call_command("generate_data", "--members", "1", stdout=out)
+
+    def test_invalid_options(self):
+        """
+        Test that impossible sizes and distributions are refused.
+        """
+        for args, message in (
+            (["--classes", "0"], "--classes must be at least 1"),
+            (["--private-share", "2"], "--private-share must be between"),
+            (["--activity", "-1"], "can't be negative"),
+            (["--classes", "1", "--bookings", "100"], "don't fit"),
+        ):
+            with self.assertRaisesMessage(CommandError, message):
+                call_command("generate_data", *args, stdout=StringIO())
+
+
+class TestReplayLog(TransactionTestCase):
+    def setUp(self):
+        generate_dataset(10, 5, 20)
+        # u2 is replayed as the second member, gen-1
+        class_id = Classes.objects.filter(slots_available__gt=0).exclude(
+            bookings__user__username="gen-1").values_list(
+            "id", flat=True).first()
+        lines = [
+            {"method": "GET", "path": "/classes/", "role": "member",
+             "user": "u1", "timestamp": "2026-10-12T07:00:00Z"},
+            {"method": "POST", "path": f"/book_class/{class_id}/",
+             "role": "member", "user": "u2",
+             "timestamp": "2026-10-12T07:00:00.200Z"},
+            {"method": "GET", "path": "/admin_dashboard/", "role": "admin",
+             "timestamp": "2026-10-12T07:00:00.300Z"},
+            {"method": "GET", "path": "/get_classes/", "role": "anonymous",
+             "timestamp": "2026-10-12T07:00:00.400Z"},
+            {"method": "GET", "path": "/book_class/0/", "role": "member",
+             "user": "u1", "timestamp": "2026-10-12T07:00:00.500Z"},
+        ]
+        self.log = tempfile.NamedTemporaryFile(
+            "w", suffix=".jsonl", delete=False)
+        self.addCleanup(os.remove, self.log.name)
+        for line in lines:
+            self.log.write(json.dumps(line) + "\n")
+        self.log.close()
+
+    def test_replay_log(self):
+        """
+        Test that the logged requests are made as seeded accounts,
+        on the recorded schedule, and reported by endpoint.
+        """
+        bookings = Bookings.objects.count()
+        out = StringIO()
+        call_command("replay_log", self.log.name, "--concurrency", "2",
+                     stdout=out)
+        output = out.getvalue()
+        self.assertIn("Replayed 5 of 5 requests recorded over 0.5s in", output)
+        self.assertIn("3 logged in users as 3 accounts", output)
+        self.assertRegex(output, r"GET classes +1 +0 +0 +[\d.]+")
+        self.assertRegex(output, r"POST book_class +1 +0 +0 ")
+        self.assertRegex(output, r"GET book_class +1 +0 +1 ")
+        self.assertIn("GET admin_dashboard", output)
+        self.assertIn("No server errors.", output)
+        self.assertEqual(Bookings.objects.count(), bookings + 1)
+
+    def test_replay_options(self):
+        """
+        Test that the log can be limited and replayed as fast as
+        possible, and that bad input is refused.
+        """
+        out = StringIO()
+        call_command("replay_log", self.log.name, "--limit", "2",
+                     "--speed", "0", stdout=out)
+        self.assertIn("Replayed 2 of 2 requests", out.getvalue())
+        with self.assertRaisesMessage(CommandError, "Could not read"):
+            call_command("replay_log", self.log.name + ".missing")
+        with self.assertRaisesMessage(CommandError, "--speed"):
+            call_command("replay_log", self.log.name, "--speed", "-1")
+
+    def test_report_missing_results(self):
+        """
+        Test that requests without a result are reported as failed,
+        even when none were replayed.
+        """
+        with open(self.log.name) as log:
+            entries = load_log(log)
+        result = {"endpoint": "GET classes", "status": 200,
+                  "seconds": 0.01, "lag": 0}
+        for results, expected in (
+            ([result], "FAIL: 4 requests were not replayed."),
+            ([], "FAIL: none of the 5 requests were replayed."),
+        ):
+            out = StringIO()
+            ReplayLogCommand(stdout=out).report(
+                entries, {}, results, 0, {}, "")
+            self.assertIn(
+                f"Replayed {len(results)} of 5 requests", out.getvalue())
+            self.assertIn(expected, out.getvalue())
+            self.assertNotIn("No server errors.", out.getvalue())
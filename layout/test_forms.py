@@ -144,16 +144,17 @@ class TestUserCreationForm(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn('username', form.errors)
 
-    def test_form_valid_duplicate_email(self):
+    def test_form_invalid_duplicate_email(self):
         """
         This test to ensures the CREATEUSERFORM
-        is valid if a duplicate EMAIL field is
-        inputted.
+        is invalid if a duplicate EMAIL field is
+        inputted, even with different capitalisation.
 
-        This test creates a form data dictionary
-        without the EMAIL field and
+        This test creates a user and a form data
+        dictionary with the same EMAIL in upper case and
         initializes the CREATEUSERFORM with this
-        data. It then checks two things:
+        data. It then checks that the form is invalid
+        and that the error is on the EMAIL field.
         """
 
         User.objects.create_user(
@@ -168,12 +169,13 @@ class TestUserCreationForm(TestCase):
                 'first_name': 'New',
                 'last_name': 'User',
                 'username': 'newuser2',
-                'email': 'example@email.com',
+                'email': 'EXAMPLE@email.com',
                 'password1': 'complexpassword123**',
                 'password2': 'complexpassword123**',
         }
         form = CreateUserForm(data=form_data)
-        self.assertTrue(form.is_valid())
+        self.assertFalse(form.is_valid())
+        self.assertIn('email', form.errors)
 
     def test_form_different_passwords(self):
         """
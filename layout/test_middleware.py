@@ -0,0 +1,250 @@
+import os
+import pstats
+import sys
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import Group, User
+
+from .models import Classes
+from .profiling import StackSampler
+from .slow_queries import explain, normalize_sql
+
+
+class TestRequestTimingMiddleware(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating the admin and
+        member groups and a user in each.
+        """
+        for name in ("admin", "member"):
+            user = User.objects.create_user(
+                username=f"test{name}",
+                email=f"test{name}@email.com",
+                password="testpassword332",
+            )
+            user.groups.add(Group.objects.create(name=name))
+
+    def login(self, name):
+        self.client.post(
+            "/login/",
+            {"email": f"test{name}@email.com", "password": "testpassword332"},
+        )
+
+    def test_server_timing_for_admins(self):
+        """
+        Test that admins get a Server-Timing header with the
+        request's total, database and template times.
+        """
+        self.login("admin")
+        response = self.client.get("/admin_dashboard/")
+        header = response["Server-Timing"]
+        self.assertRegex(header, r"^total;dur=[\d.]+, ")
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(header, r"tpl;dur=[\d.]+$")
+
+    def test_no_server_timing_for_members(self):
+        """
+        Test that the timings are not exposed to members.
+        """
+        self.login("member")
+        response = self.client.get("/profile/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+
+    def test_request_is_logged(self):
+        """
+        Test that every request is logged as one key=value line.
+        """
+        self.login("member")
+        with self.assertLogs("layout.timing", "INFO") as logs:
+            self.client.get("/profile/")
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].levelname, "INFO")
+        self.assertRegex(
+            logs.output[0],
+            r"method=GET path=/profile/ status=200 total_ms=[\d.]+ "
+            r"db_ms=[\d.]+ queries=\d+ duplicate_queries=\d+ "
+            r"template_ms=[\d.]+ flags=-$")
+        self.assertGreater(logs.records[0].timing["template_ms"], 0)
+
+    @override_settings(
+        REQUEST_TIMING_MAX_QUERIES=1, REQUEST_TIMING_MAX_DUPLICATE_QUERIES=0)
+    def test_heavy_request_is_flagged(self):
+        """
+        Test that requests over the query thresholds are logged as
+        warnings naming the thresholds they broke.
+        """
+        self.login("member")
+        with self.assertLogs("layout.timing", "INFO") as logs:
+            self.client.get("/profile/")
+        self.assertEqual(logs.records[0].levelname, "WARNING")
+        self.assertIn("flags=queries,duplicates", logs.output[0])
+
+
+class TestRequestProfilingMiddleware(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating an admin and a
+        member, and storing profiles in a temporary directory.
+        """
+        cache.clear()
+        for name in ("admin", "member"):
+            user = User.objects.create_user(
+                username=f"test{name}",
+                email=f"test{name}@email.com",
+                password="testpassword332",
+            )
+            user.groups.add(Group.objects.create(name=name))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(REQUEST_PROFILING_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def login(self, name):
+        self.client.post(
+            "/login/",
+            {"email": f"test{name}@email.com", "password": "testpassword332"},
+        )
+
+    def test_admin_can_profile_a_request(self):
+        """
+        Test that an admin's request is profiled when it asks to be,
+        and stored as a .prof file and as collapsed stacks.
+        """
+        self.login("admin")
+        response = self.client.get("/profile/?profile=1")
+        self.assertEqual(response.status_code, 200)
+        name = response["X-Profile"]
+        self.assertRegex(name, r"^\d{8}-\d{6}-\d{6}-\d+-profile-\d+ms$")
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [f"{name}.collapsed", f"{name}.prof"])
+
+        stats = pstats.Stats(os.path.join(self.directory, f"{name}.prof"))
+        self.assertTrue(any(
+            func[2] == "profile_view" for func in stats.stats))
+        with open(os.path.join(self.directory, f"{name}.collapsed")) as f:
+            for line in f.read().splitlines():
+                self.assertRegex(line, r"^\S.* \d+$")
+
+    def test_stack_sampler(self):
+        """
+        Test that the sampler records the stacks below its root
+        frame, in microseconds.
+        """
+        def slow_function():
+            time.sleep(0.05)
+
+        sampler = StackSampler(sys._getframe())
+        sampler.start()
+        slow_function()
+        sampler.stop()
+        [line] = sampler.collapsed()
+        stack, microseconds = line.rsplit(" ", 1)
+        self.assertRegex(stack, r"^slow_function \(test_middleware.py:\d+\)$")
+        self.assertGreater(int(microseconds), 20000)
+
+    def test_profiling_is_rate_limited(self):
+        """
+        Test that only one request is profiled per interval, and
+        that only the most recent profiles are kept.
+        """
+        self.login("admin")
+        self.client.get("/profile/", HTTP_X_PROFILE="1")
+        response = self.client.get("/profile/", HTTP_X_PROFILE="1")
+        self.assertEqual(response["X-Profile"], "rate-limited")
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        cache.clear()
+        with override_settings(REQUEST_PROFILING_KEEP=1):
+            response = self.client.get("/classes/?profile=1")
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [f"{response['X-Profile']}.collapsed",
+             f"{response['X-Profile']}.prof"])
+
+    def test_members_cannot_profile(self):
+        """
+        Test that requests from members are never profiled, and
+        that requests which don't ask to be aren't either.
+        """
+        self.login("member")
+        response = self.client.get("/profile/?profile=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile", response)
+        self.client.logout()
+        self.login("admin")
+        response = self.client.get("/profile/")
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class TestSlowQueryLog(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by logging in a member.
+        """
+        cache.clear()
+        user = User.objects.create_user(
+            username="testmember", password="testpassword332")
+        user.groups.add(Group.objects.create(name="member"))
+        self.client.login(username="testmember", password="testpassword332")
+
+    def test_normalize_sql(self):
+        """
+        Test that queries that differ only in their values have the
+        same shape.
+        """
+        self.assertEqual(
+            normalize_sql(
+                'SELECT "id" FROM "t" WHERE ("id" IN (%s, %s,%s)\n'
+                "  AND \"n\" = 12 AND \"s\" = 'it''s') LIMIT 21"),
+            'SELECT "id" FROM "t" WHERE ("id" IN (...) '
+            'AND "n" = ? AND "s" = ?) LIMIT ?')
+
+    @override_settings(SLOW_QUERY_MS=0.001)
+    def test_slow_queries_are_logged(self):
+        """
+        Test that queries over the threshold are logged with their
+        view, shape and duration, and that each shape is explained
+        only once per interval.
+        """
+        with self.assertLogs("layout.slow_queries", "WARNING") as logs:
+            self.client.get("/classes/")
+            self.client.get("/classes/")
+        records = [record.slow_query for record in logs.records]
+        self.assertTrue(records)
+        for record in records:
+            self.assertRegex(record["fingerprint"], r"^[0-9a-f]{16}$")
+            self.assertNotIn("%s", record["sql"])
+            self.assertGreater(record["duration_ms"], 0)
+        classes = [r for r in records if "layout_classes" in r["sql"]]
+        self.assertEqual({r["view"] for r in classes}, {"classes"})
+        first, second = [
+            r for r in classes if r["fingerprint"] == classes[0]["fingerprint"]
+        ][:2]
+        self.assertTrue(first["plan"])
+        self.assertIsNone(second["plan"])
+
+    def test_fast_queries_are_not_logged(self):
+        """
+        Test that nothing is logged for queries under the threshold.
+        """
+        with self.assertNoLogs("layout.slow_queries"):
+            self.client.get("/classes/")
+
+    def test_failed_explain_keeps_the_transaction(self):
+        """
+        Test that a statement that can't be explained has no plan,
+        and doesn't break the transaction it ran in.
+        """
+        with transaction.atomic():
+            self.assertIsNone(
+                explain(connection, "SELECT * FROM missing_table", []))
+            self.assertEqual(Classes.objects.count(), 0)
@@ -0,0 +1,90 @@
+from django.test import TestCase
+from django.contrib.auth.models import Group, User
+from .models import RoleVersion
+from .roles import get_group
+
+
+class TestRoles(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating the admin and
+        member groups and logging in a member.
+        """
+        self.admin_group = Group.objects.create(name="admin")
+        self.member_group = Group.objects.create(name="member")
+
+        self.user = User.objects.create_user(
+            username="testuser1",
+            email="testuseremail@email.com",
+            password="testpassword332",
+        )
+        self.user.groups.add(self.member_group)
+        self.client.post(
+            "/login/",
+            {
+                "email": "testuseremail@email.com",
+                "password": "testpassword332",
+            },
+        )
+
+    def test_roles_cached_in_session(self):
+        """
+        Test that once a user's roles are resolved, later requests
+        don't query the user's groups.
+        """
+        self.client.get("/profile/")
+        with self.assertNumQueries(3):
+            # session, user, bookings count
+            response = self.client.get("/profile/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_change_invalidates_roles(self):
+        """
+        Test that removing a user from a group takes effect on
+        their next request, even though their roles are cached.
+        """
+        response = self.client.get("/profile/")
+        self.assertEqual(response.status_code, 200)
+        self.user.groups.remove(self.member_group)
+        response = self.client.get("/profile/")
+        self.assertRedirects(response, "/")
+
+        self.member_group.user_set.add(self.user)
+        response = self.client.get("/profile/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_change_from_another_process(self):
+        """
+        Test that a role change made by another worker process,
+        which can't reach this process's cache, is seen on the
+        user's next request.
+        """
+        response = self.client.get("/profile/")
+        self.assertEqual(response.status_code, 200)
+        # what another process does when it revokes a role, with
+        # the signal handlers of this process left out
+        User.groups.through.objects.filter(user=self.user).delete()
+        RoleVersion.objects.filter(user=self.user).update(version=99)
+        response = self.client.get("/profile/")
+        self.assertRedirects(response, "/")
+
+    def test_any_allowed_role_is_accepted(self):
+        """
+        Test that a user in several groups is allowed in when any
+        of their groups is allowed.
+        """
+        self.user.groups.add(self.admin_group)
+        response = self.client.get("/admin_dashboard/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_group_is_cached(self):
+        """
+        Test that groups are only fetched once per process, and
+        that the cache is refreshed when groups change.
+        """
+        self.assertEqual(get_group("member"), self.member_group)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group("member"), self.member_group)
+        self.member_group.delete()
+        with self.assertRaises(Group.DoesNotExist):
+            get_group("member")
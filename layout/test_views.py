@@ -1,8 +1,22 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+from datetime import date, timedelta
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from .models import *
+from .backends import users_with_email
+from .views import DASHBOARD_CLASSES, DASHBOARD_MEMBERS
 from django.urls import reverse
 from django.contrib.auth.models import Group
 from django.contrib.auth.models import User
+from prometheus_client import REGISTRY
 
 
 class TestRegisterLoginViews(TestCase):
@@ -146,6 +160,42 @@ class TestRegisterLoginViews(TestCase):
 
         self.assertRedirects(response, "/")
 
+    def test_can_login_user_email_any_case(self):
+        """
+        Test that a user can login with their email address
+        in a different case to the one they registered with.
+        """
+        response = self.client.post(
+            "/login/",
+            {
+                "email": "TestUserEmail@Email.com",
+                "password": "testpassword332",
+            },
+        )
+        self.assertRedirects(response, "/")
+
+    def test_can_not_login_with_wrong_password(self):
+        """
+        Test that a user can't login with the wrong password.
+        """
+        response = self.client.post(
+            "/login/",
+            {
+                "email": "testuseremail@email.com",
+                "password": "wrongpassword",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_email_lookup_uses_index(self):
+        """
+        Test that the login email lookup is served by the
+        case-insensitive unique index on auth_user.
+        """
+        plan = users_with_email("testuseremail@email.com").explain()
+        self.assertIn("auth_user_email_lower_uniq", plan)
+
 
 class TestMemberViews(TestCase):
     def setUp(self):
@@ -321,6 +371,10 @@ class TestMemberViews(TestCase):
 
 
 class TestAdminViews(TestCase):
+    # session, user, class stats, user count, members page,
+    # classes page
+    ADMIN_DASHBOARD_QUERY_BUDGET = 6
+
     def setUp(self):
         """
         Set up the test environment by creating two users and two groups.
@@ -508,6 +562,79 @@ class TestAdminViews(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "layout/admin_dashboard.html")
 
+    def test_admin_dashboard_query_budget(self):
+        """
+        Test that the admin dashboard makes a constant number of
+        queries however many users and classes exist.
+
+        This test method adds a batch of members and classes and
+        then asserts that rendering the admin dashboard stays
+        within its query budget.
+        """
+        for i in range(20):
+            User.objects.create(username=f"budgetuser{i}")
+            Classes.objects.create(
+                class_name=f"Budget Class {i}",
+                class_description="Test Description",
+                class_type=i % 2,
+                class_date="2024-02-01",
+                class_start_time=f"{i:02d}:00:00",
+                class_end_time=f"{i:02d}:30:00",
+                slots_available=10,
+            )
+
+        # The first request caches the user's roles in the session
+        self.client.get("/admin_dashboard/")
+        with self.assertNumQueries(self.ADMIN_DASHBOARD_QUERY_BUDGET):
+            response = self.client.get("/admin_dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user_count"], 22)
+        self.assertEqual(response.context["classes_count"], 20)
+        self.assertEqual(response.context["pt_classes_count"], 10)
+        self.assertEqual(response.context["group_classes_count"], 10)
+
+    def test_admin_dashboard_tables_are_bounded(self):
+        """
+        Test that the admin dashboard lists a bounded page of members
+        and upcoming classes, and links to the full lists.
+
+        This test method adds more members and upcoming classes than
+        the dashboard shows and then asserts that only the first
+        page of each is rendered, with links to the members page and
+        to the next page of classes.
+        """
+        User.objects.bulk_create(
+            User(username=f"pageuser{i}")
+            for i in range(DASHBOARD_MEMBERS))
+        Classes.objects.bulk_create(
+            Classes(
+                class_name=f"Page Class {i}",
+                class_description="Test Description",
+                class_type=0,
+                class_date=date.today() + timedelta(days=i + 1),
+                class_start_time="10:00:00",
+                class_end_time="10:30:00",
+                slots_available=10,
+            )
+            for i in range(DASHBOARD_CLASSES + 1)
+        )
+
+        response = self.client.get("/admin_dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.context["users"]), DASHBOARD_MEMBERS)
+        self.assertEqual(
+            response.context["user_count"], DASHBOARD_MEMBERS + 2)
+        self.assertEqual(
+            len(response.context["classes"]), DASHBOARD_CLASSES)
+        self.assertEqual(
+            response.context["classes_count"], DASHBOARD_CLASSES + 1)
+        self.assertContains(response, f'href="{reverse("members")}"')
+        self.assertContains(
+            response,
+            f'href="{reverse("classes")}?'
+            f'{response.context["next_query"]}"'.replace("&", "&amp;"))
+
 
 class TestClassViews(TestCase):
     def setUp(self):
@@ -618,6 +745,80 @@ class TestClassViews(TestCase):
         existing_items = Classes.objects.filter(class_name="Test Class")
         self.assertEqual(existing_items.count(), 1)
 
+    def test_can_create_series(self):
+        """
+        Test that an admin user can create a weekly class series,
+        and that a series clashing with an existing class is
+        rejected with the clash shown on the form.
+        """
+        data = {
+            "class_name": "Weekly Class",
+            "class_description": "Test Description",
+            "class_type": 0,
+            "class_start_time": "09:30",
+            "class_end_time": "10:30",
+            "slots_available": 10,
+            "weekdays": [0, 4],
+            "starts_on": "2024-01-01",
+            "ends_on": "2024-01-14",
+            "exceptions": "2024-01-05",
+        }
+        response = self.client.post("/create_series/", data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "classes/create_series.html")
+        self.assertContains(response, "clashes with Test Class")
+        self.assertFalse(ClassSeries.objects.exists())
+
+        data["starts_on"] = "2024-01-02"
+        response = self.client.post("/create_series/", data)
+        self.assertRedirects(response, "/admin_dashboard/")
+        series = ClassSeries.objects.get()
+        self.assertEqual(series.exceptions, ["2024-01-05"])
+        self.assertEqual(
+            list(series.classes_set.values_list("class_date", flat=True)
+                 .order_by("class_date")),
+            [date(2024, 1, 8), date(2024, 1, 12)])
+
+    def test_series_with_negative_slots(self):
+        """
+        Test that a series with a negative number of slots is
+        rejected with an error on the form, and no series or
+        classes are created.
+        """
+        response = self.client.post("/create_series/", {
+            "class_name": "Weekly Class",
+            "class_description": "Test Description",
+            "class_type": 0,
+            "class_start_time": "09:30",
+            "class_end_time": "10:30",
+            "slots_available": -3,
+            "weekdays": [0],
+            "starts_on": "2024-01-01",
+            "ends_on": "2024-01-14",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "classseries_slots_available_gte_0",
+            str(response.context["form"].errors))
+        self.assertFalse(ClassSeries.objects.exists())
+        self.assertFalse(
+            Classes.objects.filter(class_name="Weekly Class").exists())
+
+    def test_can_copy_week(self):
+        """
+        Test that an admin user can copy a week of classes to the
+        following weeks.
+        """
+        response = self.client.get("/copy_week/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "classes/copy_week.html")
+
+        response = self.client.post(
+            "/copy_week/", {"week_start": "2024-01-03", "weeks": 4})
+        self.assertRedirects(response, "/admin_dashboard/")
+        self.assertEqual(
+            Classes.objects.filter(class_name="Test Class").count(), 5)
+
     def test_update_class_view(self):
         """
         Test the update class view to ensure it returns a successful
@@ -736,6 +937,124 @@ class TestClassViews(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "classes/classes.html")
 
+    def test_classes_view_upcoming_only(self):
+        """
+        Test that the classes view only lists upcoming classes
+        unless an earlier start date is requested.
+        """
+        upcoming = Classes.objects.create(
+            class_name="Upcoming Class",
+            class_description="Test Description",
+            class_type=1,
+            class_date=timezone.localdate() + timedelta(days=1),
+            class_start_time="09:00:00",
+            class_end_time="10:00:00",
+            slots_available=10,
+        )
+        response = self.client.get("/classes/")
+        self.assertEqual(list(response.context["classes"]), [upcoming])
+        self.assertEqual(response.context["classes_count"], 1)
+
+        response = self.client.get(
+            "/classes/", {"from": "2024-01-01", "type": "0"})
+        self.assertEqual(
+            list(response.context["classes"]), [self.class_instance])
+
+    def test_get_classes_in_range(self):
+        """
+        Test that the calendar feed only returns classes inside
+        the requested range.
+
+        This test method creates a second class a week later and
+        sends a GET request to the calendar feed URL
+        ('/get_classes/') with the `start` and `end` parameters
+        FullCalendar sends for the first week, then asserts that
+        only the class in that week is returned.
+        """
+        Classes.objects.create(
+            class_name="Next Week Class",
+            class_description="Test Description",
+            class_type=0,
+            class_date="2024-01-08",
+            class_start_time="09:00:00",
+            class_end_time="10:00:00",
+            slots_available=10,
+        )
+        response = self.client.get(
+            "/get_classes/",
+            {"start": "2024-01-01T00:00:00Z", "end": "2024-01-08T00:00:00Z"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "id": self.class_instance.id,
+                    "title": "Test Class",
+                    "start": "2024-01-01 09:00:00",
+                    "end": "2024-01-01 10:00:00",
+                }
+            ],
+        )
+
+    def test_get_classes_with_capacity(self):
+        """
+        Test that the calendar feed includes the slots left in
+        each class when `capacity` is requested.
+        """
+        response = self.client.get("/get_classes/", {"capacity": "1"})
+        self.assertEqual(
+            response.json()[0]["extendedProps"], {"slots_available": 10})
+
+    def test_get_classes_invalid_range(self):
+        """
+        Test that the calendar feed rejects a range it can't parse.
+        """
+        response = self.client.get("/get_classes/", {"start": "soon"})
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_get_classes_not_modified(self):
+        """
+        Test that the calendar feed answers a matching
+        If-None-Match with a 304 using a single query, and
+        serves the feed again once a class changes or is deleted.
+        """
+        params = {"start": "2024-01-01", "end": "2024-01-08"}
+        Classes.objects.create(
+            class_name="Early Class",
+            class_description="Test Description",
+            class_type=0,
+            class_date="2024-01-01",
+            class_start_time="07:00:00",
+            class_end_time="08:00:00",
+            slots_available=10,
+        )
+        response = self.client.get("/get_classes/", params)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"'))
+        # deletions would move a Last-Modified time backwards
+        self.assertNotIn("Last-Modified", response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/get_classes/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.class_instance.class_name = "Renamed Class"
+        self.class_instance.save()
+        response = self.client.get(
+            "/get_classes/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        etag = response["ETag"]
+
+        Classes.objects.filter(class_name="Early Class").delete()
+        response = self.client.get(
+            "/get_classes/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
 
 class TestBookingViews(TestCase):
     def setUp(self):
@@ -831,6 +1150,49 @@ class TestBookingViews(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "classes/user_bookings.html")
 
+    def test_bookings_view_upcoming_and_past(self):
+        """
+        Test that the bookings view splits a user's bookings into
+        upcoming and past classes, and that the number of queries
+        doesn't grow with the number of bookings.
+
+        This test method books the user onto two past classes and
+        one upcoming class, then asserts that each tab lists the
+        right bookings and that a longer booking history renders
+        with the same number of queries.
+        """
+        upcoming = Classes.objects.create(
+            class_name="Upcoming Class",
+            class_description="Test Description",
+            class_type=0,
+            class_date=timezone.localdate() + timedelta(days=1),
+            class_start_time="09:00:00",
+            class_end_time="10:00:00",
+            slots_available=10,
+        )
+        Bookings.objects.create(user=self.user, class_id=self.class_instance)
+        Bookings.objects.create(user=self.user, class_id=upcoming)
+
+        response = self.client.get("/user_bookings/")
+        self.assertEqual(
+            [b.class_id for b in response.context["page_obj"]], [upcoming])
+        self.assertEqual(response.context["bookings_count"], 2)
+
+        with CaptureQueriesContext(connection) as few_bookings:
+            response = self.client.get("/user_bookings/", {"when": "past"})
+        self.assertEqual(
+            [b.class_id for b in response.context["page_obj"]],
+            [self.class_instance])
+
+        Bookings.objects.create(
+            user=self.user, class_id=self.other_class_instance)
+        with CaptureQueriesContext(connection) as more_bookings:
+            response = self.client.get("/user_bookings/", {"when": "past"})
+        self.assertEqual(
+            [b.class_id for b in response.context["page_obj"]],
+            [self.other_class_instance, self.class_instance])
+        self.assertEqual(len(few_bookings), len(more_bookings))
+
     def test_book_class_view(self):
         """
         Test the book class view to ensure it returns a
@@ -875,6 +1237,54 @@ class TestBookingViews(TestCase):
         existing_items = Bookings.objects.filter(user=self.user)
         self.assertEqual(existing_items.count(), 1)
 
+    def test_can_not_book_full_class(self):
+        """
+        Test that a user can't book a class with no slots left.
+
+        This test method fills every slot of a class and then
+        sends a POST request to the book class URL. It asserts
+        that the booking page is rendered again with an error
+        and that no booking was created for the user.
+        """
+        self.other_class_instance.slots_filled = 10
+        self.other_class_instance.slots_available = 0
+        self.other_class_instance.save()
+
+        response = self.client.post(
+            f"/book_class/{self.other_class_instance.id}/",
+            {
+                "class_id": self.other_class_instance.id,
+                "user": self.user.id,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "This class is now fully booked")
+        existing_items = Bookings.objects.filter(user=self.user)
+        self.assertEqual(existing_items.count(), 0)
+
+    def test_can_join_waitlist_of_full_class(self):
+        """
+        Test that a user can join the waitlist of a full class
+        and is booked in when a booking is cancelled.
+        """
+        self.other_class_instance.slots_filled = 10
+        self.other_class_instance.slots_available = 0
+        self.other_class_instance.save()
+        booking = Bookings.objects.create(
+            user=self.other_user, class_id=self.other_class_instance)
+
+        response = self.client.post(
+            f"/join_waitlist/{self.other_class_instance.id}/")
+        self.assertRedirects(response, "/user_bookings/")
+        self.assertTrue(Waitlist.objects.filter(user=self.user).exists())
+
+        response = self.client.post(
+            f"/cancel_booking/{booking.id}/", {"confirm": "confirm"})
+        self.assertRedirects(response, "/user_bookings/")
+        self.assertTrue(Bookings.objects.filter(
+            user=self.user, class_id=self.other_class_instance).exists())
+        self.assertFalse(Waitlist.objects.exists())
+
     def test_cancel_booking_view(self):
         """
         Test the cancel booking view to ensure it returns a
@@ -899,3 +1309,512 @@ class TestBookingViews(TestCase):
             f"/cancel_booking/{self.booking_instance.id}/")
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "classes/cancel_booking.html")
+
+
+class TestExportViews(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by logging in an admin and
+        booking a member onto two classes a week apart.
+        """
+        Group.objects.create(name="admin")
+        self.admin = User.objects.create_user(
+            username="testadmin",
+            email="testadmin@email.com",
+            password="testpassword332",
+        )
+        self.admin.groups.add(Group.objects.get(name="admin"))
+        self.member = User.objects.create_user(
+            username="testmember",
+            first_name="Test",
+            last_name="Member",
+            email="testmember@email.com",
+            password="testpassword332",
+        )
+        for day in (1, 8):
+            class_instance = Classes.objects.create(
+                class_name=f"Class {day}",
+                class_description="Test Description",
+                class_date=f"2024-01-0{day}",
+                class_start_time="09:00:00",
+                class_end_time="10:00:00",
+                slots_available=10,
+            )
+            Bookings.objects.create(
+                user=self.member, class_id=class_instance)
+        self.client.post(
+            "/login/",
+            {"email": "testadmin@email.com", "password": "testpassword332"},
+        )
+
+    def test_export_bookings_csv(self):
+        """
+        Test that bookings are streamed as CSV with their class and
+        user, filtered by class date.
+        """
+        response = self.client.get(
+            "/export/bookings/", {"from": "2024-01-02"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="bookings-2024-01-02.csv"',
+                      response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("booking_id,booked_at,class_id"))
+        self.assertIn(
+            "Class 8,0,2024-01-08,09:00:00,10:00:00,"
+            f"{self.member.id},testmember,Test,Member,testmember@email.com",
+            lines[1])
+
+    def test_export_ndjson(self):
+        """
+        Test that exports can be streamed as one JSON object per
+        line.
+        """
+        response = self.client.get(
+            "/export/classes/", {"format": "ndjson", "to": "2024-01-07"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in
+                b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["class_name"], "Class 1")
+        self.assertEqual(rows[0]["slots_available"], 10)
+
+        response = self.client.get(
+            "/export/members/", {"format": "ndjson"})
+        rows = [json.loads(line) for line in
+                b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(
+            [row["username"] for row in rows], ["testadmin", "testmember"])
+
+    def test_export_invalid_request(self):
+        """
+        Test that unknown exports are not found, and that invalid
+        formats or dates are rejected.
+        """
+        response = self.client.get("/export/passwords/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/export/bookings/", {"format": "xml"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/export/bookings/", {"from": "soon"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_admin_only(self):
+        """
+        Test that members can't export data.
+        """
+        self.client.logout()
+        self.client.post(
+            "/login/",
+            {"email": "testmember@email.com",
+             "password": "testpassword332"},
+        )
+        response = self.client.get("/export/bookings/")
+        self.assertRedirects(response, "/")
+
+
+class TestCalendarFeedViews(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by logging in a member, who has
+        booked one of two upcoming classes.
+        """
+        cache.clear()
+        Group.objects.create(name="member")
+        self.user = User.objects.create_user(
+            username="testuser1",
+            first_name="Test",
+            email="testuseremail@email.com",
+            password="testpassword332",
+        )
+        self.user.groups.add(Group.objects.get(name="member"))
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.booked_class, self.other_class = [
+            Classes.objects.create(
+                class_name=name,
+                class_description="Test Description",
+                class_date=tomorrow,
+                class_start_time=start_time,
+                class_end_time=end_time,
+                slots_available=10,
+            )
+            for name, start_time, end_time in (
+                ("Booked Class", "09:00:00", "10:00:00"),
+                ("Other Class", "11:00:00", "12:00:00"),
+            )
+        ]
+        Bookings.objects.create(user=self.user, class_id=self.booked_class)
+        self.token = CalendarFeed.objects.create(user=self.user).token
+
+    def test_schedule_feed(self):
+        """
+        Test that the schedule feed lists every class, is answered
+        from its ETag with a single query, and changes when a class
+        is changed or deleted.
+        """
+        response = self.client.get("/calendar/schedule.ics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertContains(response, "SUMMARY:Booked Class")
+        self.assertContains(response, "SUMMARY:Other Class")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/calendar/schedule.ics", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.other_class.class_name = "Renamed Class"
+        self.other_class.save()
+        response = self.client.get(
+            "/calendar/schedule.ics", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "SUMMARY:Renamed Class")
+        etag = response["ETag"]
+
+        # deleting a class that isn't the latest changed must still
+        # change the feed
+        Classes.objects.filter(id=self.booked_class.id).delete()
+        response = self.client.get(
+            "/calendar/schedule.ics", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "SUMMARY:Booked Class")
+
+    def test_schedule_feed_shared_between_processes(self):
+        """
+        Test that the feed's ETag is derived from the database
+        rather than from state kept in one process's cache, so a
+        process with an empty cache agrees with the one that
+        rendered it.
+        """
+        etag = self.client.get("/calendar/schedule.ics")["ETag"]
+        cache.clear()
+        response = self.client.get(
+            "/calendar/schedule.ics", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_member_feed(self):
+        """
+        Test that a member's feed lists only their booked classes,
+        and changes when they book another class.
+        """
+        url = f"/calendar/{self.token}.ics"
+        response = self.client.get(url)
+        self.assertContains(response, "SUMMARY:Booked Class")
+        self.assertNotContains(response, "SUMMARY:Other Class")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        booking = Bookings.objects.create(
+            user=self.user, class_id=self.other_class)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "SUMMARY:Other Class")
+        etag = response["ETag"]
+
+        booking.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "SUMMARY:Other Class")
+
+    def test_member_feed_unknown_token(self):
+        """
+        Test that a feed with an unknown token is not found.
+        """
+        response = self.client.get("/calendar/not-a-token.ics")
+        self.assertEqual(response.status_code, 404)
+
+    def test_bookings_page_links_feed(self):
+        """
+        Test that a member's bookings page shows their feed's URL.
+        """
+        self.client.post(
+            "/login/",
+            {"email": "testuseremail@email.com",
+             "password": "testpassword332"},
+        )
+        response = self.client.get("/user_bookings/")
+        self.assertContains(
+            response, f"http://testserver/calendar/{self.token}.ics")
+
+
+class TestImportViews(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating the admin and member
+        groups and logging in an admin.
+        """
+        Group.objects.create(name="admin")
+        Group.objects.create(name="member")
+        admin = User.objects.create_user(
+            username="testadmin",
+            email="testadmin@email.com",
+            password="testpassword332",
+        )
+        admin.groups.add(Group.objects.get(name="admin"))
+        self.client.post(
+            "/login/",
+            {"email": "testadmin@email.com", "password": "testpassword332"},
+        )
+
+    def upload(self, content, **data):
+        csv_file = SimpleUploadedFile(
+            "members.csv", content.encode(), content_type="text/csv")
+        return self.client.post(
+            "/import/", {"kind": "members", "csv_file": csv_file, **data})
+
+    def test_import_and_set_password(self):
+        """
+        Test that an admin can upload members, who are invited and
+        can then set a password and log in.
+        """
+        response = self.upload(
+            "username,email\nann,ann@email.com\nbob,\n", send_invites="on")
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "layout/import.html")
+        self.assertContains(response, "Imported 1 members.")
+        self.assertContains(response, "Line 3:")
+        self.assertEqual(len(mail.outbox), 1)
+
+        self.client.logout()
+        url = re.search(r"http://testserver(/\S+)", mail.outbox[0].body)[1]
+        response = self.client.get(url, follow=True)
+        response = self.client.post(response.redirect_chain[-1][0], {
+            "new_password1": "a-new-password-42",
+            "new_password2": "a-new-password-42",
+        })
+        self.assertRedirects(response, "/login/")
+        self.assertTrue(
+            User.objects.get(username="ann").check_password(
+                "a-new-password-42"))
+
+    def test_dry_run(self):
+        """
+        Test that a dry run imports nothing and sends no invites.
+        """
+        self.upload(
+            "username,email\nann,ann@email.com\n",
+            dry_run="on", send_invites="on")
+        self.assertFalse(User.objects.filter(username="ann").exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_missing_column(self):
+        """
+        Test that a file without the required columns is rejected
+        on the form.
+        """
+        response = self.upload("username\nann\n")
+        self.assertContains(response, "Missing column(s): email")
+
+
+class TestMetricsView(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by creating an admin, a member
+        and a class for the member to book.
+        """
+        for name in ("admin", "member"):
+            user = User.objects.create_user(
+                username=f"test{name}",
+                email=f"test{name}@email.com",
+                password="testpassword332",
+            )
+            user.groups.add(Group.objects.create(name=name))
+        self.class_instance = Classes.objects.create(
+            class_name="Test Class",
+            class_description="Test Description",
+            class_date=timezone.localdate() + timedelta(days=1),
+            class_start_time="10:00:00",
+            class_end_time="11:00:00",
+            slots_available=10,
+        )
+
+    def login(self, name):
+        self.client.post(
+            "/login/",
+            {"email": f"test{name}@email.com", "password": "testpassword332"},
+        )
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_metrics_access(self):
+        """
+        Test that the metrics can be read by admins and with the
+        bearer token, but not by members or with a wrong token.
+        """
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 403)
+        self.login("member")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 403)
+        self.client.logout()
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                "/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(
+                "/metrics", HTTP_AUTHORIZATION="Bearer secret")
+            self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            b"# TYPE toughglove_booking_attempts_total counter",
+            response.content)
+
+        self.login("admin")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            b"# TYPE toughglove_request_duration_seconds histogram",
+            response.content)
+
+    def test_booking_metrics(self):
+        """
+        Test that booking attempts are counted by result, and that
+        cancellations are counted.
+        """
+        booked = self.sample(
+            "toughglove_booking_attempts_total", result="booked")
+        duplicate = self.sample(
+            "toughglove_booking_attempts_total", result="already_booked")
+        cancellations = self.sample("toughglove_booking_cancellations_total")
+        self.login("member")
+        url = f"/book_class/{self.class_instance.id}/"
+        self.client.post(url)
+        self.client.post(url)
+        booking = Bookings.objects.get()
+        self.client.post(f"/cancel_booking/{booking.id}/")
+
+        self.assertEqual(self.sample(
+            "toughglove_booking_attempts_total", result="booked"), booked + 1)
+        self.assertEqual(self.sample(
+            "toughglove_booking_attempts_total", result="already_booked"),
+            duplicate + 1)
+        self.assertEqual(self.sample(
+            "toughglove_booking_cancellations_total"), cancellations + 1)
+
+    def test_request_metrics(self):
+        """
+        Test that login attempts are counted, and that requests are
+        timed and their queries counted by URL name.
+        """
+        failures = self.sample(
+            "toughglove_login_attempts_total", result="failure")
+        successes = self.sample(
+            "toughglove_login_attempts_total", result="success")
+        self.client.post(
+            "/login/",
+            {"email": "testmember@email.com", "password": "wrong"})
+        self.login("member")
+        self.assertEqual(self.sample(
+            "toughglove_login_attempts_total", result="failure"), failures + 1)
+        self.assertEqual(self.sample(
+            "toughglove_login_attempts_total", result="success"),
+            successes + 1)
+
+        requests = self.sample(
+            "toughglove_request_duration_seconds_count",
+            view="profile", method="GET")
+        queries = self.sample(
+            "toughglove_request_db_queries_total", view="profile")
+        self.client.get("/profile/")
+        self.assertEqual(self.sample(
+            "toughglove_request_duration_seconds_count",
+            view="profile", method="GET"), requests + 1)
+        self.assertGreater(self.sample(
+            "toughglove_request_db_queries_total", view="profile"), queries)
+
+    def test_unknown_methods_share_a_label(self):
+        """
+        Test that requests with made up methods are counted under
+        the "other" method label, rather than each adding a series.
+        """
+        requests = self.sample(
+            "toughglove_request_duration_seconds_count",
+            view="homepage", method="other")
+        for method in ("FOO", "BAR"):
+            self.client.generic(method, "/")
+        self.assertEqual(self.sample(
+            "toughglove_request_duration_seconds_count",
+            view="homepage", method="other"), requests + 2)
+        self.assertEqual(self.sample(
+            "toughglove_request_duration_seconds_count",
+            view="homepage", method="FOO"), 0)
+
+
+class TestProfileViews(TestCase):
+    def setUp(self):
+        """
+        Set up the test environment by logging in an admin and
+        profiling one of their requests into a temporary directory.
+        """
+        cache.clear()
+        Group.objects.create(name="admin")
+        self.user = User.objects.create_user(
+            username="testadmin",
+            email="testadmin@email.com",
+            password="testpassword332",
+        )
+        self.user.groups.add(Group.objects.get(name="admin"))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(REQUEST_PROFILING_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.login(username="testadmin", password="testpassword332")
+        self.name = self.client.get(
+            "/admin_dashboard/?profile=1")["X-Profile"]
+
+    def test_profiles_are_listed(self):
+        """
+        Test that the profiles page lists the stored profiles, with
+        links to download their files.
+        """
+        response = self.client.get("/profiles/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "layout/profiles.html")
+        [profile] = response.context["profiles"]
+        self.assertEqual(profile["name"], self.name)
+        self.assertEqual(profile["view"], "admin_dashboard")
+        self.assertContains(response, f"/profiles/{self.name}.prof")
+        self.assertContains(response, f"/profiles/{self.name}.collapsed")
+
+    def test_profile_download(self):
+        """
+        Test that profile files can be downloaded, and that nothing
+        else in or outside the profile directory can.
+        """
+        response = self.client.get(f"/profiles/{self.name}.collapsed")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("attachment", response["Content-Disposition"])
+        with open(os.path.join(
+                self.directory, f"{self.name}.collapsed"), "rb") as f:
+            self.assertEqual(b"".join(response.streaming_content), f.read())
+
+        with open(os.path.join(self.directory, "notes.txt"), "w") as f:
+            f.write("private")
+        for filename in ("notes.txt", f"{self.name}.txt",
+                         "20240101-000000-000000-1-x-1ms.prof", "..%2Fsettings.py"):
+            response = self.client.get(f"/profiles/{filename}")
+            self.assertEqual(response.status_code, 404)
+
+    def test_members_cannot_see_profiles(self):
+        """
+        Test that members are turned away from the profiles pages.
+        """
+        Group.objects.create(name="member")
+        member = User.objects.create_user(
+            username="testmember", password="testpassword332")
+        member.groups.add(Group.objects.get(name="member"))
+        self.client.login(username="testmember", password="testpassword332")
+        response = self.client.get("/profiles/")
+        self.assertRedirects(response, "/")
+        response = self.client.get(f"/profiles/{self.name}.prof")
+        self.assertRedirects(response, "/")
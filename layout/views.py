@@ -1,22 +1,81 @@
 # Standard library imports
+import io
 
 # Related third-party imports
-from django.db import models, IntegrityError
+from django.conf import settings
+from django.db.models import Count, Q
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.contrib.auth import login, logout
+from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User, Group
-from django.http import JsonResponse
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.core.paginator import Paginator
 
 
 # Local application/library specific imports
 from .forms import *
 from layout.booking_functions.availability import get_available_classes
+from layout.booking_functions.booking import (
+    book_class,
+    cancel_booking,
+    delete_class,
+    delete_member,
+    get_user_bookings,
+    join_waitlist,
+    BOOKED,
+    FULL,
+    ALREADY_BOOKED,
+    WAITLISTED,
+    ALREADY_WAITLISTED,
+    NOT_FULL,
+    BOOKINGS_PAGE_SIZE,
+)
+from layout.booking_functions.bulk_import import (
+    import_csv, send_invites, IMPORT_COLUMNS)
+from layout.booking_functions.export import get_export, EXPORT_FORMATS
+from layout.booking_functions.ical import (
+    get_feed,
+    get_member_feed,
+    member_feed_etag,
+    schedule_feed_etag,
+    SCHEDULE_FEED,
+)
+from layout.booking_functions.series import (
+    copy_week,
+    create_classes,
+    expand_series,
+)
+from layout.booking_functions.schedule import (
+    get_class_page,
+    get_schedule_window,
+    schedule_etag,
+)
 from .decorators import unauthenticated_user, allowed_users
+from .metrics import (
+    BOOKING_ATTEMPTS, CANCELLATIONS, LOGIN_ATTEMPTS, render_metrics)
+from .profiling import list_profiles, profile_file
+from .roles import get_group, has_role
 from .models import *
 
+# Number of members listed on the admin dashboard; the rest are on
+# the members page
+DASHBOARD_MEMBERS = 25
+# Number of upcoming classes listed on the admin dashboard; the
+# rest are on the classes page
+DASHBOARD_CLASSES = 25
+
 
 # Create your views here.
 def homepage(request):
@@ -82,8 +141,7 @@ def register_view(request):
         if form.is_valid():
             user = form.save()
             username = form.cleaned_data.get("username")
-            group = Group.objects.get(name="member")
-            user.groups.add(group)
+            user.groups.add(get_group("member"))
             messages.success(
                 request, "Account created successfully for " + username)
             return redirect("login")
@@ -135,8 +193,7 @@ def create_member_view(request):
         if form.is_valid():
             user = form.save()
             username = form.cleaned_data.get("username")
-            group = Group.objects.get(name="member")
-            user.groups.add(group)
+            user.groups.add(get_group("member"))
             messages.success(
                 request, "Account created successfully for " + username)
             return redirect("members")
@@ -173,9 +230,11 @@ def login_view(request):
 
     The function checks if the request method
     is POST. If so, it retrieves the email and password
-    from the request. It then attempts to find
-    a user with the given email. If a user is found and
-    the password is correct, the user is logged
+    from the request and authenticates them with
+    `authenticate`, which finds the user through the
+    indexed, case-insensitive email lookup of
+    `layout.backends.EmailBackend`. If the
+    credentials are valid, the user is logged
     in and redirected to the homepage. If the credentials
     are incorrect, an error message is displayed.
     For GET requests, the login form is displayed.
@@ -185,18 +244,15 @@ def login_view(request):
         email = request.POST.get("email")
         password = request.POST.get("password")
 
-        # find user by email
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            user = None
+        # authenticate by email through layout.backends.EmailBackend
+        user = authenticate(request, email=email, password=password)
 
-        # Check the password if the user exists
-        if user is not None and user.check_password(password):
-            # Manually authenticate the user, then login
+        if user is not None:
+            LOGIN_ATTEMPTS.labels("success").inc()
             login(request, user)
             return redirect("homepage")
         else:
+            LOGIN_ATTEMPTS.labels("failure").inc()
             messages.info(request, "Email or password is incorrect")
 
     context = {}
@@ -281,7 +337,9 @@ def members_view(request):
     with 'admin' role.
     The function performs the following operations:
     1. Retrieves all member records from the Members model.
-    2. Fetches all user records from the User model.
+    2. Fetches all user records from the User model, joined with
+    their member records, so rendering each user's phone number
+    doesn't cost a query per user.
     3. Counts the total number of users.
     4. Passes the members, users, and user count
     to the 'accounts/members.html' template.
@@ -303,7 +361,7 @@ def members_view(request):
     overview of members and users, useful for administrative purposes.
     """
     members = Members.objects.all()
-    users = User.objects.all()
+    users = User.objects.select_related("members")
     user_count = User.objects.count()
     context = {"members": members, "users": users, "user_count": user_count}
     return render(request, "accounts/members.html", context)
@@ -320,8 +378,10 @@ def profile_view(request):
     It performs the following operations:
     1. Retrieves the current logged-in user's information.
     2. Fetches all member records from the Members model.
-    3. Retrieves all bookings made by the current user.
-    4. Extracts the classes associated with these bookings.
+    3. Retrieves all bookings made by the current user, joined
+    with their classes.
+    4. Selects the classes associated with these bookings in a
+    single query, rather than one query per booking.
     5. Counts the total number of bookings made by the user.
     6. Passes the user's bookings, booking count, user
     information, associated classes, and all members to
@@ -345,8 +405,8 @@ def profile_view(request):
     """
     user = request.user
     members = Members.objects.all()
-    bookings = user.bookings_set.all()
-    classes = [booking.class_id for booking in bookings]
+    bookings = user.bookings_set.select_related("class_id")
+    classes = Classes.objects.filter(bookings__user=user)
     bookings_count = bookings.count()
     context = {
         "bookings": bookings,
@@ -400,7 +460,7 @@ def update_member_view(request, pk):
     """
     user = get_object_or_404(User, id=pk)
     form = UpdateUserForm(instance=user)
-    is_admin = request.user.groups.filter(name="admin").exists()
+    is_admin = has_role(request, "admin")
     if not (is_admin or request.user.id == user.id):
         messages.error(
             request, "Error, you are unauthorised to edit this account.")
@@ -430,8 +490,8 @@ def delete_member_view(request, pk):
     primary key (pk) or raises a 404 error if not found.
     2. Checks if the request method is POST, indicating
     a confirmation to delete.
-    3. Deletes the user and displays a success message
-    upon deletion.
+    3. Deletes the user, releasing the slots of the classes
+    they booked, and displays a success message upon deletion.
     4. Redirects to the 'members' view after successful
     deletion.
     5. Renders the 'accounts/delete_member.html'
@@ -454,7 +514,7 @@ def delete_member_view(request, pk):
     """
     user = get_object_or_404(User, id=pk)
     if request.method == "POST":
-        user.delete()
+        delete_member(user)
         messages.success(
             request, "This member has been deleted!")
         return redirect("members")
@@ -473,14 +533,20 @@ def admin_dashboard_view(request):
     an overview of the platform's key metrics. It is
     accessible only to authenticated users with the 'admin' role.
     The function performs several key operations:
-    1. Retrieves all users, classes, and members from the database.
-    2. Counts the total number of users, classes, personal
-    training classes, and group classes.
-    3. Fetches available classes using the `get_available_classes`
-    function.
+    1. Counts the total number of classes, personal training
+    classes, and group classes in a single conditional
+    aggregate query.
+    2. Counts the users, and retrieves the first DASHBOARD_MEMBERS
+    of them with only the columns the members table renders.
+    3. Retrieves the first DASHBOARD_CLASSES upcoming classes with
+    the keyset pager of the classes page, whose next page the
+    table links to.
     4. Renders the 'layout/admin_dashboard.html' template with
     the context containing all the retrieved data.
 
+    The number of queries made, and the size of the page, are
+    constant regardless of how many users or classes exist.
+
     Parameters:
     - request: HttpRequest object containing metadata about the request.
 
@@ -496,23 +562,20 @@ def admin_dashboard_view(request):
     user engagement, class offerings, and overall platform
     activity.
     """
-    users = User.objects.all()
-    classes = Classes.objects.all()
-    members = Members.objects.all()
-    user_count = User.objects.count()
-    classes_count = Classes.objects.count()
-    pt_classes_count = Classes.objects.filter(class_type=1).count()
-    group_classes_count = Classes.objects.filter(class_type=0).count()
-    available_classes = get_available_classes()
+    class_stats = Classes.objects.aggregate(
+        classes_count=Count("id"),
+        pt_classes_count=Count("id", filter=Q(class_type=1)),
+        group_classes_count=Count("id", filter=Q(class_type=0)),
+    )
+    users = User.objects.only(
+        "id", "first_name", "last_name", "email").order_by("id")
+    page = get_class_page({}, DASHBOARD_CLASSES, count=False)
     context = {
-        "users": users,
-        "classes": classes,
-        "members": members,
-        "user_count": user_count,
-        "classes_count": classes_count,
-        "pt_classes_count": pt_classes_count,
-        "group_classes_count": group_classes_count,
-        "available_classes": available_classes,
+        "users": users[:DASHBOARD_MEMBERS],
+        "classes": page["classes"],
+        "next_query": page["next_query"],
+        "user_count": users.count(),
+        **class_stats,
     }
     return render(request, "layout/admin_dashboard.html", context)
 
@@ -567,6 +630,96 @@ def create_class_view(request):
     return render(request, "classes/create_class.html", context)
 
 
+def _add_conflict_errors(form, conflicts):
+    """
+    Add an error to a form for each existing class that clashes
+    with the classes it would create.
+
+    Parameters:
+    - form: The bound, valid form.
+    - conflicts (list): (new class, existing class) pairs, as
+    returned by `create_classes`.
+    """
+    for occurrence, existing in conflicts:
+        form.add_error(None, (
+            f"{occurrence.class_date:%d/%m/%Y} "
+            f"{occurrence.class_start_time:%H:%M} clashes with "
+            f"{existing.class_name} at "
+            f"{existing.class_start_time:%H:%M}-"
+            f"{existing.class_end_time:%H:%M}."
+        ))
+
+
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["admin"])
+def create_series_view(request):
+    """
+    Render the view for creating a weekly class series and handle
+    the series creation process.
+
+    This view function is accessible only to authenticated users
+    with the 'admin' role. When a valid ClassSeriesForm is posted,
+    every class in the series is generated and saved in one go. If
+    any of them clash with an existing class, nothing is saved and
+    the clashes are shown as form errors.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+
+    Returns:
+    - HttpResponse object with the rendered
+    'classes/create_series.html' template, or a redirect to the
+    admin dashboard once the series is created.
+    """
+    form = ClassSeriesForm(request.POST or None)
+    if request.method == "POST" and form.is_valid():
+        series = form.save(commit=False)
+        created, conflicts = create_classes(
+            expand_series(series), series=series)
+        if not conflicts:
+            messages.success(
+                request, f"{len(created)} classes created successfully!")
+            return redirect("admin_dashboard")
+        _add_conflict_errors(form, conflicts)
+    context = {"form": form}
+    return render(request, "classes/create_series.html", context)
+
+
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["admin"])
+def copy_week_view(request):
+    """
+    Render the view for copying a week of classes to the
+    following weeks and handle the copy.
+
+    This view function is accessible only to authenticated users
+    with the 'admin' role. When a valid CopyWeekForm is posted, the
+    classes in the chosen week are copied to each of the following
+    weeks and saved in one go. If any of the copies clash with an
+    existing class, nothing is saved and the clashes are shown as
+    form errors.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+
+    Returns:
+    - HttpResponse object with the rendered
+    'classes/copy_week.html' template, or a redirect to the admin
+    dashboard once the week is copied.
+    """
+    form = CopyWeekForm(request.POST or None)
+    if request.method == "POST" and form.is_valid():
+        created, conflicts = create_classes(copy_week(
+            form.cleaned_data["week_start"], form.cleaned_data["weeks"]))
+        if not conflicts:
+            messages.success(
+                request, f"{len(created)} classes created successfully!")
+            return redirect("admin_dashboard")
+        _add_conflict_errors(form, conflicts)
+    context = {"form": form}
+    return render(request, "classes/copy_week.html", context)
+
+
 @login_required(login_url="login")
 @allowed_users(allowed_roles=["admin"])
 def update_class_view(request, pk):
@@ -637,8 +790,8 @@ def delete_class_view(request, pk):
 
     The function retrieves the class to be deleted using
     the primary key (pk) provided in the URL. If the deletion is
-    confirmed through a POST request, the class is deleted
-    from the database, and the user is redirected to the admin
+    confirmed through a POST request, the class and its bookings
+    are deleted from the database, and the user is redirected to the admin
     dashboard with a success message.
 
     Parameters:
@@ -663,12 +816,12 @@ def delete_class_view(request, pk):
     and concise interface for confirming the deletion
     of class details.
     """
-    delete_class = Classes.objects.get(id=pk)
+    class_instance = Classes.objects.get(id=pk)
     if request.method == "POST":
-        delete_class.delete()
+        delete_class(class_instance)
         messages.success(request, "Your class has been deleted successfully!")
         return redirect("admin_dashboard")
-    context = {"class": delete_class}
+    context = {"class": class_instance}
     return render(request, "classes/delete_class.html", context)
 
 
@@ -676,21 +829,21 @@ def delete_class_view(request, pk):
 @allowed_users(allowed_roles=["member", "admin"])
 def classes_view(request):
     """
-    Render the view for displaying all classes,
-    including available and total class counts.
+    Render the view for displaying a page of classes,
+    including the count of classes matching the filters.
 
     This view function is accessible to authenticated
     users with either 'member' or 'admin' roles. It serves to present
-    a comprehensive overview of all classes offered,
-    along with additional details like the total number
-    of classes and
-    the number of available classes.
+    an overview of the classes offered, along with the total
+    number of classes matching the current filters.
 
-    The function fetches all class instances from the
-    database and calculates the total count of classes. It also
-    retrieves the list of available classes through the
-    `get_available_classes` function. Additionally, it fetches all
-    user instances for potential use in the template.
+    The function fetches one page of classes through the
+    `get_class_page` function. Only upcoming classes are listed
+    by default, and the listing can be filtered by class type and
+    date range through the `type`, `from` and `to` query
+    parameters. Pages are linked with a keyset cursor (`after`),
+    so rendering a page costs the same however many historical
+    classes exist.
 
     Parameters:
     - request: HttpRequest object containing metadata about the request.
@@ -706,22 +859,11 @@ def classes_view(request):
     view of the classes, enabling them to make informed
     decisions about class participation or administration.
 
-    The context passed to the template includes the list
-    of all classes, the total count of classes, the list of
-    available classes, and all user instances. This rich
-    context allows for a dynamic and informative user interface,
-    catering to both regular members and administrators.
+    The context passed to the template includes the page
+    of classes, the count of matching classes, the active
+    filters and the query strings for the next and first pages.
     """
-    classes = Classes.objects.all()
-    classes_count = Classes.objects.count()
-    available_classes = get_available_classes()
-    users = User.objects.all()
-    context = {
-        "classes": classes,
-        "classes_count": classes_count,
-        "available_classes": available_classes,
-        "users": users,
-    }
+    context = get_class_page(request.GET)
     return render(request, "classes/classes.html", context)
 
 
@@ -738,11 +880,13 @@ def user_bookings_view(request):
     including details of the classes they have booked and
     the total number of bookings they have made.
 
-    The function retrieves the current user from the request,
-    fetches all bookings related to this user, and calculates
-    the total number of bookings. It also compiles a list of
-    classes associated with these bookings for display in the
-    template.
+    The function retrieves the current user from the request
+    and fetches one page of their upcoming bookings, or of their
+    past bookings when the `when=past` query parameter is given.
+    Each booking is fetched together with its class in a single
+    query, so the page costs the same number of queries however
+    long the member's booking history is. The total number of
+    bookings is also counted.
 
     Parameters:
     - request: HttpRequest object containing metadata about
@@ -759,22 +903,33 @@ def user_bookings_view(request):
     a tailored view of their bookings, allowing them to easily
     manage and review their scheduled classes.
 
-    The context passed to the template includes the list of the
+    The context passed to the template includes the page of the
     user's bookings, the total count of these bookings, the
-    user instance, and the list of classes associated with the
-    bookings. This comprehensive context facilitates a
+    user instance, whether past bookings are being shown, the
+    classes the user is waiting for, and the URL of the user's
+    calendar feed.
+    This comprehensive context facilitates a
     user-centric interface, enabling users to have a clear and
     detailed view of their scheduled activities.
     """
     user = request.user
-    bookings = user.bookings_set.all()
-    classes = [booking.class_id for booking in bookings]
-    bookings_count = bookings.count()
+    past = request.GET.get("when") == "past"
+    paginator = Paginator(get_user_bookings(user, past), BOOKINGS_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+    waitlist = []
+    calendar_url = None
+    if not past:
+        waitlist = user.waitlist_set.select_related("class_id")
+        feed, _ = CalendarFeed.objects.get_or_create(user=user)
+        calendar_url = request.build_absolute_uri(
+            reverse("member_feed", args=[feed.token]))
     context = {
-        "bookings": bookings,
-        "bookings_count": bookings_count,
+        "page_obj": page_obj,
+        "bookings_count": user.bookings_set.count(),
         "user": user,
-        "classes": classes,
+        "past": past,
+        "waitlist": waitlist,
+        "calendar_url": calendar_url,
     }
     return render(request, "classes/user_bookings.html", context)
 
@@ -793,6 +948,11 @@ def book_class_view(request, pk):
     process is robust, handling scenarios such as fully booked
     classes and duplicate bookings.
 
+    Bookings are made through `book_class`, which claims a slot
+    with a single conditional UPDATE and inserts the booking in the
+    same transaction, so concurrent bookers can never oversell a
+    class.
+
     Parameters:
     - request: HttpRequest object containing metadata about
     the request.
@@ -802,18 +962,17 @@ def book_class_view(request, pk):
     - HttpResponse object with the rendered 'classes/book_class.html'
     template.
 
-    The function first retrieves the class instance using the
-    provided primary key. If the request method is POST, it
-    processes the submitted form data. The form is validated
-    to ensure that the booking details are correct. If the
-    form is valid, a new booking is created and linked to the
-    user and the class. The class's available slots are
-    updated accordingly. If the class is fully booked or if
-    the user has already booked the class, appropriate error
-    messages are added to the form.
+    If the request method is POST, the booking is attempted for
+    the current user and the class identified by the primary key.
+    On success the user is redirected to the classes page. If the
+    class is fully booked or if the user has already booked the
+    class, an appropriate error message is shown on the page, and
+    users who find the class full are offered its waitlist.
 
-    If the request method is not POST, the function initializes
-    a pre-populated form with the class and user details.
+    The booking form is pre-populated with the class and user
+    details but is never validated, so no foreign key or
+    uniqueness lookups are made for it; the class instance is only
+    fetched when the page needs to be rendered.
 
     The view is decorated with @login_required and @allowed_users
     decorators to ensure that only authenticated users
@@ -824,41 +983,36 @@ def book_class_view(request, pk):
     bookings.
 
     The context passed to the template includes the booking
-    form and the class instance, providing the necessary
+    form, the class instance and any booking error, providing the necessary
     information for users to make a booking and for the
     template to display the relevant class details.
     """
-    class_instance = Classes.objects.get(id=pk)
+    booking_error = None
+    class_full = False
     if request.method == "POST":
-        form = BookingForm(request.POST)
-        if form.is_valid():
-            booking = form.save(commit=False)
-            booking.user = request.user
-            booking.class_id = class_instance
-            class_instance.slots_filled += 1
-            class_instance.slots_available -= 1
-            if "cancel" in request.POST:
-                return redirect("classes")
-            else:
-                if class_instance.slots_available == 0:
-                    form.add_error(None, "This class is now fully booked")
-                try:
-                    booking.save()
-                    class_instance.save()
-                    messages.success(
-                        request, "Your class has been booked successfully!"
-                    )
-                    return redirect("classes")
-                except IntegrityError:
-                    form.add_error(None, "You have already booked this class")
-
-    else:
-        initial_data = {"class_id": class_instance.id, "user": request.user.id}
-        form = BookingForm(initial_data)
-
+        if "cancel" in request.POST:
+            return redirect("classes")
+        result = book_class(request.user, pk)
+        BOOKING_ATTEMPTS.labels(result).inc()
+        if result == BOOKED:
+            messages.success(
+                request, "Your class has been booked successfully!"
+            )
+            return redirect("classes")
+        elif result == FULL:
+            booking_error = "This class is now fully booked"
+            class_full = True
+        elif result == ALREADY_BOOKED:
+            booking_error = "You have already booked this class"
+
+    class_instance = get_object_or_404(Classes, id=pk)
+    initial_data = {"class_id": class_instance.id, "user": request.user.id}
+    form = BookingForm(initial=initial_data)
     context = {
         "form": form,
         "class": class_instance,
+        "booking_error": booking_error,
+        "class_full": class_full,
     }
     return render(request, "classes/book_class.html", context)
 
@@ -883,46 +1037,380 @@ def cancel_booking_view(request, pk):
     Returns:
     - HttpResponse object with the rendered
     'classes/cancel_booking.html' template.
+
+    Cancellation goes through `cancel_booking`, which books the
+    first user on the class's waitlist into the freed slot in the
+    same transaction.
     """
     booking_instance = Bookings.objects.get(id=pk)
     if request.method == "POST":
         if "cancel" in request.POST:
             return redirect("user_bookings")
         else:
-            booking_instance.delete()
+            cancel_booking(booking_instance)
+            CANCELLATIONS.inc()
             messages.success(request, "Your booking has been canceled!")
             return redirect("user_bookings")
     context = {"booking": booking_instance}
     return render(request, "classes/cancel_booking.html", context)
 
 
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["member", "admin"])
+def join_waitlist_view(request, pk):
+    """
+    Add the user to the waitlist of a fully booked class.
+
+    This view function allows authenticated users with 'member'
+    or 'admin' roles to join the waitlist of a class that has no
+    slots left. When a booking for the class is cancelled, the
+    first user on the waitlist is booked into the freed slot.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about
+    the request.
+    - pk: Primary key of the class.
+
+    Returns:
+    - HttpResponseRedirect: A redirect to the user's bookings
+    once the user has joined the waitlist, or back to the classes
+    page with an explanation otherwise. GET requests are redirected
+    to the booking page of the class.
+    """
+    if request.method != "POST":
+        return redirect("book_class", pk=pk)
+    result = join_waitlist(request.user, pk)
+    if result == WAITLISTED:
+        messages.success(
+            request, "You have joined the waitlist for this class!")
+        return redirect("user_bookings")
+    elif result == ALREADY_WAITLISTED:
+        messages.info(
+            request, "You are already on the waitlist for this class")
+    elif result == ALREADY_BOOKED:
+        messages.info(request, "You have already booked this class")
+    elif result == NOT_FULL:
+        messages.info(request, "This class still has slots available")
+        return redirect("book_class", pk=pk)
+    else:
+        messages.error(request, "This class does not exist")
+    return redirect("classes")
+
+
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["member", "admin"])
+def leave_waitlist_view(request, pk):
+    """
+    Remove one of the user's waitlist entries.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about
+    the request.
+    - pk: Primary key of the waitlist entry.
+
+    Returns:
+    - HttpResponseRedirect: A redirect to the user's bookings.
+    """
+    entry = get_object_or_404(Waitlist, id=pk, user=request.user)
+    if request.method == "POST":
+        entry.delete()
+        messages.success(request, "You have left the waitlist")
+    return redirect("user_bookings")
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=schedule_etag)
 def get_classes(request):
     """
-    Retrieve all class instances from the database and
+    Retrieve the classes in the requested date range and
     return them in a JSON format.
 
     Parameters:
     - request: HttpRequest object containing metadata
-    about the request.
+    about the request. FullCalendar sends the visible range
+    as the `start` and `end` query parameters (ISO 8601
+    dates or datetimes, `end` being exclusive). Passing
+    `capacity=1` adds the number of slots left in each class.
 
     The function performs the following operations:
-    1. Queries the Classes model to retrieve all
-    class instances.
-    2. Iterates over each class instance, formatting
-    the relevant information (class name, start date and
-    time, end date and time) into a dictionary.
-    3. Compiles these dictionaries into a list.
+    1. Filters the Classes model to the requested date range.
+    The range filter is served by the (class_date,
+    class_start_time, class_end_time) unique index, so the
+    cost depends on the visible week rather than the size of
+    the table. Without a range every class is returned.
+    2. Reads only the columns the calendar needs as tuples
+    instead of building full model instances.
+    3. Formats each row (class name, start date and time, end
+    date and time) into a dictionary and compiles these
+    dictionaries into a list.
 
     This list is used for displaying the classes in
-    the calendar view.
+    the calendar view. A 400 response is returned if the
+    range parameters can't be parsed.
+
+    The response carries a strong ETag derived from the classes
+    in the window. The `condition` decorator answers a matching
+    If-None-Match with a 304 after a single aggregate query,
+    without running the feed query at all. There is no
+    Last-Modified header: the latest `updated_at` in the window
+    goes back when a class is deleted, so a client could keep a
+    stale feed that looks unmodified since.
     """
-    classes = Classes.objects.all()
-    class_list = [
-        {
-            "title": class_instance.class_name,
-            "start": f"{class_instance.class_date} {class_instance.class_start_time}",
-            "end": f"{class_instance.class_date} {class_instance.class_end_time}",
+    try:
+        window = get_schedule_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    classes = Classes.objects.filter(**window).order_by(
+        "class_date", "class_start_time")
+
+    with_capacity = request.GET.get("capacity") in ("1", "true")
+    rows = classes.values_list(
+        "id",
+        "class_name",
+        "class_date",
+        "class_start_time",
+        "class_end_time",
+        "slots_available",
+    )
+    class_list = []
+    for pk, name, date, start_time, end_time, slots_available in rows:
+        event = {
+            "id": pk,
+            "title": name,
+            "start": f"{date} {start_time}",
+            "end": f"{date} {end_time}",
         }
-        for class_instance in classes
-    ]
+        if with_capacity:
+            event["extendedProps"] = {"slots_available": slots_available}
+        class_list.append(event)
     return JsonResponse(class_list, safe=False)
+
+
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["admin"])
+def import_view(request):
+    """
+    Render the view for uploading a CSV file to import, and handle
+    the import.
+
+    This view function is accessible only to authenticated users
+    with the 'admin' role. A posted file is imported in batches with
+    `import_csv`, which skips invalid rows, and the rows that could
+    not be imported are listed on the page with their line numbers.
+    Imported members are emailed a link to set their password if
+    `send_invites` is ticked.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+
+    Returns:
+    - HttpResponse object with the rendered 'layout/import.html'
+    template.
+    """
+    form = ImportForm(request.POST or None, request.FILES or None)
+    result = None
+    if request.method == "POST" and form.is_valid():
+        csv_file = io.TextIOWrapper(
+            form.cleaned_data["csv_file"], encoding="utf-8-sig", newline="")
+        try:
+            result = import_csv(
+                form.cleaned_data["kind"],
+                csv_file,
+                dry_run=form.cleaned_data["dry_run"],
+            )
+        except (UnicodeDecodeError, ValueError) as e:
+            form.add_error("csv_file", str(e))
+        else:
+            verb = "Validated" if form.cleaned_data["dry_run"] else "Imported"
+            messages.success(
+                request,
+                f"{verb} {result['created']} {form.cleaned_data['kind']}.")
+            if form.cleaned_data["send_invites"] and result["users"]:
+                try:
+                    sent = send_invites(
+                        result["users"], request.build_absolute_uri("/"))
+                except OSError:
+                    messages.warning(
+                        request, "The invites could not be sent.")
+                else:
+                    messages.success(request, f"Sent {sent} invite(s).")
+    context = {"form": form, "result": result, "columns": IMPORT_COLUMNS}
+    return render(request, "layout/import.html", context)
+
+
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["admin"])
+def export_view(request, dataset):
+    """
+    Stream an export of bookings, classes or members.
+
+    This view function is accessible only to authenticated users
+    with the 'admin' role. The rows are read from the database in
+    chunks and written to the response as they are read, so memory
+    use stays flat however large the export is.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+    Its optional query parameters are `format` ('csv', the default,
+    or 'ndjson'), and the inclusive `from` and `to` dates
+    (YYYY-MM-DD) of the classes, or of when members joined.
+    - dataset: The export to stream: 'bookings', 'classes' or
+    'members'.
+
+    Returns:
+    - StreamingHttpResponse object with the export as an attachment,
+    or a 400 JsonResponse if the format or dates are invalid.
+
+    Raises:
+    - Http404: If there is no such export.
+    """
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": "Invalid 'format' parameter"},
+                            status=400)
+    try:
+        columns, rows = get_export(dataset, request.GET)
+    except KeyError:
+        raise Http404("No such export")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    content_type, stream = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        stream(columns, rows), content_type=content_type)
+    filename = "-".join(
+        [dataset] + [request.GET[param] for param in ("from", "to")
+                     if request.GET.get(param)])
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"')
+    return response
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=schedule_feed_etag)
+def schedule_feed_view(request):
+    """
+    Serve the studio's class schedule as an iCalendar feed.
+
+    Calendar apps poll their subscriptions every few minutes. The
+    feed carries a strong ETag derived from a single aggregate
+    query over the classes it lists, so a poll with a matching
+    If-None-Match is answered with a 304 without rendering the
+    feed, and the rendered feed is otherwise served from the cache
+    until the schedule changes.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+
+    Returns:
+    - HttpResponse object with the 'text/calendar' feed.
+    """
+    response = HttpResponse(
+        get_feed(request, SCHEDULE_FEED, "Tough Glove Classes"),
+        content_type="text/calendar; charset=utf-8")
+    response["Content-Disposition"] = 'inline; filename="schedule.ics"'
+    return response
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=member_feed_etag)
+def member_feed_view(request, token):
+    """
+    Serve a member's booked classes as an iCalendar feed.
+
+    Calendar apps can't log in, so the feed is found by the
+    unguessable token in its URL rather than by the logged in
+    user. It is cached and revalidated like the schedule feed, with
+    a state read from the member's bookings and booked classes.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+    - token: The token of the member's CalendarFeed.
+
+    Returns:
+    - HttpResponse object with the 'text/calendar' feed.
+
+    Raises:
+    - Http404: If there is no feed with this token.
+    """
+    feed = get_member_feed(request, token)
+    if feed is None:
+        raise Http404("No such calendar")
+    response = HttpResponse(
+        get_feed(request, feed, "My Tough Glove Classes"),
+        content_type="text/calendar; charset=utf-8")
+    response["Content-Disposition"] = 'inline; filename="classes.ics"'
+    return response
+
+
+@cache_control(no_store=True)
+def metrics_view(request):
+    """
+    Serve the application's metrics in the Prometheus text format.
+
+    Scrapers can't log in, so the endpoint accepts the token in the
+    METRICS_TOKEN setting as a bearer token. Without one, only
+    admins can view it.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+
+    Returns:
+    - HttpResponse object with the metrics, or a 403 response if
+    the request is neither from an admin nor carries the token.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if not (
+        (token and constant_time_compare(authorization, f"Bearer {token}"))
+        or has_role(request, "admin")
+    ):
+        return HttpResponse("Forbidden", status=403)
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["admin"])
+def profiles_view(request):
+    """
+    List the stored request profiles, newest first.
+
+    Admins profile a request by adding `?profile=1` to its URL (see
+    `layout.middleware.RequestProfilingMiddleware`); this page lists
+    the profiles that have been stored, with links to download each
+    one's .prof file, for pstats or snakeviz, and its collapsed
+    stacks, for flamegraph.pl or speedscope.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+
+    Returns:
+    - HttpResponse object with the rendered 'layout/profiles.html'
+    template.
+    """
+    context = {"profiles": list_profiles()}
+    return render(request, "layout/profiles.html", context)
+
+
+@login_required(login_url="login")
+@allowed_users(allowed_roles=["admin"])
+def profile_download_view(request, filename):
+    """
+    Download one file of a stored request profile.
+
+    Parameters:
+    - request: HttpRequest object containing metadata about the request.
+    - filename: The name of the file, as listed by `profiles_view`.
+
+    Returns:
+    - FileResponse object with the file as an attachment.
+
+    Raises:
+    - Http404: If there is no profile file with this name.
+    """
+    path = profile_file(filename)
+    if path is None:
+        raise Http404("No such profile")
+    return FileResponse(
+        open(path, "rb"), as_attachment=True, filename=filename)
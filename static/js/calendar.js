@@ -18,7 +18,9 @@
  * - Theme: Bootstrap 5
  * - Header Toolbar: Includes navigation, title, and view change buttons.
  * - Initial View: Week view with time grids.
- * - Events Source: URL endpoint '/get_classes/'.
+ * - Events Source: URL endpoint '/get_classes/'. FullCalendar adds the visible
+ *   range as `start`/`end` query parameters, so only the classes on screen are
+ *   fetched.
  * - Event Interaction: Clicking an event shows an alert with event details.
  * - Styling: Events are colored red.
  * - Time Indicator: Shows the current time.
@@ -53,11 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "layout.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "layout.middleware.RequestProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -124,6 +126,103 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Authentication backends
+# Members log in with their email address; the model backend is kept
+# for username logins to the Django admin.
+
+AUTHENTICATION_BACKENDS = [
+    "layout.backends.EmailBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+
+# Request timing
+# Every request is timed by layout.middleware.RequestTimingMiddleware
+# and logged on the "layout.timing" logger. Requests slower than
+# REQUEST_TIMING_SLOW_MS, making more than REQUEST_TIMING_MAX_QUERIES
+# queries, or running one statement more than
+# REQUEST_TIMING_MAX_DUPLICATE_QUERIES times (a likely N+1) are
+# logged as warnings.
+
+REQUEST_TIMING_SLOW_MS = int(os.environ.get("REQUEST_TIMING_SLOW_MS", 500))
+REQUEST_TIMING_MAX_QUERIES = int(
+    os.environ.get("REQUEST_TIMING_MAX_QUERIES", 30))
+REQUEST_TIMING_MAX_DUPLICATE_QUERIES = int(
+    os.environ.get("REQUEST_TIMING_MAX_DUPLICATE_QUERIES", 5))
+
+# Slow query log
+# Queries run while handling a request that take longer than
+# SLOW_QUERY_MS (0 turns the log off) are written, with their plan,
+# as lines of JSON to SLOW_QUERY_LOG_FILE, which is rotated at
+# SLOW_QUERY_LOG_MAX_BYTES keeping SLOW_QUERY_LOG_BACKUPS old files.
+# Each query shape is explained at most once every
+# SLOW_QUERY_EXPLAIN_INTERVAL seconds. Summarise the log with
+# `python manage.py slow_query_report`.
+
+SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG_FILE = os.environ.get(
+    "SLOW_QUERY_LOG_FILE", os.path.join(BASE_DIR, "slow_queries.jsonl"))
+SLOW_QUERY_LOG_MAX_BYTES = int(
+    os.environ.get("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+SLOW_QUERY_LOG_BACKUPS = int(os.environ.get("SLOW_QUERY_LOG_BACKUPS", 5))
+SLOW_QUERY_EXPLAIN_INTERVAL = int(
+    os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+
+# Request profiling
+# Admins can profile a single request by adding ?profile=1 to its
+# URL, through layout.middleware.RequestProfilingMiddleware. At most
+# one request is profiled every REQUEST_PROFILING_INTERVAL seconds,
+# and the REQUEST_PROFILING_KEEP most recent profiles are kept in
+# REQUEST_PROFILING_DIR, where they are listed at /profiles/.
+
+REQUEST_PROFILING_DIR = os.environ.get(
+    "REQUEST_PROFILING_DIR", os.path.join(BASE_DIR, "profiles"))
+REQUEST_PROFILING_INTERVAL = int(
+    os.environ.get("REQUEST_PROFILING_INTERVAL", 10))
+REQUEST_PROFILING_KEEP = int(os.environ.get("REQUEST_PROFILING_KEEP", 50))
+
+# Metrics
+# Served at /metrics by layout.views.metrics_view. Prometheus
+# authenticates with METRICS_TOKEN as a bearer token; without a
+# token only admins can read the metrics. Set PROMETHEUS_MULTIPROC_DIR
+# to aggregate the metrics of every gunicorn worker.
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "slow_queries": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": SLOW_QUERY_LOG_FILE,
+            "maxBytes": SLOW_QUERY_LOG_MAX_BYTES,
+            "backupCount": SLOW_QUERY_LOG_BACKUPS,
+            "formatter": "message",
+            "delay": True,
+        },
+    },
+    "loggers": {
+        "layout.timing": {
+            "handlers": ["console"],
+            "level": os.environ.get(
+                "REQUEST_TIMING_LOG_LEVEL",
+                "ERROR" if 'test' in sys.argv else "INFO"),
+            "propagate": False,
+        },
+        "layout.slow_queries": {
+            "handlers": ["slow_queries"],
+            "level": "ERROR" if 'test' in sys.argv else "WARNING",
+            "propagate": False,
+        },
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -15,7 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.contrib.auth import views as auth_views
+from django.urls import path, reverse_lazy
 from layout.views import *
 
 urlpatterns = [
@@ -24,6 +25,14 @@ urlpatterns = [
     path("register/", register_view, name="register"),
     path("create_member/", create_member_view, name="create_member"),
     path("login/", login_view, name="login"),
+    path(
+        "set_password/<uidb64>/<token>/",
+        auth_views.PasswordResetConfirmView.as_view(
+            template_name="accounts/set_password.html",
+            success_url=reverse_lazy("login"),
+        ),
+        name="password_reset_confirm",
+    ),
     path("logout/", logout_user, name="logout"),
     path("available_classes/", available_classes_view, name="available_classes"),
     path("members/", members_view, name="members"),
@@ -31,12 +40,27 @@ urlpatterns = [
     path("delete_member/<str:pk>/", delete_member_view, name="delete_member"),
     path("admin_dashboard/", admin_dashboard_view, name="admin_dashboard"),
     path("create_class/", create_class_view, name="create_class"),
+    path("create_series/", create_series_view, name="create_series"),
+    path("copy_week/", copy_week_view, name="copy_week"),
     path("update_class/<str:pk>/", update_class_view, name="update_class"),
     path("delete_class/<str:pk>/", delete_class_view, name="delete_class"),
     path("classes/", classes_view, name="classes"),
     path("book_class/<str:pk>/", book_class_view, name="book_class"),
     path("cancel_booking/<str:pk>/", cancel_booking_view, name="cancel_booking"),
+    path("join_waitlist/<str:pk>/", join_waitlist_view, name="join_waitlist"),
+    path("leave_waitlist/<str:pk>/", leave_waitlist_view, name="leave_waitlist"),
     path("user_bookings/", user_bookings_view, name="user_bookings"),
     path('get_classes/', get_classes, name='get_classes'),
     path("profile/", profile_view, name="profile"),
+    path("import/", import_view, name="import"),
+    path("export/<str:dataset>/", export_view, name="export"),
+    path("calendar/schedule.ics", schedule_feed_view, name="schedule_feed"),
+    path("calendar/<str:token>.ics", member_feed_view, name="member_feed"),
+    path("metrics", metrics_view, name="metrics"),
+    path("profiles/", profiles_view, name="profiles"),
+    path(
+        "profiles/<str:filename>",
+        profile_download_view,
+        name="profile_download",
+    ),
 ]